@@ -520,9 +520,11 @@ class BaseConstraintDiscoverer(BaseConstraintCalculator):
     a mix-in subclass which inherits both from :py:mod:`BaseConstraintDiscover`
     and from a specific implementation of :py:mod:`BaseConstraintCalculator`.
     """
-    def __init__(self, inc_rex=False, seed=None, **kwargs):
+    def __init__(self, inc_rex=False, seed=None, rex_time_budget=None,
+                 **kwargs):
         self.inc_rex = inc_rex
         self.seed = seed
+        self.rex_time_budget = rex_time_budget
 
     def discover(self):
         field_constraints = []
@@ -617,9 +619,9 @@ class BaseConstraintDiscoverer(BaseConstraintCalculator):
                 no_duplicates_constraint = NoDuplicatesConstraint()
 
         if type_ == 'string' and self.inc_rex:
-            rex_constraint = RexConstraint(self.find_rexes(fieldname,
-                                                           values=uniqs,
-                                                           seed=self.seed))
+            rexes = self.find_rexes(fieldname, values=uniqs, seed=self.seed,
+                                    time_budget=self.rex_time_budget)
+            rex_constraint = RexConstraint(rexes)
 
         constraints = [c for c in [type_constraint,
                                    min_constraint, max_constraint,
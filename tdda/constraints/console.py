@@ -93,8 +93,19 @@ def help(extensions, cmd=None, stream=sys.stdout):
                 'will only should differences in values if the data frames\n'
                 'that results from loading the files have the same structure\n'
                 '(number of rows and columns, column names, loose column '
-                'types).\n'
-                '[reference files]\n', file=stream)
+                'types).\n\n'
+                'Options:\n'
+                '  --stream          compare the files a batch of rows at a '
+                'time, rather\n'
+                '                    than loading them fully (for very large '
+                'files)\n'
+                '  --batch-rows N    rows per batch, with --stream\n'
+                '  --rows N          maximum number of differing rows to '
+                'show\n'
+                '  --key COLS        comma-separated key column(s) to match '
+                'rows on,\n'
+                '                    instead of comparing them in order\n',
+                file=stream)
         else:
             print('\nNo help available for %s. Try one of the following:\n'
                   '    tdda help discover\n'
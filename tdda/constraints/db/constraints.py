@@ -18,6 +18,7 @@ The top-level functions are:
         but not yet implemented for databases.
 
 """
+import json
 import sys
 
 from tdda.constraints.base import (
@@ -33,6 +34,7 @@ from tdda.constraints.baseconstraints import (
 )
 
 from tdda.constraints.db.drivers import DatabaseHandler
+from tdda.constraints.db.incremental import WatermarkState, MAX_TRACKED_VALUES
 from tdda import rexpy
 
 if sys.version_info[0] >= 3:
@@ -43,6 +45,7 @@ class DatabaseConstraintCalculator(BaseConstraintCalculator):
     def __init__(self, tablename, testing=False):
         self.tablename = tablename
         self.testing = testing
+        self.table_stats = None
 
     def is_null(self, value):
         return self.db_value_is_null(value)
@@ -69,19 +72,29 @@ class DatabaseConstraintCalculator(BaseConstraintCalculator):
         return self.get_database_max(self.tablename, colname)
 
     def calc_min_length(self, colname):
-        return self.get_database_min_length(self.tablename, colname)
+        return self.get_table_stat(colname, 'min_length')
 
     def calc_max_length(self, colname):
-        return self.get_database_max_length(self.tablename, colname)
+        return self.get_table_stat(colname, 'max_length')
 
     def calc_tdda_type(self, colname):
         return self.get_database_column_type(self.tablename, colname)
 
     def calc_null_count(self, colname):
-        return self.get_database_nnull(self.tablename, colname)
+        return self.get_table_stat(colname, 'null_count')
 
     def calc_non_null_count(self, colname):
-        return self.get_database_nnonnull(self.tablename, colname)
+        return self.get_table_stat(colname, 'non_null_count')
+
+    def get_table_stat(self, colname, stat):
+        """
+        Look up a per-column statistic from the batched statistics
+        for the table, calculating them all (in a single query) the
+        first time any of them is needed.
+        """
+        if self.table_stats is None:
+            self.table_stats = self.get_database_table_stats(self.tablename)
+        return self.table_stats[colname].get(stat)
 
     def calc_nunique(self, colname):
         return self.get_database_nunique(self.tablename, colname)
@@ -96,10 +109,20 @@ class DatabaseConstraintCalculator(BaseConstraintCalculator):
     def calc_all_non_nulls_boolean(self, colname):
         raise Exception('database should not require all_non_nulls_boolean')
 
-    def find_rexes(self, colname, values=None, seed=None):
+    def set_query_context(self, context):
+        """
+        Record what is being calculated (a constraint, or a field being
+        discovered) in the query log, if there is one, so that the SQL
+        statements executed can be attributed to it.
+        """
+        if self.query_log is not None:
+            self.query_log.context = context
+
+    def find_rexes(self, colname, values=None, seed=None, time_budget=None):
         if not values:
             values = self.get_database_unique_values(self.tablename, colname)
-        return rexpy.extract(sorted(values), seed=seed)
+        return rexpy.extract(sorted(values), seed=seed,
+                             time_budget=time_budget)
 
     def calc_rex_constraint(self, colname, constraint, detect=False):
         return not self.get_database_rex_match(self.tablename, colname,
@@ -124,7 +147,7 @@ class DatabaseConstraintVerifier(DatabaseConstraintCalculator,
     for verifying every type of constraint against a single database table.
     """
     def __init__(self, dbtype, db, tablename, epsilon=None,
-                 type_checking='strict', testing=False):
+                 type_checking='strict', testing=False, query_log=None):
         """
         Inputs:
 
@@ -138,8 +161,11 @@ class DatabaseConstraintVerifier(DatabaseConstraintCalculator,
                     A table name, referring to a table that exists in the
                     database and is accessible. It can either be a simple
                     name, or a schema-qualified name of the form `schema.name`.
+            *query_log*:
+                    Optional :py:class:`~tdda.constraints.db.querylog.QueryLog`
+                    object, in which to record the SQL statements executed.
         """
-        DatabaseHandler.__init__(self, dbtype, db)
+        DatabaseHandler.__init__(self, dbtype, db, query_log=query_log)
         tablename = self.resolve_table(tablename)
 
         DatabaseConstraintCalculator.__init__(self, tablename, testing)
@@ -147,6 +173,202 @@ class DatabaseConstraintVerifier(DatabaseConstraintCalculator,
         BaseConstraintVerifier.__init__(self, epsilon=epsilon,
                                         type_checking=type_checking)
 
+    def verifiers(self):
+        verifiers = BaseConstraintVerifier.verifiers(self)
+        return {kind: self.logged_verifier(kind, verifier)
+                for kind, verifier in verifiers.items()}
+
+    def logged_verifier(self, kind, verifier):
+        """
+        Wrap a verifier so that the SQL it runs is attributed to the
+        constraint being verified in the query log.
+        """
+        def verify_constraint(colname, constraint, detect=False):
+            self.set_query_context('%s:%s' % (colname, kind))
+            return verifier(colname, constraint, detect=detect)
+        return verify_constraint
+
+
+class IncrementalDatabaseConstraintVerifier(DatabaseConstraintVerifier):
+    """
+    A :py:class:`IncrementalDatabaseConstraintVerifier` object verifies
+    constraints against a database table incrementally, using a
+    watermark column to identify rows added since the last run.
+
+    Statistics for the new rows are merged with those saved in a
+    :py:class:`~tdda.constraints.db.incremental.WatermarkState`. Checks
+    that cannot be merged from statistics (no_duplicates and rex) are
+    made directly against the new rows, using the saved results for
+    the older ones.
+
+    This relies on the table only ever having rows added (with higher
+    watermark values). If the number of rows up to the high watermark
+    is not the number saved plus the number added, rows must have been
+    updated or deleted, so a warning is issued and the statistics are
+    recalculated from scratch.
+    """
+    def __init__(self, dbtype, db, tablename, state, **kwargs):
+        DatabaseConstraintVerifier.__init__(self, dbtype, db, tablename,
+                                            **kwargs)
+        if self.dbtype == 'mongodb':
+            raise NotImplementedError('Incremental verification is not '
+                                      'implemented for MongoDB.')
+        self.state = state
+        self.high = None
+        self.increment = None
+        self.new_rows = 0
+
+    def update_state(self):
+        """
+        Calculate statistics for the rows added since the last run,
+        merge them into the saved state, and use the merged statistics
+        for verification.
+        """
+        wm = self.quoted(self.state.watermark)
+        self.high = self.execute_scalar('SELECT MAX(%s) FROM %s'
+                                        % (wm, self.tablename))
+        if self.high is None:
+            return
+        colnames = self.get_column_names()
+        if any(c not in self.state.fields for c in colnames):
+            self.state.reset()  # new table or new columns: start again
+
+        upto = '%s <= %s' % (wm, self.literal(self.high))
+        if self.state.last is None:
+            self.increment = upto
+        else:
+            self.increment = '%s > %s AND %s' % (wm,
+                                                 self.literal(self.state.last),
+                                                 upto)
+            if not self.only_added(upto):
+                print('Warning: rows of %s have been updated or deleted '
+                      'since the last run (watermark %s); recalculating '
+                      'statistics for the whole table.'
+                      % (self.tablename, self.state.watermark),
+                      file=sys.stderr)
+                self.state.reset()
+                self.increment = upto
+        self.set_row_filter(self.increment)
+        try:
+            stats = self.get_database_table_stats(self.tablename)
+            for colname in colnames:
+                partial = stats[colname]
+                partial.update({'min': None, 'max': None, 'values': []})
+                if partial['non_null_count'] > 0:
+                    partial['min'] = self.get_database_min(self.tablename,
+                                                           colname)
+                    partial['max'] = self.get_database_max(self.tablename,
+                                                           colname)
+                    nunique = self.get_database_nunique(self.tablename,
+                                                        colname)
+                    partial['values'] = (
+                        self.get_database_unique_values(self.tablename,
+                                                        colname)
+                        if nunique <= MAX_TRACKED_VALUES else None)
+                self.state.merge(colname, partial)
+            self.new_rows = self.get_database_nrows(self.tablename)
+        finally:
+            # anything not available from the merged statistics is
+            # calculated over all the rows processed
+            self.set_row_filter(upto)
+        self.state.nrows += self.new_rows
+
+        for colname in colnames:
+            acc = self.state.fields[colname]
+            col_cache = self.cache_values(colname)
+            for stat in ('null_count', 'non_null_count', 'min', 'max',
+                         'min_length', 'max_length'):
+                col_cache[stat] = acc.get(stat)
+            if acc.get('values') is not None:
+                col_cache['uniques'] = acc['values']
+                col_cache['nunique'] = len(acc['values'])
+
+    def only_added(self, upto):
+        """
+        Check that the rows up to the high watermark (those satisfying
+        the condition upto) are exactly those already processed
+        together with those in the increment.
+        """
+        sql = 'SELECT COUNT(*) FROM %s WHERE %s'
+        n_new = self.execute_scalar(sql % (self.tablename, self.increment))
+        n_total = self.execute_scalar(sql % (self.tablename, upto))
+        return self.state.nrows + n_new == n_total
+
+    def save_state(self):
+        """
+        Record that all rows up to the current high watermark have been
+        processed, and save the state.
+        """
+        self.set_row_filter(None)
+        if self.high is not None:
+            self.state.last = self.high
+        if self.state.path:
+            self.state.save()
+
+    def has_history(self):
+        return self.state.last is not None
+
+    def verify_no_duplicates_constraint(self, colname, constraint,
+                                        detect=False):
+        if not self.column_exists(colname):
+            return False
+
+        value = constraint.value
+        if value is False or self.is_null(value):
+            return True
+
+        acc = self.state.fields.get(colname, {})
+        if acc.get('unique') is None or not self.has_history():
+            non_nulls = self.get_non_null_count(colname)
+            unique = self.get_nunique(colname) == non_nulls
+        else:
+            unique = acc['unique'] and self.increment_is_unique(colname)
+        if colname in self.state.fields:
+            acc['unique'] = unique
+        return unique
+
+    def increment_is_unique(self, colname):
+        """
+        Check that the non-null values in the new rows are distinct,
+        both from each other and from those in the rows already processed,
+        using an exact key lookup against the older rows.
+        """
+        col = self.quoted(colname)
+        wm = self.quoted(self.state.watermark)
+        new_values = ('SELECT %s FROM %s WHERE %s AND %s IS NOT NULL'
+                      % (col, self.tablename, self.increment, col))
+        sql = ('SELECT COUNT(*) - COUNT(DISTINCT %s) FROM (%s) AS new_values'
+               % (col, new_values))
+        if self.execute_scalar(sql) > 0:
+            return False
+        sql = ('SELECT COUNT(*) FROM %s WHERE %s <= %s AND %s IN (%s)'
+               % (self.tablename, wm, self.literal(self.state.last), col,
+                  new_values))
+        return self.execute_scalar(sql) == 0
+
+    def calc_rex_constraint(self, colname, constraint, detect=False):
+        if constraint.value is None:
+            return False
+        acc = self.state.fields.get(colname, {})
+        results = acc.setdefault('rex', {})
+        key = json.dumps(constraint.value)
+        previous = results.get(key) if self.has_history() else None
+        if previous is False:
+            return True  # older rows have already failed
+        elif previous is None:
+            ok = self.get_database_rex_match(self.tablename, colname,
+                                             constraint.value)
+        else:
+            upto = self.row_filter
+            self.set_row_filter(self.increment)
+            try:
+                ok = self.get_database_rex_match(self.tablename, colname,
+                                                 constraint.value)
+            finally:
+                self.set_row_filter(upto)
+        results[key] = ok
+        return not ok
+
 
 class DatabaseVerification(Verification):
     """
@@ -165,14 +387,21 @@ class DatabaseConstraintDiscoverer(DatabaseConstraintCalculator,
     A :py:class:`DatabaseConstraintDiscoverer` object is used to discover
     constraints on a single database table.
     """
-    def __init__(self, dbtype, db, tablename, inc_rex=False, seed=None):
-        DatabaseHandler.__init__(self, dbtype, db)
+    def __init__(self, dbtype, db, tablename, inc_rex=False, seed=None,
+                 query_log=None, rex_time_budget=None):
+        DatabaseHandler.__init__(self, dbtype, db, query_log=query_log)
         tablename = self.resolve_table(tablename)
 
         DatabaseConstraintCalculator.__init__(self, tablename)
-        BaseConstraintDiscoverer.__init__(self, inc_rex=inc_rex, seed=seed)
+        BaseConstraintDiscoverer.__init__(self, inc_rex=inc_rex, seed=seed,
+                                          rex_time_budget=rex_time_budget)
         self.tablename = tablename
 
+    def discover_field_constraints(self, fieldname):
+        self.set_query_context('%s:discover' % fieldname)
+        return BaseConstraintDiscoverer.discover_field_constraints(self,
+                                                                   fieldname)
+
 
 def types_compatible(x, y, colname):
     """
@@ -198,6 +427,7 @@ def types_compatible(x, y, colname):
 
 def verify_db_table(dbtype, db, tablename, constraints_path, epsilon=None,
                     type_checking='strict', testing=False, report='all',
+                    query_log=None, watermark=None, state_path=None,
                     **kwargs):
     """
     Verify that (i.e. check whether) the database table provided
@@ -274,6 +504,34 @@ def verify_db_table(dbtype, db, tablename, constraints_path, epsilon=None,
                             when being run as part of an automated test.
                             It suppresses type-compatibility warnings.
 
+        *query_log*:
+                            A
+                            :py:class:`~tdda.constraints.db.querylog.QueryLog`
+                            object. If provided, every SQL statement
+                            executed is recorded in it, along with its
+                            duration, the number of rows returned and
+                            the constraint being verified.
+
+        *watermark*:
+                            The name of a column whose values increase
+                            as rows are added to the table (such as an
+                            ``updated_at`` timestamp or an increasing id).
+                            If provided, verification is incremental:
+                            statistics for the rows processed so far are
+                            saved in the file specified by *state_path*,
+                            and each run only scans rows with watermark
+                            values higher than those already processed.
+                            This assumes that rows are only ever added;
+                            if rows are found to have been updated or
+                            deleted, a warning is issued and the
+                            statistics are recalculated for the whole
+                            table.
+
+        *state_path*:
+                            Path of the JSON file used to save the state
+                            for incremental verification, when a
+                            *watermark* is specified.
+
     Returns:
 
         :py:class:`~tdda.constraints.db.constraints.DatabaseVerification` object.
@@ -297,16 +555,28 @@ def verify_db_table(dbtype, db, tablename, constraints_path, epsilon=None,
         print('Constraints failing: %d\\n' % v.failures)
         print(str(v))
     """
-    dbv = DatabaseConstraintVerifier(dbtype, db, tablename, epsilon=epsilon,
-                                     type_checking=type_checking,
-                                     testing=testing)
+    if watermark:
+        state = WatermarkState(state_path, tablename, watermark)
+        dbv = IncrementalDatabaseConstraintVerifier(
+            dbtype, db, tablename, state, epsilon=epsilon,
+            type_checking=type_checking, testing=testing, query_log=query_log)
+    else:
+        dbv = DatabaseConstraintVerifier(dbtype, db, tablename,
+                                         epsilon=epsilon,
+                                         type_checking=type_checking,
+                                         testing=testing, query_log=query_log)
     if not dbv.check_table_exists(tablename):
         print('No table %s' % tablename, file=sys.stderr)
         sys.exit(1)
     constraints = DatasetConstraints(loadpath=constraints_path)
-    return dbv.verify(constraints,
-                      VerificationClass=DatabaseVerification,
-                      report=report, **kwargs)
+    if watermark:
+        dbv.update_state()
+    result = dbv.verify(constraints,
+                        VerificationClass=DatabaseVerification,
+                        report=report, **kwargs)
+    if watermark:
+        dbv.save_state()
+    return result
 
 
 def detect_db_table(dbtype, db, tablename, constraints_path, epsilon=None,
@@ -319,7 +589,8 @@ def detect_db_table(dbtype, db, tablename, constraints_path, epsilon=None,
                               'for databases.')
 
 
-def discover_db_table(dbtype, db, tablename, inc_rex=False, seed=None):
+def discover_db_table(dbtype, db, tablename, inc_rex=False, seed=None,
+                      query_log=None, rex_time_budget=None):
     """
     Automatically discover potentially useful constraints that characterize
     the database table provided.
@@ -332,6 +603,13 @@ def discover_db_table(dbtype, db, tablename, inc_rex=False, seed=None):
             a database object
         *tablename*:
             a table name
+        *query_log*:
+            Optional :py:class:`~tdda.constraints.db.querylog.QueryLog`
+            object, in which to record the SQL statements executed.
+        *rex_time_budget*:
+            If set, the maximum time (in seconds) to spend on regular
+            expression discovery for each string field (when *inc_rex*
+            is set).
 
     Possible return values:
 
@@ -434,7 +712,9 @@ def discover_db_table(dbtype, db, tablename, inc_rex=False, seed=None):
 
     """
     disco = DatabaseConstraintDiscoverer(dbtype, db, tablename,
-                                         inc_rex=inc_rex, seed=seed)
+                                         inc_rex=inc_rex, seed=seed,
+                                         query_log=query_log,
+                                         rex_time_budget=rex_time_budget)
     if not disco.check_table_exists(tablename):
         print('No table %s' % tablename, file=sys.stderr)
         sys.exit(1)
@@ -31,12 +31,14 @@ from tdda.constraints.db.constraints import detect_db_table
 from tdda.constraints.db.drivers import (database_connection, parse_table_name,
                                          database_arg_parser,
                                          database_arg_flags)
+from tdda.constraints.db.querylog import QueryLog
 
 
 def detect_database_table_from_file(table, constraints_path,
                                     conn=None, dbtype=None, db=None,
                                     host=None, port=None, user=None,
-                                    password=None, **kwargs):
+                                    password=None, query_log=None,
+                                    explain=False, **kwargs):
     """
     detect using the given database table, against constraints in the .tdda
     file specified.
@@ -47,7 +49,11 @@ def detect_database_table_from_file(table, constraints_path,
     db = database_connection(table=table, conn=conn, dbtype=dbtype, db=db,
                              host=host, port=port,
                              user=user, password=password)
+    if query_log:
+        kwargs['query_log'] = QueryLog(query_log, explain=explain)
     print(detect_db_table(dbtype, db, table, constraints_path, **kwargs))
+    if query_log:
+        kwargs['query_log'].report()
 
 
 def get_detect_params(args):
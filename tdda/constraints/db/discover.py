@@ -33,12 +33,14 @@ from tdda.constraints.db.constraints import discover_db_table
 from tdda.constraints.db.drivers import (database_connection, parse_table_name,
                                          database_arg_parser,
                                          database_arg_flags)
+from tdda.constraints.db.querylog import QueryLog
 
 
 def discover_constraints_from_database(table, constraints_path=None,
                                        conn=None, dbtype=None, db=None,
                                        host=None, port=None, user=None,
-                                       password=None, **kwargs):
+                                       password=None, query_log=None,
+                                       explain=False, **kwargs):
     """
     Discover constraints in the given database table.
 
@@ -48,7 +50,11 @@ def discover_constraints_from_database(table, constraints_path=None,
     db = database_connection(table=table, conn=conn, dbtype=dbtype, db=db,
                              host=host, port=port,
                              user=user, password=password)
+    if query_log:
+        kwargs['query_log'] = QueryLog(query_log, explain=explain)
     constraints = discover_db_table(dbtype, db, table, **kwargs)
+    if query_log:
+        kwargs['query_log'].report()
     if constraints is None:
         # should never happen
         return
@@ -8,8 +8,8 @@ import datetime
 import getpass
 import json
 import os
-import re
 import sys
+import time
 
 try:
     import pgdb
@@ -37,12 +37,10 @@ except ImportError:
 from tdda.debug import dprint
 
 
-from tdda.constraints.base import UNICODE_TYPE
-from tdda.constraints.baseconstraints import unicode_string, long_type
 from tdda.constraints.flags import (discover_parser, discover_flags,
                                     verify_parser, verify_flags)
 
-from tdda.utils import handle_tilde
+from tdda.utils import handle_tilde, regex_cache
 
 
 DATABASE_USAGE = '''
@@ -57,6 +55,14 @@ Database connection flags:
   * --user USERNAME          Username to connect as
   * --password PASSWORD      Password to authenticate with
 
+Query instrumentation flags:
+
+  * --query-log FILE         Write a log of the SQL statements executed,
+                             with their timings, to FILE (as JSON lines),
+                             and report total database and Python time
+  * --explain                Include EXPLAIN output in the query log
+                             (only with --query-log)
+
 If --conn is provided, then none of the other options are required, and
 the database connection details are read from the specified file.
 
@@ -68,6 +74,48 @@ if present.
 '''
 
 
+SQL_TYPE_MAP = {
+    'int'                        : 'int',
+    'int4'                       : 'int',
+    'int8'                       : 'int',
+    'long'                       : 'int',
+    'tinyint'                    : 'int',
+    'smallint'                   : 'int',
+    'bigint'                     : 'int',
+    'integer'                    : 'int',
+    'float'                      : 'real',
+    'float4'                     : 'real',
+    'float8'                     : 'real',
+    'float16'                    : 'real',
+    'double'                     : 'real',
+    'numeric'                    : 'real',
+    'number'                     : 'real',
+    'real'                       : 'real',
+    'double precision'           : 'real',
+    'bool'                       : 'bool',
+    'boolean'                    : 'bool',
+    'text'                       : 'string',
+    'text character set utf8'    : 'string',
+    'varchar'                    : 'string',
+    'varchar(max)'               : 'string',
+    'varchar2'                   : 'string',
+    'nvarchar'                   : 'string',
+    'nvarchar(max)'              : 'string',
+    'nvarchar2'                  : 'string',
+    'char'                       : 'string',
+    'nchar'                      : 'string',
+    'name'                       : 'string',
+    'oidvector'                  : 'string',
+    'timestamp'                  : 'date',
+    'timestamp without time zone': 'date',
+    'date'                       : 'date',
+    'datetime'                   : 'date',
+    None                         : None,
+    ''                           : None,
+    'any'                        : None,
+}
+
+
 def get_db_handler(table, dbtype=None, **kw):
     """
     Returns a handler for the database table specified.
@@ -174,6 +222,11 @@ def database_arg_parser(create_parser, usage):
                         nargs=1, help='database server IP port')
     parser.add_argument('-user', '--user', nargs=1, help='username')
     parser.add_argument('-password', '--password', nargs=1, help='password')
+    parser.add_argument('--query-log', nargs=1,
+                        help='file to write SQL query log to')
+    parser.add_argument('--explain', action='store_true',
+                        help='include EXPLAIN output in SQL query log '
+                             '(requires --query-log)')
     return parser
 
 
@@ -186,6 +239,8 @@ def database_arg_flags(create_flags, parser, args, params):
         'port': None,
         'user': None,
         'password': None,
+        'query_log': None,
+        'explain': False,
     })
     flags = create_flags(parser, args, params)
     if flags.conn:
@@ -202,6 +257,11 @@ def database_arg_flags(create_flags, parser, args, params):
         params['user'] = flags.user[0]
     if flags.password:
         params['password'] = flags.password[0]
+    if flags.query_log:
+        params['query_log'] = flags.query_log[0]
+    elif flags.explain:
+        parser.error('--explain can only be used with --query-log')
+    params['explain'] = flags.explain
     return flags
 
 
@@ -341,7 +401,13 @@ def database_connection_mysql(host, port, database, user, password):
 def database_connection_sqlite(host, port, database, user, password):
     if sqlite3:
         dbc = sqlite3.connect(database)
-        dbc.create_function('regexp', 2, regex_matcher)
+        try:
+            # deterministic functions let sqlite factor out repeated calls,
+            # but they need sqlite 3.8.3 or later.
+            dbc.create_function('regexp', 2, regex_matcher,
+                                deterministic=True)
+        except sqlite3.NotSupportedError:
+            dbc.create_function('regexp', 2, regex_matcher)
         return dbc
     else:
         print('sqlite driver not available', file=sys.stderr)
@@ -364,14 +430,54 @@ def database_connection_mongodb(host, port, database, user, password):
         sys.exit(1)
 
 
-def regex_matcher(expr, item):
+class RegexMatcher:
     """
-    REGEXP implementation for Sqlite
+    REGEXP implementation for Sqlite.
+
+    Since the function is called once for every row of the table,
+    compiled patterns are kept in a plain dictionary on the matcher
+    (of up to *maxsize* patterns, cleared when full), so that the usual
+    lookup is as cheap as possible. Patterns not found there are taken
+    from tdda's shared, bounded cache of compiled regular expressions
+    (or the RegexCache provided).
+
+    The matcher counts its own hits and misses, and clear() only
+    clears its own dictionary, not the shared cache.
     """
-    if item is None:
-        return False
-    else:
-        return re.match(expr, item) is not None
+    def __init__(self, cache=None, maxsize=256):
+        self.cache = cache if cache is not None else regex_cache
+        self.maxsize = maxsize
+        self.clear()
+
+    def __call__(self, expr, item):
+        if item is None:
+            return False
+        pattern = self.patterns.get(expr)
+        if pattern is None:
+            self.misses += 1
+            if len(self.patterns) >= self.maxsize:
+                self.patterns.clear()
+            pattern = self.patterns[expr] = self.cache.compile(expr)
+        else:
+            self.hits += 1
+        return pattern.match(item) is not None
+
+    def hit_rate(self):
+        """
+        Proportion of calls for which the compiled pattern was
+        found in the matcher's dictionary (or None, if there have
+        been none).
+        """
+        ncalls = self.hits + self.misses
+        return self.hits / ncalls if ncalls else None
+
+    def clear(self):
+        self.patterns = {}
+        self.hits = 0
+        self.misses = 0
+
+
+regex_matcher = RegexMatcher()
 
 
 class ConnectionSpec:
@@ -437,9 +543,9 @@ class DatabaseHandler:
     """
     Common SQL and NoSQL database support
     """
-    def __init__(self, dbtype, dbc):
+    def __init__(self, dbtype, dbc, query_log=None):
         handlerClass = self.check_db_type(dbtype)
-        self.instance = handlerClass(dbtype, dbc)
+        self.instance = handlerClass(dbtype, dbc, query_log=query_log)
 
     def check_db_type(self, dbtype):
         """
@@ -458,12 +564,39 @@ class SQLDatabaseHandler:
     """
     Common database SQL support
     """
-    def __init__(self, dbtype, db):
+    def __init__(self, dbtype, db, query_log=None):
         self.dbtype = dbtype
         self.db = db
         self.dbc = db.connection
         self.schema = db.schema
         self.cursor = db.connection.cursor()
+        self.query_log = query_log
+        self.row_filter = None
+
+    def source(self, tablename):
+        # the table, or just the rows of it selected by the row filter
+        # (a SQL condition), if one has been set, as a FROM clause source.
+        if self.row_filter:
+            return ('(SELECT * FROM %s WHERE %s) AS filtered'
+                    % (tablename, self.row_filter))
+        else:
+            return tablename
+
+    def set_row_filter(self, condition):
+        # restrict subsequent data queries to rows satisfying the condition
+        # given (or remove any restriction, if it is None)
+        self.row_filter = condition
+
+    def literal(self, value):
+        # a value, as a SQL literal
+        if value is None:
+            return 'NULL'
+        elif isinstance(value, bool):
+            return str(int(value))
+        elif isinstance(value, (int, float)):
+            return str(value)
+        else:
+            return "'%s'" % str(value).replace("'", "''")
 
     def quoted(self, name):
         # quote a columnname
@@ -474,23 +607,50 @@ class SQLDatabaseHandler:
         else:
             return '"%s"' % name
 
+    def execute(self, sql, fetch=True):
+        # execute a SQL statement, returning all its rows (if fetch is set),
+        # and recording it in the query log, if there is one.
+        if self.query_log is None:
+            self.cursor.execute(sql)
+            return self.cursor.fetchall() if fetch else None
+
+        plan = None
+        is_select = sql.lstrip().upper().startswith('SELECT')
+        if self.query_log.explain and is_select:
+            plan = self.explain(sql)
+        start = time.perf_counter()
+        self.cursor.execute(sql)
+        rows = self.cursor.fetchall() if fetch else None
+        duration = time.perf_counter() - start
+        self.query_log.record(sql, duration,
+                              nrows=len(rows) if fetch else None, plan=plan)
+        return rows
+
+    def explain(self, sql):
+        # returns the query plan for a SQL statement, as a list of strings
+        if self.dbtype == 'sqlite':
+            explain_sql = 'EXPLAIN QUERY PLAN %s' % sql
+        else:
+            explain_sql = 'EXPLAIN %s' % sql
+        self.cursor.execute(explain_sql)
+        return [' '.join(str(v) for v in row)
+                for row in self.cursor.fetchall()]
+
     def execute_scalar(self, sql):
         # execute a SQL statement, returning a single scalar result
-        self.cursor.execute(sql)
-        result = self.cursor.fetchall()[0][0]
+        result = self.execute(sql)[0][0]
         if result == '' and self.dbtype == 'sqlite':
             result = None
         return result
 
     def execute_all(self, sql):
         # execute a SQL statement, returning a list of rows
-        self.cursor.execute(sql)
-        return self.cursor.fetchall()
+        return self.execute(sql)
 
     def execute_commit(self, sql, commit_each=False):
         queries = [sql] if type(sql) is str else sql
         for query in queries:
-            self.cursor.execute(query)
+            self.execute(query, fetch=False)
             if commit_each:
                 self.dbc.commit()
         if not commit_each:
@@ -592,46 +752,6 @@ class SQLDatabaseHandler:
             raise Exception('Unsupported database type')
 
     def get_database_column_type(self, tablename, colname):
-        typeMap = {
-            'int'                        : 'int',
-            'int4'                       : 'int',
-            'int8'                       : 'int',
-            'long'                       : 'int',
-            'tinyint'                    : 'int',
-            'smallint'                   : 'int',
-            'bigint'                     : 'int',
-            'integer'                    : 'int',
-            'float'                      : 'real',
-            'float4'                     : 'real',
-            'float8'                     : 'real',
-            'float16'                    : 'real',
-            'double'                     : 'real',
-            'numeric'                    : 'real',
-            'number'                     : 'real',
-            'real'                       : 'real',
-            'double precision'           : 'real',
-            'bool'                       : 'bool',
-            'boolean'                    : 'bool',
-            'text'                       : 'string',
-            'text character set utf8'    : 'string',
-            'varchar'                    : 'string',
-            'varchar(max)'               : 'string',
-            'varchar2'                   : 'string',
-            'nvarchar'                   : 'string',
-            'nvarchar(max)'              : 'string',
-            'nvarchar2'                  : 'string',
-            'char'                       : 'string',
-            'nchar'                      : 'string',
-            'name'                       : 'string',
-            'oidvector'                  : 'string',
-            'timestamp'                  : 'date',
-            'timestamp without time zone': 'date',
-            'date'                       : 'date',
-            'datetime'                   : 'date',
-            None                         : None,
-            ''                           : None,
-            'any'                        : None,
-        }
         (schema, table) = self.split_name(tablename)
         if self.dbtype in ('postgres', 'postgresql', 'mysql'):
             if schema:
@@ -657,21 +777,45 @@ class SQLDatabaseHandler:
                     break
         else:
             raise Exception('Unsupported database type')
-        dtype = typeMap[typeresult.lower()]
+        dtype = SQL_TYPE_MAP[typeresult.lower()]
         return dtype
 
+    def get_database_column_types(self, tablename):
+        """
+        Returns a dictionary of the (tdda) types of all the columns
+        in a table, keyed on column name, in column order, from
+        a single metadata query.
+        """
+        (schema, table) = self.split_name(tablename)
+        if self.dbtype in ('postgres', 'postgresql', 'mysql'):
+            sql = '''
+                SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_NAME = '%s'
+                AND TABLE_SCHEMA = '%s'
+                ORDER BY ORDINAL_POSITION;
+                ''' % (table, schema)
+            rows = self.execute_all(sql)
+        elif self.dbtype == 'sqlite':
+            rows = [(r[1], r[2])
+                    for r in self.execute_all('PRAGMA table_info(%s)'
+                                              % tablename)]
+        else:
+            raise Exception('Unsupported database type')
+        return {name: SQL_TYPE_MAP[typename.lower()]
+                for (name, typename) in rows}
+
     def get_database_nrows(self, tablename):
-        sql = 'SELECT COUNT(*) FROM %s' % tablename
+        sql = 'SELECT COUNT(*) FROM %s' % self.source(tablename)
         return self.execute_scalar(sql)
 
     def get_database_nnull(self, tablename, colname):
         sql = ('SELECT COUNT(*) FROM %s WHERE %s IS NULL'
-               % (tablename, self.quoted(colname)))
+               % (self.source(tablename), self.quoted(colname)))
         return self.execute_scalar(sql)
 
     def get_database_nnonnull(self, tablename, colname):
         sql = ('SELECT COUNT(*) FROM %s WHERE %s IS NOT NULL'
-               % (tablename, self.quoted(colname)))
+               % (self.source(tablename), self.quoted(colname)))
         return self.execute_scalar(sql)
 
     def get_database_min(self, tablename, colname):
@@ -679,9 +823,10 @@ class SQLDatabaseHandler:
         if ctype == 'bool':
             asint = self.cast_bool_to_int(self.quoted(colname))
             expr = self.cast_int_to_bool('MIN(%s)' % asint)
-            sql = 'SELECT %s FROM %s' % (expr, tablename)
+            sql = 'SELECT %s FROM %s' % (expr, self.source(tablename))
         else:
-            sql = 'SELECT MIN(%s) FROM %s' % (self.quoted(colname), tablename)
+            sql = 'SELECT MIN(%s) FROM %s' % (self.quoted(colname),
+                                              self.source(tablename))
         result = self.execute_scalar(sql)
         if ctype == 'date' and type(result) is str:
             result = datetime.datetime.strptime(result, '%Y-%m-%d %H:%M:%S')
@@ -692,41 +837,74 @@ class SQLDatabaseHandler:
         if ctype == 'bool':
             asint = self.cast_bool_to_int(self.quoted(colname))
             expr = self.cast_int_to_bool('MAX(%s)' % asint)
-            sql = 'SELECT %s FROM %s' % (expr, tablename)
+            sql = 'SELECT %s FROM %s' % (expr, self.source(tablename))
         else:
-            sql = 'SELECT MAX(%s) FROM %s' % (self.quoted(colname), tablename)
+            sql = 'SELECT MAX(%s) FROM %s' % (self.quoted(colname),
+                                              self.source(tablename))
         result = self.execute_scalar(sql)
         if ctype == 'date' and type(result) is str:
             result = datetime.datetime.strptime(result, '%Y-%m-%d %H:%M:%S')
         return result
 
     def get_database_min_length(self, tablename, colname):
-        return self.extreme_length(tablename, colname, min, 'MIN')
+        return self.extreme_length(tablename, colname, 'MIN')
 
     def get_database_max_length(self, tablename, colname):
-        return self.extreme_length(tablename, colname, max, 'MAX')
+        return self.extreme_length(tablename, colname, 'MAX')
+
+    def extreme_length(self, tablename, colname, sqlagg):
+        sql = 'SELECT %s(%s) FROM %s' % (sqlagg, self.length_expr(colname),
+                                         self.source(tablename))
+        return self.execute_scalar(sql)
 
-    def extreme_length(self, tablename, colname, agg, sqlagg):
+    def length_expr(self, colname):
+        # SQL expression for the length of a string column, in characters.
+        # MySQL's LENGTH counts bytes, so it needs CHAR_LENGTH instead.
         if self.dbtype == 'mysql':
-            uniqs = self.get_database_unique_values(tablename, colname)
-            if uniqs:
-                if type(uniqs[0]) is unicode_string:
-                    lengths = [len(v) for v in uniqs]
-                else:
-                    lengths = [len(v.decode('UTF-8')) for v in uniqs]
-                return agg(lengths)
-            else:
-                return None
+            return 'CHAR_LENGTH(%s)' % self.quoted(colname)
         else:
-            sql = 'SELECT %s(LENGTH(%s)) FROM %s' % (sqlagg,
-                                                     self.quoted(colname),
-                                                     tablename)
-            return self.execute_scalar(sql)
+            return 'LENGTH(%s)' % self.quoted(colname)
+
+    def get_database_table_stats(self, tablename):
+        """
+        Calculate the per-column statistics needed for verification
+        for every column in a table, using a single metadata query
+        for the column names and types, and a single aggregate query
+        (and so a single scan of the table).
+
+        Returns a dictionary keyed on column name, with each value
+        being a dictionary containing 'null_count' and 'non_null_count',
+        and, for string columns, 'min_length' and 'max_length'.
+        """
+        coltypes = self.get_database_column_types(tablename)
+        colnames = list(coltypes)
+        exprs = ['COUNT(*)']
+        string_cols = set()
+        for colname in colnames:
+            exprs.append('COUNT(%s)' % self.quoted(colname))
+            if coltypes[colname] == 'string':
+                string_cols.add(colname)
+                length = self.length_expr(colname)
+                exprs.extend(['MIN(%s)' % length, 'MAX(%s)' % length])
+        sql = 'SELECT %s FROM %s' % (', '.join(exprs), self.source(tablename))
+        row = list(self.execute_all(sql)[0])
+        nrows = row.pop(0)
+        stats = {}
+        for colname in colnames:
+            non_nulls = row.pop(0)
+            stats[colname] = {
+                'null_count': nrows - non_nulls,
+                'non_null_count': non_nulls,
+            }
+            if colname in string_cols:
+                stats[colname]['min_length'] = row.pop(0)
+                stats[colname]['max_length'] = row.pop(0)
+        return stats
 
     def get_database_nunique(self, tablename, colname):
         colname = self.quoted(colname)
         sql = ('SELECT COUNT(DISTINCT %s) FROM %s WHERE %s IS NOT NULL'
-               % (colname, tablename, colname))
+               % (colname, self.source(tablename), colname))
         return self.execute_scalar(sql)
 
     def get_database_unique_values(self, tablename, colname,
@@ -735,7 +913,8 @@ class SQLDatabaseHandler:
         whereclause = ('' if include_nulls
                        else 'WHERE %s IS NOT NULL' % colname)
         orderby = ('ORDER BY %s ASC' % colname) if sorted_values else ''
-        sql = 'SELECT DISTINCT %s FROM %s %s %s' % (colname, tablename,
+        sql = 'SELECT DISTINCT %s FROM %s %s %s' % (colname,
+                                                    self.source(tablename),
                                                     whereclause, orderby)
         result = self.execute_all(sql)
         return [x[0] for x in result]
@@ -754,13 +933,16 @@ class SQLDatabaseHandler:
         elif self.dbtype == 'sqlite':
             # sqlite doesn't support regular expressions unless the
             # regexp() user-defined function is available - but we have
-            # arranged for that in the database_connection_mongodb function.
-            rexprs = ["(%s REGEXP '%s')" % (name, r) for r in rexes]
+            # arranged for that in the database_connection_sqlite function.
+            # The expressions are combined into a single alternation,
+            # so that the function is only called once per row.
+            rex = '|'.join('(?:%s)' % r for r in rexes).replace("'", "''")
+            rexprs = ["(%s REGEXP '%s')" % (name, rex)]
         else:
             raise Exception('Unsupported database type')
 
         sql = ('SELECT COUNT(*) FROM %s WHERE %s IS NOT NULL AND NOT(%s)'
-               % (tablename, name, ' OR '.join(rexprs)))
+               % (self.source(tablename), name, ' OR '.join(rexprs)))
         return self.execute_scalar(sql) == 0
 
     def cast_bool_to_int(self, s):
@@ -785,10 +967,17 @@ class SQLDatabaseHandler:
 class MongoDBDatabaseHandler:
     """
     NoSQL MonggoDB support
+
+    All of the per-field statistics for a collection are calculated
+    together, in a single $facet aggregation (so a single pass over the
+    collection), the first time any of them is needed, and are then
+    cached on the handler.
     """
-    def __init__(self, dbtype, dbc):
+    def __init__(self, dbtype, dbc, query_log=None):
         self.dbtype = dbtype
         self.db = dbc
+        self.field_stats = {}
+        self.query_log = query_log  # only SQL statements are logged
 
     def find_collection(self, tablename):
         """
@@ -812,94 +1001,135 @@ class MongoDBDatabaseHandler:
         except:
             return False
 
-    def get_database_column_names(self, tablename):
-        collection = self.find_collection(tablename)
-        try:
-            keys = collection.aggregate([
-                {'$project': {'arrayofkeyvalue': {'$objectToArray': '$$ROOT'}}},
-                {'$unwind': '$arrayofkeyvalue'},
-                {'$group': {'_id': None,
-                            'allkeys': {'$addToSet': '$arrayofkeyvalue.k'}}}
-            ]).next()['allkeys'];
-            return keys
-        except:
-            # sometimes the aggregate approach above doesn't work (for
-            # reasons that aren't completely clear), so here's an alternative
-            # approach, which is slower.
-            mapfn = '''function() {
-                            var keys = [];
-                            for (var k in this) {
-                                keys.push(k);
-                            }
-                            emit(null, keys);
-                       }'''
-            redfn = '''function(key, values) {
-                           var keyset = {};
-                           for (var i = 0; i < values.length; i++) {
-                               for (var j = 0; j < values[i].length; j++) {
-                                   keyset[values[i][j]] = true;
-                               }
-                           }
-                           var keys = [];
-                          for (var k in keyset) {
-                               if (k != '_id') {
-                                   keys.push(k);
-                               }
-                           }
-                           return JSON.stringify(keys);
-                       }'''
-            mr = collection.map_reduce(mapfn, redfn, 'inline')
-            v = mr.find_one()['value']
-            # the map/reduce op returns a json repr of the list of keys
-            return json.loads(v)
+    def get_collection_stats(self, tablename):
+        """
+        Returns the number of documents in a collection, together with
+        a dictionary, keyed on field name, of statistics for each field
+        that occurs in any document.
+
+        The statistics for each field are its min, max, null count,
+        non-null count, number of distinct non-null values, the set of
+        BSON types of its non-null values and (for strings) the minimum
+        and maximum string length, in characters.
+
+        The _id field (the document key) is not included.
+
+        They are all computed in a single aggregation pass, and cached.
+        """
+        if tablename in self.field_stats:
+            return self.field_stats[tablename]
 
-    def get_database_column_type(self, tablename, colname):
         collection = self.find_collection(tablename)
-        doc = collection.find_one({colname: {'$ne': None}})
-        if doc:
-            val = doc[colname]
-            valtype = type(val)
-            if valtype == bool:
-                return 'bool'
-            elif valtype in (int, long_type):
-                return 'int'
-            elif valtype == float:
-                return 'real'
-            elif valtype in (str, UNICODE_TYPE):
-                return 'string'
-            elif isinstance(val, datetime.datetime):
-                return 'date'
-            elif isinstance(val, datetime.date):
-                return 'date'
-            else:
-                return 'other'
+        value = '$kv.v'
+        is_null = {'$eq': [value, None]}
+        is_string = {'$eq': [{'$type': value}, 'string']}
+        length = {'$cond': [is_string, {'$strLenCP': value}, None]}
+        unwound = [
+            {'$project': {'kv': {'$objectToArray': '$$ROOT'}}},
+            {'$unwind': '$kv'},
+            {'$match': {'kv.k': {'$ne': '_id'}}},
+        ]
+        pipeline = [
+            {'$facet': {
+                'nrows': [{'$count': 'n'}],
+                'fields': unwound + [
+                    {'$group': {
+                        '_id': '$kv.k',
+                        'min': {'$min': value},
+                        'max': {'$max': value},
+                        'non_null_count': {'$sum': {'$cond': [is_null, 0, 1]}},
+                        'min_length': {'$min': length},
+                        'max_length': {'$max': length},
+                        'types': {'$addToSet': {'$cond': [is_null, None,
+                                                          {'$type': value}]}},
+                    }},
+                ],
+                'distinct': unwound + [
+                    {'$match': {'kv.v': {'$ne': None}}},
+                    {'$group': {'_id': {'k': '$kv.k', 'v': value}}},
+                    {'$group': {'_id': '$_id.k', 'nunique': {'$sum': 1}}},
+                ],
+            }},
+        ]
+        result = collection.aggregate(pipeline, allowDiskUse=True).next()
+        nrows = result['nrows'][0]['n'] if result['nrows'] else 0
+        nuniques = {d['_id']: d['nunique'] for d in result['distinct']}
+        stats = {}
+        for d in result['fields']:
+            colname = d.pop('_id')
+            d['types'] = set(t for t in d['types'] if t is not None)
+            d['null_count'] = nrows - d['non_null_count']
+            d['nunique'] = nuniques.get(colname, 0)
+            stats[colname] = d
+        self.field_stats[tablename] = (nrows, stats)
+        return self.field_stats[tablename]
+
+    def get_field_stat(self, tablename, colname, stat):
+        (nrows, stats) = self.get_collection_stats(tablename)
+        if colname in stats:
+            return stats[colname][stat]
+        elif stat == 'null_count':
+            return nrows
+        elif stat in ('non_null_count', 'nunique'):
+            return 0
+        elif stat == 'types':
+            return set()
         else:
             return None
 
+    def get_database_table_stats(self, tablename):
+        """
+        Calculate the per-column statistics needed for verification
+        for every field in a collection.
+
+        Returns a dictionary keyed on field name, with the same structure
+        as for SQL databases.
+        """
+        (nrows, stats) = self.get_collection_stats(tablename)
+        table_stats = {}
+        for colname, d in stats.items():
+            table_stats[colname] = {
+                'null_count': d['null_count'],
+                'non_null_count': d['non_null_count'],
+            }
+            if d['types'] == {'string'}:
+                table_stats[colname].update({
+                    'min_length': d['min_length'],
+                    'max_length': d['max_length'],
+                })
+        return table_stats
+
+    def get_database_column_names(self, tablename):
+        (nrows, stats) = self.get_collection_stats(tablename)
+        return list(stats.keys())
+
+    def get_database_column_type(self, tablename, colname):
+        types = self.get_field_stat(tablename, colname, 'types')
+        if not types:
+            return None
+        tdda_types = set(MONGODB_TYPE_MAP.get(t, 'other') for t in types)
+        if len(tdda_types) == 1:
+            return tdda_types.pop()
+        elif tdda_types == {'int', 'real'}:
+            return 'real'
+        else:
+            return 'other'
+
     def get_nrows(self, tablename):
         return self.get_database_nrows(tablename)
 
     def get_database_nrows(self, tablename):
-        collection = self.find_collection(tablename)
-        return collection.count()
+        (nrows, stats) = self.get_collection_stats(tablename)
+        return nrows
 
     def get_database_nnull(self, tablename, colname):
-        collection = self.find_collection(tablename)
-        return collection.find({colname: {'$eq': None}}).count()
+        return self.get_field_stat(tablename, colname, 'null_count')
 
     def get_database_nnonnull(self, tablename, colname):
-        collection = self.find_collection(tablename)
-        return collection.find({colname: {'$ne': None}}).count()
+        return self.get_field_stat(tablename, colname, 'non_null_count')
 
     def get_database_nunique(self, tablename, colname):
-        collection = self.find_collection(tablename)
-        agg = collection.aggregate([
-            {'$match': {colname: {'$exists': True}}},
-            {'$match': {colname: {'$ne': None}}},
-            {'$group': {'_id': '$' + colname}},
-            {'$group': {'_id': None, 'nunique': {'$sum': 1}}},
-        ], allowDiskUse=True)
-        return agg.next()['nunique']
+        return self.get_field_stat(tablename, colname, 'nunique')
 
     def get_database_unique_values(self, tablename, colname,
                                    sorted_values=True, include_nulls=False):
@@ -920,42 +1150,16 @@ class MongoDBDatabaseHandler:
             return non_null_values
 
     def get_database_min_length(self, tablename, colname):
-        return self.extreme_length(tablename, colname, min, 'min')
+        return self.get_field_stat(tablename, colname, 'min_length')
 
     def get_database_max_length(self, tablename, colname):
-        return self.extreme_length(tablename, colname, max, 'max')
-
-    def extreme_length(self, tablename, colname, agg, aggstr):
-        collection = self.find_collection(tablename)
-        if self.get_database_column_type(tablename, colname) == 'string':
-            values = self.get_database_unique_values(tablename, colname)
-            v = agg([len(v) for v in values]) if values else None
-        else:
-            mapfn = '''function() {
-                           emit(null, this.name ? this.name.length : null);
-                       }'''
-            redfn = '''function(key, values) {
-                           return Math.%s.apply(Math, values);
-                       }''' % aggstr
-            mr = collection.map_reduce(mapfn, redfn, 'inline')
-            v = mr.find_one()['value']
-        return int(v) if v is not None else None
+        return self.get_field_stat(tablename, colname, 'max_length')
 
     def get_database_min(self, tablename, colname):
-        collection = self.find_collection(tablename)
-        agg = collection.aggregate([
-            {'$match': {colname: {'$exists': True}}},
-            {'$group': {'_id': None, 'min': {'$min': '$' + colname}}},
-        ], allowDiskUse=True)
-        return agg.next()['min']
+        return self.get_field_stat(tablename, colname, 'min')
 
     def get_database_max(self, tablename, colname):
-        collection = self.find_collection(tablename)
-        agg = collection.aggregate([
-            {'$match': {colname: {'$exists': True}}},
-            {'$group': {'_id': None, 'max': {'$max': '$' + colname}}},
-        ])
-        return agg.next()['max']
+        return self.get_field_stat(tablename, colname, 'max')
 
     def db_value_is_null(self, value):
         return value is None
@@ -964,6 +1168,18 @@ class MongoDBDatabaseHandler:
         return value
 
 
+MONGODB_TYPE_MAP = {
+    'bool': 'bool',
+    'int': 'int',
+    'long': 'int',
+    'double': 'real',
+    'decimal': 'real',
+    'string': 'string',
+    'date': 'date',
+    'timestamp': 'date',
+}
+
+
 DATABASE_CONNECTORS = {
     'postgres': database_connection_postgres,
     'postgresql': database_connection_postgres,
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Support for incremental (watermark-based) verification of database tables.
+
+For tables that only ever have rows added, with a column (the *watermark*)
+whose values increase as rows are added (such as an ``updated_at``
+timestamp or a monotonically increasing id), verification does not need
+to scan the whole table every time. Instead, the per-field statistics
+for the rows seen so far are saved, along with the highest watermark
+value processed, and each subsequent run only scans the rows with
+higher watermark values, merging their statistics into the saved ones.
+
+Rows with a null watermark are never included.
+"""
+
+import datetime
+import json
+import os
+
+
+MAX_TRACKED_VALUES = 1000   # Distinct values are kept for fields with
+                            # up to this many of them
+
+
+class WatermarkState:
+    """
+    The persisted state for incremental verification of a database table.
+
+    Inputs:
+
+        *path*:
+                    Path of the JSON file in which the state is kept.
+                    It is loaded, if it exists.
+        *tablename*:
+                    Name of the table the state is for.
+        *watermark*:
+                    Name of the watermark column.
+
+    Attributes:
+
+        *last*:
+                    The highest watermark value already processed,
+                    or ``None`` if nothing has been processed yet.
+        *nrows*:
+                    The number of rows processed so far.
+        *fields*:
+                    Dictionary, keyed on field name, of the merged
+                    statistics for each field. These are
+                    ``null_count``, ``non_null_count``, ``min``, ``max``,
+                    ``min_length`` and ``max_length`` (for strings),
+                    ``values`` (the sorted distinct non-null values, or
+                    ``None`` if there are more than
+                    :py:const:`MAX_TRACKED_VALUES` of them),
+                    ``unique`` (whether the non-null values are all
+                    distinct, if known) and ``rex`` (the results of regular
+                    expression checks, keyed on the expressions).
+    """
+    def __init__(self, path, tablename, watermark):
+        self.path = path
+        self.tablename = tablename
+        self.watermark = watermark
+        self.reset()
+        if path and os.path.exists(path):
+            self.load()
+
+    def reset(self):
+        self.last = None
+        self.nrows = 0
+        self.fields = {}
+
+    def load(self):
+        with open(self.path) as f:
+            d = json.loads(f.read())
+        if (d.get('table') != self.tablename
+                or d.get('watermark') != self.watermark):
+            raise Exception('Watermark state file %s is for table %s '
+                            '(watermark %s), not %s (watermark %s)'
+                            % (self.path, d.get('table'), d.get('watermark'),
+                               self.tablename, self.watermark))
+        self.last = decode_value(d['last'])
+        self.nrows = d['nrows']
+        self.fields = {
+            name: {k: decode_value(v) for k, v in acc.items()}
+            for name, acc in d['fields'].items()
+        }
+
+    def save(self):
+        d = {
+            'table': self.tablename,
+            'watermark': self.watermark,
+            'last': encode_value(self.last),
+            'nrows': self.nrows,
+            'fields': {
+                name: {k: encode_value(v) for k, v in acc.items()}
+                for name, acc in self.fields.items()
+            },
+        }
+        with open(self.path, 'w') as f:
+            f.write(json.dumps(d, indent=4, sort_keys=True))
+
+    def merge(self, colname, partial):
+        """
+        Merge the statistics for a field calculated from new rows
+        into the saved statistics for that field.
+        """
+        acc = self.fields.get(colname)
+        if acc is None:
+            self.fields[colname] = dict(partial)
+            return
+        for k in ('null_count', 'non_null_count'):
+            acc[k] = acc[k] + partial[k]
+        for k in ('min', 'min_length'):
+            acc[k] = extreme(min, acc.get(k), partial.get(k))
+        for k in ('max', 'max_length'):
+            acc[k] = extreme(max, acc.get(k), partial.get(k))
+        if acc.get('values') is None or partial.get('values') is None:
+            acc['values'] = None
+        else:
+            values = sorted(set(acc['values']) | set(partial['values']))
+            acc['values'] = (values if len(values) <= MAX_TRACKED_VALUES
+                             else None)
+
+
+def extreme(agg, x, y):
+    """
+    Apply *agg* (min or max) to *x* and *y*, ignoring nulls.
+    """
+    if x is None:
+        return y
+    elif y is None:
+        return x
+    else:
+        return agg(x, y)
+
+
+def encode_value(value):
+    """
+    Convert a value to a form that can be saved as JSON.
+    """
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    elif isinstance(value, datetime.date):
+        return {'date': value.isoformat()}
+    elif isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    elif isinstance(value, dict):
+        return {k: encode_value(v) for k, v in value.items()}
+    else:
+        return value
+
+
+def decode_value(value):
+    """
+    Inverse of :py:func:`encode_value`.
+    """
+    if isinstance(value, dict):
+        if list(value.keys()) == ['datetime']:
+            return datetime.datetime.fromisoformat(value['datetime'])
+        elif list(value.keys()) == ['date']:
+            return datetime.date.fromisoformat(value['date'])
+        else:
+            return {k: decode_value(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [decode_value(v) for v in value]
+    else:
+        return value
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+Instrumentation for the SQL statements run against a database
+during constraint discovery and verification.
+
+A :py:class:`QueryLog` object can be passed to
+:py:func:`tdda.constraints.discover_db_table` or
+:py:func:`tdda.constraints.verify_db_table` (or given on the command
+line with ``--query-log FILE``), in which case every statement executed
+is recorded, together with how long it took, how many rows it returned
+and the constraint (or field) that caused it to be run.
+"""
+
+import json
+import sys
+import time
+
+
+class QueryLog:
+    """
+    A record of the SQL statements executed by a database handler.
+
+    Inputs:
+
+        *path*:
+                If provided, the path of a file to which the log will be
+                written (as JSON lines, one per statement) by
+                :py:meth:`write`.
+
+        *explain*:
+                If set, the ``EXPLAIN`` output for each ``SELECT``
+                statement is also captured (at the cost of an extra
+                round trip for each).
+    """
+    def __init__(self, path=None, explain=False):
+        self.path = path
+        self.explain = explain
+        self.entries = []
+        self.context = None
+        self.start_time = time.perf_counter()
+
+    def record(self, sql, duration, nrows=None, plan=None):
+        """
+        Add an entry to the log for a statement that has been executed.
+        """
+        entry = {
+            'sql': ' '.join(sql.split()),
+            'duration': duration,
+            'rows': nrows,
+            'constraint': self.context,
+        }
+        if plan is not None:
+            entry['explain'] = plan
+        self.entries.append(entry)
+
+    def db_time(self):
+        """
+        Total time (in seconds) spent executing statements in the database.
+        """
+        return sum(e['duration'] for e in self.entries)
+
+    def elapsed_time(self):
+        """
+        Time (in seconds) since the log was created.
+        """
+        return time.perf_counter() - self.start_time
+
+    def summary(self):
+        """
+        Returns a short summary of the time spent in the database
+        and in Python.
+        """
+        elapsed = self.elapsed_time()
+        db_time = self.db_time()
+        return ('%d SQL statements; database time %.3fs; '
+                'Python time %.3fs; total %.3fs'
+                % (len(self.entries), db_time, elapsed - db_time, elapsed))
+
+    def write(self, path=None):
+        """
+        Write the log to the path given (or to the path specified
+        when the log was created), as JSON lines.
+        """
+        path = path or self.path
+        with open(path, 'w') as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, default=str) + '\n')
+
+    def report(self, stream=sys.stderr):
+        """
+        Write the log (if it has a path) and print the summary.
+        """
+        if self.path:
+            self.write()
+        print(self.summary(), file=stream)
@@ -18,9 +18,12 @@ The tests will run on Postgres and MySQL, provided that:
 The tests don't (yet) run on MongoDB.
 """
 
+import io
 import json
 import os
+import shutil
 import sys
+import tempfile
 import unittest
 
 try:
@@ -52,7 +55,11 @@ from tdda.constraints.db.drivers import (
     database_connection,
     DatabaseHandler,
     initialize_db,
+    MongoDBDatabaseHandler,
+    regex_matcher,
 )
+from tdda.constraints.db.querylog import QueryLog
+from tdda.constraints.db.verify import get_verify_params
 from tdda.constraints.db.constraints import (verify_db_table,
                                              discover_db_table)
 
@@ -109,6 +116,27 @@ class TestDatabaseHandlers:
         self.assertEqual(self.dbh.get_database_nnonnull(elements, 'Colour'),
                          33)
 
+    def test_handler_lengths(self):
+        elements = self.dbh.resolve_table('elements')
+        self.assertEqual(self.dbh.get_database_min_length(elements, 'Name'),
+                         3)
+        self.assertEqual(self.dbh.get_database_max_length(elements, 'Name'),
+                         13)
+
+    def test_handler_table_stats(self):
+        elements = self.dbh.resolve_table('elements')
+        stats = self.dbh.get_database_table_stats(elements)
+        self.assertEqual(stats['Colour'], {'null_count': 85,
+                                           'non_null_count': 33,
+                                           'min_length': 4,
+                                           'max_length': 80})
+        self.assertEqual(stats['Name'], {'null_count': 0,
+                                         'non_null_count': 118,
+                                         'min_length': 3,
+                                         'max_length': 13})
+        self.assertEqual(stats['Z'], {'null_count': 0,
+                                      'non_null_count': 118})
+
     def test_handler_unique_values(self):
         elements = self.dbh.resolve_table('elements')
         self.assertEqual(self.dbh.get_database_unique_values(elements,
@@ -228,6 +256,122 @@ class TestSQLiteDB(
         self.assertTrue(dbh.check_table_exists(elements))
         self.assertFalse(dbh.check_table_exists('does_not_exist'))
 
+    def test_sqlite_rex_match(self):
+        elements = self.dbh.resolve_table('elements')
+        regex_matcher.clear()
+        self.assertTrue(self.dbh.get_database_rex_match(elements, 'Symbol',
+                                                        ['^[A-Z]$',
+                                                         '^[A-Z][a-z]+$']))
+        self.assertFalse(self.dbh.get_database_rex_match(elements, 'Symbol',
+                                                         ['^[A-Z]$']))
+        self.assertEqual(regex_matcher.misses, 2)
+        self.assertGreater(regex_matcher.hit_rate(), 0.95)
+
+    def test_sqlite_table_stats_queries(self):
+        query_log = QueryLog()
+        dbh = DatabaseHandler('sqlite', self.db, query_log=query_log)
+        stats = dbh.get_database_table_stats(dbh.resolve_table('elements'))
+        self.assertEqual(stats['Z'], {'null_count': 0,
+                                      'non_null_count': 118})
+        # one metadata query and one aggregate query, however many columns
+        self.assertEqual(len(query_log.entries), 2)
+
+    def test_sqlite_query_log(self):
+        constraints_file = os.path.join(TESTDATA_DIR, 'elements92.tdda')
+        query_log = QueryLog(explain=True)
+        result = verify_db_table('sqlite', self.db, 'elements',
+                                 constraints_file, testing=True,
+                                 query_log=query_log)
+        self.assertEqual(result.passes, 57)
+        contexts = set(e['constraint'] for e in query_log.entries)
+        self.assertIn('Name:min_length', contexts)
+        self.assertIn('Z:min', contexts)
+        for entry in query_log.entries:
+            self.assertGreaterEqual(entry['duration'], 0)
+            if entry['sql'].startswith('SELECT'):
+                self.assertTrue(len(entry['explain']) > 0)
+        self.assertTrue(query_log.summary().startswith(
+            '%d SQL statements; database time ' % len(query_log.entries)))
+
+    def test_explain_requires_query_log(self):
+        args = ['sqlite:elements', 'elements.tdda', '--explain']
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()  # discard usage message
+        try:
+            with self.assertRaises(SystemExit):
+                get_verify_params(args)
+            self.assertIn('--explain can only be used with --query-log',
+                          sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def test_sqlite_incremental_verify(self):
+        constraints_file = os.path.join(TESTDATA_DIR, 'elements92rex.tdda')
+        tmpdir = tempfile.mkdtemp()
+        dbfile = os.path.join(tmpdir, 'example.sqlite3')
+        state_path = os.path.join(tmpdir, 'elements-state.json')
+        shutil.copy(self.dbfile, dbfile)
+        db = database_connection(dbtype='sqlite', db=dbfile)
+        dbh = DatabaseHandler('sqlite', db)
+        dbh.execute_commit(['CREATE TABLE later AS SELECT * FROM elements '
+                            'WHERE "Z" > 92',
+                            'DELETE FROM elements WHERE "Z" > 92'])
+        full = verify_db_table('sqlite', db, 'elements', constraints_file,
+                               testing=True)
+        result = verify_db_table('sqlite', db, 'elements', constraints_file,
+                                 testing=True, watermark='Z',
+                                 state_path=state_path)
+        self.assertEqual((result.passes, result.failures),
+                         (full.passes, full.failures))
+
+        # add the remaining elements, and check that only they are scanned
+        dbh.execute_commit('INSERT INTO elements SELECT * FROM later')
+        query_log = QueryLog()
+        result = verify_db_table('sqlite', db, 'elements', constraints_file,
+                                 testing=True, watermark='Z',
+                                 state_path=state_path, query_log=query_log)
+        self.assertEqual(result.passes, 61)
+        self.assertEqual(result.failures, 17)
+        for entry in query_log.entries:
+            if 'FROM (SELECT * FROM elements WHERE' in entry['sql']:
+                self.assertIn('"Z" > 92', entry['sql'])
+        with open(state_path) as f:
+            self.assertEqual(json.load(f)['last'], 118)
+        dbh.dbc.close()
+
+    def test_sqlite_incremental_verify_updated_rows(self):
+        constraints_file = os.path.join(TESTDATA_DIR, 'elements92.tdda')
+        tmpdir = tempfile.mkdtemp()
+        dbfile = os.path.join(tmpdir, 'example.sqlite3')
+        state_path = os.path.join(tmpdir, 'elements-state.json')
+        shutil.copy(self.dbfile, dbfile)
+        db = database_connection(dbtype='sqlite', db=dbfile)
+        dbh = DatabaseHandler('sqlite', db)
+        verify_db_table('sqlite', db, 'elements', constraints_file,
+                        testing=True, watermark='Z', state_path=state_path)
+
+        # an update moves a row past the watermark, as with updated_at
+        dbh.execute_commit('UPDATE elements SET "Z" = 200, "Colour" = NULL '
+                           'WHERE "Z" = 1')
+        full = verify_db_table('sqlite', db, 'elements', constraints_file,
+                               testing=True)
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            result = verify_db_table('sqlite', db, 'elements',
+                                     constraints_file, testing=True,
+                                     watermark='Z', state_path=state_path)
+            warning = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertIn('have been updated or deleted', warning)
+        self.assertEqual((result.passes, result.failures),
+                         (full.passes, full.failures))
+        with open(state_path) as f:
+            state = json.load(f)
+        self.assertEqual((state['nrows'], state['last']), (118, 200))
+        dbh.dbc.close()
+
 
 
 
@@ -265,6 +409,71 @@ class TestMySQLDB(
         cls.dbh = DatabaseHandler(dbtype, cls.db)
 
 
+class FakeMongoCollection:
+    """
+    Stand-in for a pymongo collection, recording the aggregation
+    pipelines it is given and returning a canned result.
+    """
+    def __init__(self, result):
+        self.result = result
+        self.pipelines = []
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        self.pipelines.append(pipeline)
+        return FakeMongoCursor([self.result])
+
+
+class FakeMongoCursor:
+    def __init__(self, docs):
+        self.docs = iter(docs)
+
+    def next(self):
+        return next(self.docs)
+
+
+class TestMongoDBStats(unittest.TestCase):
+    def test_collection_stats(self):
+        collection = FakeMongoCollection({
+            'nrows': [{'n': 3}],
+            'fields': [
+                {'_id': 'name', 'min': 'Al', 'max': 'Zoe',
+                 'non_null_count': 3, 'min_length': 2, 'max_length': 3,
+                 'types': ['string']},
+                {'_id': 'age', 'min': 7, 'max': 41, 'non_null_count': 2,
+                 'min_length': None, 'max_length': None,
+                 'types': ['int', None, 'double']},
+            ],
+            'distinct': [{'_id': 'name', 'nunique': 3},
+                         {'_id': 'age', 'nunique': 2}],
+        })
+        dbh = MongoDBDatabaseHandler('mongodb', None)
+        dbh.find_collection = lambda tablename: collection
+
+        self.assertEqual(dbh.get_database_nrows('people'), 3)
+        self.assertEqual(dbh.get_database_column_names('people'),
+                         ['name', 'age'])
+        self.assertEqual(dbh.get_database_column_type('people', 'age'),
+                         'real')
+        self.assertEqual(dbh.get_database_nnull('people', 'age'), 1)
+        self.assertEqual(dbh.get_database_nunique('people', 'name'), 3)
+        self.assertEqual(dbh.get_database_nnull('people', 'missing'), 3)
+        self.assertEqual(dbh.get_database_table_stats('people'), {
+            'name': {'null_count': 0, 'non_null_count': 3,
+                     'min_length': 2, 'max_length': 3},
+            'age': {'null_count': 1, 'non_null_count': 2},
+        })
+
+        # a single $facet aggregation, cached, which leaves out _id
+        self.assertEqual(len(collection.pipelines), 1)
+        (stage,) = collection.pipelines[0]
+        facets = stage['$facet']
+        self.assertEqual(sorted(facets), ['distinct', 'fields', 'nrows'])
+        self.assertEqual(facets['nrows'], [{'$count': 'n'}])
+        for name in ('fields', 'distinct'):
+            self.assertIn({'$match': {'kv.k': {'$ne': '_id'}}},
+                          facets[name])
+
+
 TestSQLiteDB.set_default_data_location(TESTDATA_DIR)
 TestPostgresDB.set_default_data_location(TESTDATA_DIR)
 TestMySQLDB.set_default_data_location(TESTDATA_DIR)
@@ -17,6 +17,18 @@ Parameters:
 
   * constraints.tdda is a JSON .tdda file constaining constraints.
 
+Incremental verification flags:
+
+  * --watermark COLUMN       Verify incrementally, only scanning rows
+                             whose value in COLUMN is higher than any
+                             already processed (for tables that only
+                             ever have rows added; if rows have been
+                             updated or deleted, with a watermark such
+                             as updated_at, all the rows are scanned
+                             again, with a warning)
+  * --watermark-state FILE   File in which to keep the saved statistics
+                             and high watermark between runs
+
 '''
 
 import argparse
@@ -29,12 +41,14 @@ from tdda.constraints.db.constraints import verify_db_table
 from tdda.constraints.db.drivers import (database_connection, parse_table_name,
                                          database_arg_parser,
                                          database_arg_flags)
+from tdda.constraints.db.querylog import QueryLog
 
 
 def verify_database_table_from_file(table, constraints_path,
                                     conn=None, dbtype=None, db=None,
                                     host=None, port=None, user=None,
-                                    password=None, **kwargs):
+                                    password=None, query_log=None,
+                                    explain=False, **kwargs):
     """
     Verify the given database table, against constraints in the .tdda
     file specified.
@@ -45,7 +59,11 @@ def verify_database_table_from_file(table, constraints_path,
     db = database_connection(table=table, conn=conn, dbtype=dbtype, db=db,
                              host=host, port=port,
                              user=user, password=password)
+    if query_log:
+        kwargs['query_log'] = QueryLog(query_log, explain=explain)
     print(verify_db_table(dbtype, db, table, constraints_path, **kwargs))
+    if query_log:
+        kwargs['query_log'].report()
 
 
 def get_verify_params(args):
@@ -53,10 +71,20 @@ def get_verify_params(args):
     parser.add_argument('table', nargs=1, help='database table name')
     parser.add_argument('constraints', nargs='?',
                         help='constraints file to verify against')
+    parser.add_argument('--watermark', nargs=1,
+                        help='watermark column for incremental verification')
+    parser.add_argument('--watermark-state', nargs=1,
+                        help='state file for incremental verification')
     params = {}
     flags = database_arg_flags(verify_flags, parser, args, params)
     params['table'] = flags.table[0] if flags.table else None
     params['constraints_path'] = flags.constraints
+    if flags.watermark:
+        if not flags.watermark_state:
+            print('--watermark requires --watermark-state', file=sys.stderr)
+            sys.exit(1)
+        params['watermark'] = flags.watermark[0]
+        params['state_path'] = flags.watermark_state[0]
     return params
 
 
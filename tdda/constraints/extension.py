@@ -327,10 +327,13 @@ class BaseConstraintCalculator:
         """
         raise NotImplementedError('all_non_nulls_boolean')
 
-    def find_rexes(self, colname, values=None):
+    def find_rexes(self, colname, values=None, seed=None, time_budget=None):
         """
         Generate a list of regular expressions that cover all of
         the patterns found in the (string) column.
+
+        If *time_budget* is set, it is the maximum time (in seconds)
+        to spend doing so.
         """
         raise NotImplementedError('find_rexes')
 
@@ -15,6 +15,13 @@ Optional flags are:
       Include regular expression generation. Disabled by default.
   * -R or --norex
       Exclude regular expression generation (the default)
+  * --rex-time-budget SECONDS
+      Limit the time spent generating regular expressions for each
+      string field. When it runs out, the expressions found so far are
+      used, with a .{m,n} expression for any values they do not match.
+
+If the TDDA_REXPY_CACHE environment variable is set, regular expressions
+generated are saved in (and reused from) a cache in the directory it names.
 '''
 
 VERIFY_HELP = '''
@@ -77,6 +84,9 @@ def discover_parser(usage=''):
                         help='include regular expression generation')
     parser.add_argument('-R', '--norex', action='store_true',
                         help='exclude regular expression generation')
+    parser.add_argument('--rex-time-budget', type=float, metavar='SECONDS',
+                        help='maximum time to spend generating regular '
+                             'expressions for each field')
     parser.add_argument('-7', '--ascii', action='store_true',
                         help='report without using special characters')
     return parser
@@ -88,6 +98,8 @@ def discover_flags(parser, args, params):
         print(parser.epilog, file=sys.stderr)
         sys.exit(1)
     params['inc_rex'] = flags.rex
+    if flags.rex_time_budget is not None:
+        params['rex_time_budget'] = flags.rex_time_budget
     return flags
 
 
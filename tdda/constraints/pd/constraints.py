@@ -69,6 +69,7 @@ from tdda.serial.utils import (
     find_metadata_type_from_path
 )
 from tdda.serial.pandasio import to_pandas_read_csv_args
+from tdda.utils import compiled_regex
 
 # pd.tslib is deprecated in newer versions of Pandas
 if hasattr(pd, 'Timestamp'):
@@ -175,11 +176,12 @@ class PandasConstraintCalculator(BaseConstraintCalculator):
         # unique values, despite not counting them with .nunique()
         return [None, np.nan, pd.NaT]
 
-    def find_rexes(self, colname, values=None, seed=None):
+    def find_rexes(self, colname, values=None, seed=None, time_budget=None):
         if values is None:
-            return rexpy.pdextract(self.df[colname])
+            return rexpy.pdextract(self.df[colname], seed=seed,
+                                   time_budget=time_budget)
         else:
-            return rexpy.extract(values, seed=None)
+            return rexpy.extract(values, seed=seed, time_budget=time_budget)
 
     def calc_rex_constraint(self, colname, constraint, detect=False):
         # note that this should return a set of violations, not True/False.
@@ -187,14 +189,14 @@ class PandasConstraintCalculator(BaseConstraintCalculator):
         if rexes is None:      # a null value is not considered
             return None        # to be an active constraint,
                                # so is always satisfied
-        rexes = [re.compile(r, RE_FLAGS) for r in rexes]
+        rexes = [compiled_regex(r, RE_FLAGS) for r in rexes]
         strings = [native_definite(s)
                    for s in self.df[colname].dropna().unique()]
 
         failures = set()
         for s in strings:
             for r in rexes:
-                if re.match(r, s):
+                if r.match(s):
                     break
             else:
                 if DEBUG:
@@ -568,9 +570,55 @@ class PandasConstraintDiscoverer(PandasConstraintCalculator,
     A :py:class:`PandasConstraintDiscoverer` object is used to discover
     constraints on a Pandas DataFrame.
     """
-    def __init__(self, df, inc_rex=False):
+    def __init__(self, df, inc_rex=False, rex_time_budget=None):
         PandasConstraintCalculator.__init__(self, df)
-        BaseConstraintDiscoverer.__init__(self, inc_rex=inc_rex)
+        BaseConstraintDiscoverer.__init__(self, inc_rex=inc_rex,
+                                          rex_time_budget=rex_time_budget)
+        self.batch_rexes = {}
+        self.batch_uniqs = {}
+
+    def discover(self):
+        if self.inc_rex:
+            self.batch_rexes = self.find_all_rexes()
+        try:
+            return BaseConstraintDiscoverer.discover(self)
+        finally:
+            self.batch_uniqs = {}  # only needed during discovery
+
+    def find_all_rexes(self):
+        """
+        Find regular expressions for all the string columns together,
+        so that rexpy can share work between them.
+
+        Returns a dictionary of the regular expressions for each column,
+        which are the same as find_rexes would return for it.
+
+        The (non-null) unique values of the string columns are kept,
+        so that field discovery can use them rather than finding them
+        again.
+        """
+        columns = {}
+        for colname in self.get_column_names():
+            if self.calc_tdda_type(colname) == 'string':
+                uniqs = self.calc_unique_values(colname, include_nulls=False)
+                self.batch_uniqs[colname] = uniqs
+                if uniqs:
+                    columns[colname] = uniqs
+        return rexpy.extract_columns(columns, seed=self.seed,
+                                     time_budget=self.rex_time_budget)
+
+    def calc_unique_values(self, colname, include_nulls=True):
+        if not include_nulls and colname in self.batch_uniqs:
+            return list(self.batch_uniqs[colname])
+        return PandasConstraintCalculator.calc_unique_values(
+            self, colname, include_nulls=include_nulls)
+
+    def find_rexes(self, colname, values=None, seed=None, time_budget=None):
+        if colname in self.batch_rexes:
+            return self.batch_rexes[colname]
+        return PandasConstraintCalculator.find_rexes(self, colname,
+                                                     values=values, seed=seed,
+                                                     time_budget=time_budget)
 
 
 def pandas_types_compatible(x, y, colname=None):
@@ -980,7 +1028,7 @@ def detect_df(df, constraints_path, epsilon=None, type_checking=None,
                       report=report, **kwargs)
 
 
-def discover_df(df, inc_rex=False, df_path=None):
+def discover_df(df, inc_rex=False, df_path=None, rex_time_budget=None):
     """
     Automatically discover potentially useful constraints that characterize
     the Pandas DataFrame provided.
@@ -997,6 +1045,12 @@ def discover_df(df, inc_rex=False, df_path=None):
         *df_path*:
             The path from which the dataframe was loaded, if any.
 
+        *rex_time_budget*:
+            If set, the maximum time (in seconds) to spend on regular
+            expression discovery for each string field. When this runs
+            out, rexpy returns the expressions found so far, with
+            a ``.{m,n}`` expression for any values not matched by them.
+
     Possible return values:
 
     -  :py:class:`~tdda.constraints.base.DatasetConstraints` object
@@ -1104,7 +1158,8 @@ def discover_df(df, inc_rex=False, df_path=None):
     See *simple_generation.py* in the :ref:`constraint_examples`
     for a slightly fuller example.
     """
-    disco = PandasConstraintDiscoverer(df, inc_rex=inc_rex)
+    disco = PandasConstraintDiscoverer(df, inc_rex=inc_rex,
+                                       rex_time_budget=rex_time_budget)
     constraints = disco.discover()
     if constraints:
         constraints.set_dates_user_host_creator()
@@ -15,6 +15,7 @@ try:
         TestSQLiteDB,
         TestPostgresDB,
         TestMySQLDB,
+        TestMongoDBStats,
     )
     # The individual imports of the database driver libraries
     # are now all protected with try...except blocks,
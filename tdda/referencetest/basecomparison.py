@@ -138,6 +138,44 @@ class BaseComparison(object):
             )
             same = False
 
+    def different_keys(self, diffs, missing_keys, extra_keys):
+        """
+        Record the fact that, when rows are matched on key columns,
+        some keys (or repeats of keys) are only present in one of the
+        data frames. missing_keys and extra_keys are data frames of the
+        values of the key columns.
+        """
+        self.failure(diffs, 'Data frames have different keys.')
+        if len(missing_keys):
+            self.info(diffs, 'Missing keys (%s):\n%s'
+                             % (f'{len(missing_keys):,}',
+                                sample_keys(missing_keys)))
+        if len(extra_keys):
+            self.info(diffs, 'Extra keys (%s):\n%s'
+                             % (f'{len(extra_keys):,}',
+                                sample_keys(extra_keys)))
+        diffs.df.missing_keys = missing_keys
+        diffs.df.extra_keys = extra_keys
+
+    def different_rows(self, diffs, missing_rows, extra_rows):
+        """
+        Record the fact that, ignoring row order, some rows occur more
+        often in one of the data frames than the other. missing_rows and
+        extra_rows are data frames of the surplus rows in each.
+        """
+        self.failure(diffs, 'Data frames have different rows '
+                            '(ignoring order).')
+        if len(missing_rows):
+            self.info(diffs, 'Missing rows (%s):\n%s'
+                             % (f'{len(missing_rows):,}',
+                                sample_keys(missing_rows)))
+        if len(extra_rows):
+            self.info(diffs, 'Extra rows (%s):\n%s'
+                             % (f'{len(extra_rows):,}',
+                                sample_keys(extra_rows)))
+        diffs.df.missing_rows = missing_rows
+        diffs.df.extra_rows = extra_rows
+
 
 
 class Diffs:
@@ -197,13 +235,16 @@ class SameStructureDDiff:
     Container for information about differences betwee data frames
     with the same structure.
     """
-    def __init__(self, shape, diff_df, row_counts, n_vals, n_cols, n_rows):
+    def __init__(self, shape, diff_df, row_counts, n_vals, n_cols, n_rows,
+                 col_counts=None):
         self.shape = shape
         self.n_diff_values = n_vals
         self.n_diff_cols = n_cols
         self.n_diff_rows = n_rows
         self.diff_df = diff_df            # keyed on common column name
         self.row_diff_counts = row_counts # count of diffs on each row
+        self.col_counts = col_counts      # count of diffs in each column,
+                                          # if diff_df doesn't have all rows
 
     def __str__(self):
         lines = [
@@ -221,7 +262,8 @@ class SameStructureDDiff:
             f'Total number of columns with differences: {self.n_diff_cols:,}:',
         ])
         for c in self.diff_df:
-            n = self.diff_df[c].sum()
+            n = (self.col_counts[c] if self.col_counts is not None
+                 else self.diff_df[c].sum())
             lines.append(f'  {n:10,}: {c}')
 
         return '\n'.join(lines)
@@ -321,6 +363,11 @@ class DataFrameDiffs:
         self.verbose = verbose
 
         self.diff = None           # SameStructureDDiff
+        self.missing_keys = None   # key values only in expected, if keyed
+        self.extra_keys = None     # key values only in actual, if keyed
+        self.aligned = None        # (actual, expected), aligned on key
+        self.missing_rows = None   # surplus rows in expected, if unordered
+        self.extra_rows = None     # surplus rows in actual, if unordered
 
 
     @property
@@ -384,6 +431,28 @@ class DataFrameDiffs:
         elif self.verbose:
             msgs.append('Dataframes have same length')
 
+        if self.missing_keys is not None and len(self.missing_keys):
+            n = len(self.missing_keys)
+            msgs.append(f'{n:,} key{"" if n == 1 else "s"} missing '
+                        f'from {lname}:')
+            msgs.append(sample_keys(self.missing_keys))
+        if self.extra_keys is not None and len(self.extra_keys):
+            n = len(self.extra_keys)
+            msgs.append(f'{n:,} unexpected key{"" if n == 1 else "s"} '
+                        f'in {lname}:')
+            msgs.append(sample_keys(self.extra_keys))
+
+        if self.missing_rows is not None and len(self.missing_rows):
+            n = len(self.missing_rows)
+            msgs.append(f'{n:,} row{"" if n == 1 else "s"} missing '
+                        f'from {lname}:')
+            msgs.append(sample_keys(self.missing_rows))
+        if self.extra_rows is not None and len(self.extra_rows):
+            n = len(self.extra_rows)
+            msgs.append(f'{n:,} unexpected row{"" if n == 1 else "s"} '
+                        f'in {lname}:')
+            msgs.append(sample_keys(self.extra_rows))
+
         if self.diff:
             msgs.append(str(self.diff))
 
@@ -397,6 +466,15 @@ def copycmd():
     return 'copy' if os.name and os.name != 'posix' else 'cp'
 
 
+def sample_keys(keys, n=10):
+    """
+    String showing (up to) the first n rows of a data frame of key values
+    (or of rows).
+    """
+    s = keys.head(n).to_string(index=False)
+    return s + ('\n...' if len(keys) > n else '')
+
+
 def df_col_pos(c, df):
     try:
         return list(df).index(c)
@@ -11,7 +11,6 @@ Copyright (c) Stochastic Solutions Limited 2016-2024
 """
 
 import os
-import re
 import sys
 import tempfile
 from collections import namedtuple
@@ -20,6 +19,7 @@ from tdda.referencetest.basecomparison import (
     BaseComparison, Diffs, copycmd, FailureDiffs
 )
 from tdda.referencetest.utils import get_encoding, FileType
+from tdda.utils import compiled_regex
 
 
 BinaryInfo = namedtuple(
@@ -411,7 +411,7 @@ class FilesComparison(BaseComparison):
             + ('' if p.endswith('$') else '(.*)$')
             for p in ignore_patterns or []
         ]
-        compiled_patterns = [re.compile(p) for p in anchored_patterns]
+        compiled_patterns = [compiled_regex(p) for p in anchored_patterns]
         return compiled_patterns
 
     def can_ignore(
@@ -468,9 +468,9 @@ class FilesComparison(BaseComparison):
         if actual_line == expected_line:
             return True
         for pattern in compiled_patterns or []:
-            mExpected = re.match(pattern, expected_line)
+            mExpected = pattern.match(expected_line)
             if mExpected:
-                mActual = re.match(pattern, actual_line)
+                mActual = pattern.match(actual_line)
                 if not mActual:
                     continue
                 if pattern.groups in (1, 2):
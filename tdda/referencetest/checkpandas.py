@@ -9,8 +9,11 @@ Copyright (c) Stochastic Solutions Limited 2016-2024
 """
 
 import csv
+import hashlib
+import json
 import os
 import sys
+import threading
 
 from collections import OrderedDict, namedtuple
 
@@ -35,6 +38,137 @@ import numpy as np
 # TDDA_DIFF = 'tdda diff'
 TDDA_DIFF = 'diff'
 
+COMPARISON_CHUNK_ROWS = 65536  # rows of float blocks compared at a time
+
+HASH_BLOCK_ROWS = 65536        # rows per block when hashing data frames
+BLOCK_HASHES_KEY = b'tdda.block_hashes'  # parquet metadata key for them
+BLOCK_HASH_VERSION = 2         # changes when the way of hashing changes
+
+DEFAULT_DATAFRAME_CACHE_BYTES = 512 * 1024 * 1024  # for reference data frames
+
+
+class DataFrameCache(object):
+    """
+    A bounded, in-memory cache of data frames loaded from files,
+    keyed on the file's (absolute) path, modification time and size,
+    and the loader and loader parameters used.
+
+    The cache holds data frames up to a total of *max_bytes* (as
+    measured by pandas' deep memory usage); once that is exceeded,
+    the least recently used are removed. A *max_bytes* of 0 disables
+    the cache.
+
+    Data frames are copied on the way in and out, so that callers can
+    modify the ones they get (:py:meth:`PandasComparison.check_dataframe`
+    sorts them in place) without affecting the cache.
+
+    Counts of hits, misses and evictions are kept as attributes.
+    """
+    def __init__(self, max_bytes=DEFAULT_DATAFRAME_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()   # values are (df, nbytes)
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.clear()
+
+    def key(self, path, loader=None, **kwargs):
+        """
+        Returns the cache key for the file and loading parameters given,
+        or None if the file can't be examined.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size,
+                loader, repr(sorted(kwargs.items())))
+
+    def get(self, key):
+        """
+        Returns a copy of the data frame cached for the key,
+        or None if there isn't one.
+        """
+        with self.lock:
+            entry = self.frames.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.frames.move_to_end(key)
+        return entry[0].copy()
+
+    def put(self, key, df):
+        """
+        Cache a copy of a data frame, unless it is too big, replacing
+        any cached for other versions of the same file, and evicting
+        the least recently used data frames if the cache is too full.
+        """
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        df = df.copy()
+        with self.lock:
+            for k in [k for k in self.frames if k[0] == key[0]]:
+                self.nbytes -= self.frames.pop(k)[1]
+            self.frames[key] = (df, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                (_, (_, n)) = self.frames.popitem(last=False)
+                self.nbytes -= n
+                self.evictions += 1
+
+    def discard(self, path):
+        """
+        Remove any data frames cached for the file given.
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            for k in [k for k in self.frames if k[0] == path]:
+                self.nbytes -= self.frames.pop(k)[1]
+
+    def set_max_bytes(self, max_bytes):
+        """
+        Change the size of the cache (0 to disable it), evicting data
+        frames if it is now too full.
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            while self.nbytes > self.max_bytes:
+                (_, (_, n)) = self.frames.popitem(last=False)
+                self.nbytes -= n
+                self.evictions += 1
+
+    def hit_rate(self):
+        """
+        Proportion of lookups for which the data frame was found in the
+        cache (or None, if there have been none).
+        """
+        n = self.hits + self.misses
+        return self.hits / n if n else None
+
+    def stats(self):
+        return {
+            'size': len(self.frames),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'evictions': self.evictions,
+        }
+
+    def clear(self):
+        """
+        Remove all the data frames from the cache and reset its counters.
+        """
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+dataframe_cache = DataFrameCache()  # shared by all PandasComparison objects
+
 
 class PandasComparison(BaseComparison):
     """
@@ -67,6 +201,9 @@ class PandasComparison(BaseComparison):
         msgs=None,
         type_matching=None,
         create_temporaries=True,
+        ref_hashes=None,
+        key=None,
+        row_order=None,
     ):
         """
         Compare two pandas dataframes.
@@ -106,6 +243,8 @@ class PandasComparison(BaseComparison):
                             be compared).
             *precision*
                             Number of decimal places to compare float values.
+                            Values that differ by no more than half a unit
+                            in the last such place are treated as the same.
             *msgs*
                             Optional Diffs object.
 
@@ -116,6 +255,33 @@ class PandasComparison(BaseComparison):
                                   the actual result in the dataframe will be
                                   written to disk (usually as parquet).
 
+            *ref_hashes*    Optional block hashes for the expected dataframe,
+                            as returned by :py:func:`block_hash_metadata`
+                            (and stored in reference parquet files).
+                            If provided, and all the columns are compared,
+                            without sorting or filtering, the actual
+                            dataframe is hashed in the same blocks of rows,
+                            and only blocks whose hashes differ are compared
+                            value by value.
+
+            *key*           Optional column name, or list of column names,
+                            to match rows on (instead of by position),
+                            using a hash join. Keys (or repeats of keys)
+                            only present in one dataframe are reported,
+                            as are differences in values for each key.
+                            Repeated keys are matched in order of
+                            occurrence. Cannot be used with *sortby*.
+
+            *row_order*     ``'check'`` (the default, if ``None``) to compare
+                            rows in order, or ``'ignore'`` to compare the
+                            dataframes as multisets of rows (so that they
+                            pass if they have the same rows, the same
+                            number of times each, in any order). Rows are
+                            compared by hashing them (after rounding floats
+                            to *precision* decimal places), and only the
+                            rows whose counts differ are reported.
+                            Cannot be used with *key* or *sortby*.
+
         Returns:
 
             A FailureDiffs named tuple with:
@@ -139,6 +305,19 @@ class PandasComparison(BaseComparison):
         type_matching = type_matching or 'strict'
         diffs = nvl(diffs, Diffs())
         self.precision = nvl(precision, 6)
+        if key is not None:
+            key = [key] if isinstance(key, str) else list(key)
+            if sortby:
+                raise ValueError('check_dataframe: key and sortby '
+                                 'cannot both be used.')
+        row_order = row_order or 'check'
+        if row_order not in ('check', 'ignore'):
+            raise ValueError('check_dataframe: row_order must be '
+                             "'check' or 'ignore', not %s" % repr(row_order))
+        ignore_order = row_order == 'ignore'
+        if ignore_order and (key is not None or sortby):
+            raise ValueError("check_dataframe: row_order='ignore' cannot "
+                             'be used with key or sortby.')
 
         check_types = resolve_option_flag(check_types, ref_df)
         check_extra_cols = resolve_option_flag(check_extra_cols, df)
@@ -191,15 +370,32 @@ class PandasComparison(BaseComparison):
 
         na, nr = len(df), len(ref_df)
         same_len = na == nr
-        if not same_len:
+        if not same_len and not key and not ignore_order:
             self.different_numbers_of_rows(diffs, na, nr)
             same = False
 
-        if same:
+        if same and key:
+            check_data = resolve_option_flag(check_data, ref_df)
+            cols = [c for c in check_data if c not in missing_cols]
+            nd = self.keyed_ddiff(df, ref_df, key, cols, diffs)
+            same = nd == 0
+        elif same and ignore_order:
+            check_data = resolve_option_flag(check_data, ref_df)
+            if check_data:
+                cols = [c for c in check_data if c not in missing_cols]
+                nd = self.multiset_ddiff(df[cols], ref_df[cols], diffs)
+                same = nd == 0
+            elif not same_len:
+                self.different_numbers_of_rows(diffs, na, nr)
+                same = False
+        elif same:
             check_data = resolve_option_flag(check_data, ref_df)
             if check_data:
                 cols = [c for c in check_data if c not in missing_cols]
-                nd = self.same_structure_ddiff(df[cols], ref_df[cols], diffs)
+                if sortby or condition or cols != list(ref_df):
+                    ref_hashes = None  # they're for the whole, unsorted df
+                nd = self.same_structure_ddiff(df[cols], ref_df[cols], diffs,
+                                               ref_hashes=ref_hashes)
                 same = nd == 0
 
         if not same and create_temporaries:
@@ -254,7 +450,7 @@ class PandasComparison(BaseComparison):
         #                   'Actual file %s' % os.path.normpath(actual_path))
 
 
-    def same_structure_ddiff(self, df, ref_df, diffs):
+    def same_structure_ddiff(self, df, ref_df, diffs, ref_hashes=None):
         """
         Test two dataframes with the same structure for differences.
 
@@ -265,6 +461,7 @@ class PandasComparison(BaseComparison):
             df         Actual/LHS data frame
             ref_df     Actual/RHS data frame
             diffs      Diffs object for reporing
+            ref_hashes block hash metadata for ref_df, or None
 
         Returns:
             number of different values
@@ -272,21 +469,103 @@ class PandasComparison(BaseComparison):
         assert list(df) == list(ref_df)
         assert df.shape == ref_df.shape
 
-        if self.precision is not None:
-            df = df.round(self.precision).reset_index(drop=True)
-            ref_df = ref_df.round(self.precision).reset_index(
-                drop=True
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            df = df.reset_index(drop=True)
+        if not ref_df.index.equals(pd.RangeIndex(len(ref_df))):
+            ref_df = ref_df.reset_index(drop=True)
+
+        # No separate df.equals check: comparing the values block by block
+        # is no slower, and is needed anyway if there are differences.
+        # But if the reference's block hashes are known, hashing just the
+        # actual data frame is quicker, and only the blocks with different
+        # hashes need to be compared.
+        rows = None
+        ref_hashes = usable_block_hashes(ref_hashes, ref_df)
+        if ref_hashes:
+            block_rows = ref_hashes['block_rows']
+            hashes = block_hashes(df, block_rows)
+            blocks = [i for (i, (h, r))
+                      in enumerate(zip(hashes, ref_hashes['hashes']))
+                      if h != r]
+            if not blocks:
+                return 0
+            rows = np.concatenate([
+                np.arange(i * block_rows, min((i + 1) * block_rows, len(df)))
+                for i in blocks
+            ])
+        ddiff = same_structure_dataframe_diffs(df, ref_df, self.precision,
+                                               rows=rows)
+        n_diffs = ddiff.n_diff_values
+        if n_diffs:
+            diffs.df.diff = ddiff
+            diffs.append(str(ddiff))
+        return n_diffs
+
+    def keyed_ddiff(self, df, ref_df, key, cols, diffs):
+        """
+        Test two dataframes with the same columns for differences,
+        matching rows on the key columns given.
+
+        Args:
+            df         Actual/LHS data frame
+            ref_df     Actual/RHS data frame
+            key        list of key column names
+            cols       columns whose values should be compared
+            diffs      Diffs object for reporing
+
+        Returns:
+            number of different values, plus the number of keys
+            only present in one of the data frames
+        """
+        absent = [k for k in key if k not in df or k not in ref_df]
+        if absent:
+            self.failure(diffs, 'Key columns not in both data frames: %s'
+                                % absent)
+            return 1
+        (lpos, rpos, extra, missing) = align_on_key(df, ref_df, key)
+        n_keys = len(extra) + len(missing)
+        if n_keys:
+            self.different_keys(
+                diffs,
+                ref_df[key].iloc[missing].reset_index(drop=True),
+                df[key].iloc[extra].reset_index(drop=True)
             )
 
-        if df.equals(ref_df):  # the check
-            return 0
-        else:
-            #return self.same_structure_summary_diffs(df, ref_df, diffs)
-            diffs.df.diff = same_structure_dataframe_diffs(df, ref_df)
-            n_diffs = diffs.df.diff.n_diff_values
-            if n_diffs:
-                diffs.append(str(diffs.df.diff))
-            return n_diffs
+        L = df[cols].iloc[lpos]
+        R = ref_df[cols].iloc[rpos]
+        keys = df[key].iloc[lpos]
+        index = (pd.MultiIndex.from_frame(keys) if len(key) > 1
+                 else pd.Index(keys[key[0]]))
+        L = L.set_axis(index)
+        R = R.set_axis(index)
+        ddiff = same_structure_dataframe_diffs(L, R, self.precision)
+        n_diffs = ddiff.n_diff_values
+        if n_diffs:
+            diffs.df.diff = ddiff
+            diffs.df.aligned = (L, R)
+            diffs.append(str(ddiff))
+        return n_keys + n_diffs
+
+    def multiset_ddiff(self, df, ref_df, diffs):
+        """
+        Test two dataframes with the same columns for differences,
+        treating them as multisets of rows (i.e. ignoring row order).
+
+        Args:
+            df         Actual/LHS data frame
+            ref_df     Actual/RHS data frame
+            diffs      Diffs object for reporing
+
+        Returns:
+            number of rows that are in one data frame more times
+            than in the other
+        """
+        (extra, missing) = multiset_row_diffs(df, ref_df, self.precision)
+        n_rows = len(extra) + len(missing)
+        if n_rows:
+            self.different_rows(diffs, ref_df.iloc[missing],
+                                df.iloc[extra])
+        return n_rows
 
     def same_structure_summary_diffs(self, df, ref_df, diffs):
         """
@@ -396,6 +675,7 @@ class PandasComparison(BaseComparison):
         sortby=None,
         precision=6,
         msgs=None,
+        key=None,
         **kwargs,
     ):
         r"""
@@ -437,6 +717,8 @@ class PandasComparison(BaseComparison):
                             Number of decimal places to compare float values.
             *msgs*
                             Optional Diffs object.
+            *key*
+                            Optional key column(s) to match rows on.
 
             *\*\*kwargs*
                             Any additional named parameters are passed straight
@@ -448,7 +730,7 @@ class PandasComparison(BaseComparison):
         and a Diffs object containing error messages.
         """
         ref_df = self.load_serialized_dataframe(
-            expected_path, loader=loader, **kwargs
+            expected_path, loader=loader, cached=True, **kwargs
         )
         df = self.load_serialized_dataframe(
             actual_path, loader=loader, **kwargs
@@ -465,6 +747,8 @@ class PandasComparison(BaseComparison):
             sortby=sortby,
             precision=precision,
             msgs=msgs,
+            ref_hashes=self.load_block_hashes(expected_path),
+            key=key,
         )
 
     check_csv_file = check_serialized_dataframe
@@ -615,12 +899,27 @@ class PandasComparison(BaseComparison):
         return loader(csvfile, **kwargs)
 
     def load_serialized_dataframe(
-        self, path, actual_df=None, loader=None, **kwargs
+        self, path, actual_df=None, loader=None, cached=False, **kwargs
     ):
         """
         Function for constructing a pandas dataframe from a serialized
         dataframe in a file (parquet or CSV)
+
+        If *cached* is set, the dataframe is taken from (or added to)
+        the in-memory cache of loaded dataframes shared across the process
+        (:py:data:`dataframe_cache`), if that is enabled. This is used
+        for reference dataframes, which are often loaded repeatedly.
         """
+        if cached and dataframe_cache.max_bytes > 0:
+            key = dataframe_cache.key(path, loader, **kwargs)
+            if key is not None:
+                df = dataframe_cache.get(key)
+                if df is None:
+                    df = self.load_serialized_dataframe(path, actual_df,
+                                                        loader, **kwargs)
+                    dataframe_cache.put(key, df)
+                return df
+
         ext = os.path.splitext(path)[1].lower()
         if ext == '.parquet':
             try:
@@ -635,6 +934,21 @@ class PandasComparison(BaseComparison):
         else:
             return self.load_csv(path, loader, **kwargs)
 
+    def load_block_hashes(self, path):
+        """
+        Returns the block hash metadata stored in a parquet file
+        (written by :py:meth:`_write_reference_dataframe`), or None
+        if there is none (including if the file is not a parquet file).
+        """
+        if os.path.splitext(path)[1].lower() != '.parquet':
+            return None
+        import pyarrow.parquet as pq
+        try:
+            metadata = pq.read_schema(path).metadata or {}
+            return json.loads(metadata[BLOCK_HASHES_KEY])
+        except (OSError, KeyError, ValueError):
+            return None
+
     def write_csv(self, df, csvfile, writer=None, **kwargs):
         """
         Function for saving a Pandas DataFrame to a CSV file.
@@ -651,9 +965,10 @@ class PandasComparison(BaseComparison):
         Function for saving a Pandas DataFrame to a CSV file.
         Used when regenerating DataFrame reference results.
         """
+        dataframe_cache.discard(path)
         ext = os.path.splitext(path)[1].lower()
         if ext == '.parquet':
-            df.to_parquet(path)
+            write_parquet_with_hashes(df, path)
         else:
             self.write_csv(df, path, writer, **kwargs)
         if self.verbose:
@@ -710,17 +1025,7 @@ def default_csv_loader(csvfile, **kwargs):
         - na_values             are the empty string, ``"NaN"``, and ``"NULL"``
         - keep_default_na       is ``False``
     """
-    options = {
-        'index_col': None,
-        'quotechar': '"',
-        'quoting': csv.QUOTE_MINIMAL,
-        'escapechar': '\\',
-        'na_values': ['', 'NaN', 'NULL'],
-        'keep_default_na': False,
-    }
-    options.update(kwargs)
-    if 'infer_datetime_format' in options:  # don't let pandas do it.
-        del options['infer_datetime_format']
+    options = default_csv_options(**kwargs)
     infer_datetimes = kwargs.get('infer_datetime_format', True)
 
     try:
@@ -752,6 +1057,25 @@ def default_csv_loader(csvfile, **kwargs):
         return df
 
 
+def default_csv_options(**kwargs):
+    """
+    The options the default csv loader passes to pd.read_csv(),
+    updated with any given.
+    """
+    options = {
+        'index_col': None,
+        'quotechar': '"',
+        'quoting': csv.QUOTE_MINIMAL,
+        'escapechar': '\\',
+        'na_values': ['', 'NaN', 'NULL'],
+        'keep_default_na': False,
+    }
+    options.update(kwargs)
+    if 'infer_datetime_format' in options:  # don't let pandas do it.
+        del options['infer_datetime_format']
+    return options
+
+
 def default_csv_writer(df, csvfile, **kwargs):
     """
     Default function for writing a csv file.
@@ -887,43 +1211,390 @@ def diff_masks(df, ref_df, only_diffs=False):
     return diffs
 
 
-def same_structure_dataframe_diffs(df, ref_df):
+def same_structure_dataframe_diffs(df, ref_df, precision=None, rows=None):
     """
     Compute differences between each pair of columns in two data frames.
 
     The two data frames must have the same columns, the same lengths,
     and compatible types.
 
+    Numeric columns are compared a block at a time, as 2-D NumPy arrays;
+    other columns are compared with (vectorized) pandas equality.
+
     Args:
         df        "left" data frame  (typically "actual")
         ref_df    "right" data frame (typically expected/reference)
+        precision number of decimal places to compare float values to
+                  (values within half a unit in the last place are
+                  treated as the same); if None, they must be equal.
+                  Nulls always match nulls.
+        rows      positions of the rows to compare, if not all of them;
+                  the other rows are taken to be the same.
 
     Returns:
         SameStructureDDiff  for df, ref_df
     """
     assert list(df) == list(ref_df)
-    d = {}
-    n_vals = 0   # total number of values with diffenrences
-    for c in list(df):
-        diffs = single_col_diffs(df[c], ref_df[c])
-        if diffs.n > 0:
-            d[c] = diffs.mask
-            n_vals += diffs.n
-    n_cols = len(d)  # number of columns with differences
-
-    if n_vals > 0:
-        D = create_row_diff_counts(list(d.values()))
-        n_rows = (D > 0).sum().item()  # number of rows with differences
-        row_diff_counts = DiffCounts(D, n_rows)
+    L, R = (df, ref_df) if rows is None else (df.iloc[rows], ref_df.iloc[rows])
+    masks = {}
+    for (block, cols) in numeric_blocks(L, R).items():
+        if block == 'float':
+            D = float_block_diffs(L.iloc[:, cols], R.iloc[:, cols], precision)
+        else:
+            D = L.iloc[:, cols].to_numpy() != R.iloc[:, cols].to_numpy()
+        for (k, c) in enumerate(cols):
+            masks[c] = D[:, k]
+    for c in range(df.shape[1]):
+        if c not in masks:
+            mask = single_col_diffs(L.iloc[:, c], R.iloc[:, c]).mask
+            masks[c] = mask.to_numpy(dtype=bool)
+
+    diff_cols = [c for c in range(df.shape[1]) if masks[c].any()]
+    n_cols = len(diff_cols)  # number of columns with differences
+    if n_cols:
+        D = np.column_stack([masks[c] for c in diff_cols])
+        if rows is not None:
+            D_all = np.zeros((len(df), n_cols), dtype=bool)
+            D_all[rows] = D
+            D = D_all
+        col_counts = D.sum(axis=0)
+        n_vals = col_counts.sum().item()  # total number of different values
+        counts = pd.Series(D.sum(axis=1), index=df.index)
+        n_rows = (counts > 0).sum().item()  # number of rows with differences
+        row_diff_counts = DiffCounts(counts, n_rows)
     else:
-        n_rows = 0
+        D = np.zeros((len(df), 0), dtype=bool)
+        n_vals = n_rows = 0
         row_diff_counts = None
 
-    return SameStructureDDiff(df.shape,
-                              pd.DataFrame(d), row_diff_counts,
+    diff_df = pd.DataFrame(D, index=df.index,
+                           columns=[df.columns[c] for c in diff_cols])
+    return SameStructureDDiff(df.shape, diff_df, row_diff_counts,
                               n_vals, n_cols, n_rows)
 
 
+def numeric_blocks(df, ref_df):
+    """
+    Group the (positions of) columns in two data frames with the same
+    structure that can be compared as 2-D NumPy arrays.
+
+    Args:
+        df        "left" data frame
+        ref_df    "right" data frame
+
+    Returns:
+        dictionary of lists of column positions, keyed on 'float' for
+        pairs of columns that are numeric and include a float column
+        (compared as float64), and on the dtype for pairs of NumPy
+        integer or boolean columns of the same type (compared exactly).
+        Other columns are not included.
+    """
+    blocks = {}
+    for c in range(df.shape[1]):
+        L = df.iloc[:, c].dtype
+        R = ref_df.iloc[:, c].dtype
+        if not (is_plain_numeric(L) and is_plain_numeric(R)):
+            continue
+        elif pd.api.types.is_float_dtype(L) or pd.api.types.is_float_dtype(R):
+            blocks.setdefault('float', []).append(c)
+        elif L == R and isinstance(L, np.dtype):
+            blocks.setdefault(L, []).append(c)
+    return blocks
+
+
+def is_plain_numeric(dtype):
+    """
+    Is dtype a (NumPy or nullable pandas) integer, float or boolean type?
+    """
+    return (pd.api.types.is_numeric_dtype(dtype)
+            and not pd.api.types.is_complex_dtype(dtype)
+            and not isinstance(dtype, pd.CategoricalDtype))
+
+
+def float_block_diffs(L, R, precision=None):
+    """
+    Compares two blocks of numeric columns as float64 arrays.
+
+    This is equivalent to ``~np.isclose(A, B, rtol=0, atol=tol,
+    equal_nan=True)``, with tol being half a unit in the last decimal
+    place, but is computed a chunk of rows at a time, to limit the size
+    of the temporary arrays needed.
+
+    Args:
+        L          "left-hand" data frame
+        R          "right-hand" data frame
+        precision  number of decimal places to compare to, or None
+                   for exact comparison
+
+    Returns:
+        2-D boolean array with True where the values are different.
+        Nulls (NaN or NA) are the same as each other, and different
+        from everything else.
+    """
+    A = block_to_float_array(L)
+    B = block_to_float_array(R)
+    D = np.empty(A.shape, dtype=bool)
+    tol = None if precision is None else 0.5 * 10 ** -precision
+    for start in range(0, len(A), COMPARISON_CHUNK_ROWS):
+        stop = start + COMPARISON_CHUNK_ROWS
+        a = A[start:stop]
+        b = B[start:stop]
+        same = a == b
+        if tol is not None:
+            same |= np.abs(a - b) <= tol
+        same |= np.isnan(a) & np.isnan(b)
+        np.logical_not(same, out=D[start:stop])
+    return D
+
+
+def block_to_float_array(df):
+    """
+    Convert a data frame with numeric columns to a 2-D float64 array,
+    with NaN for nulls (NA).
+    """
+    if all(isinstance(t, np.dtype) for t in df.dtypes):
+        return df.to_numpy(dtype=np.float64)
+    else:
+        return df.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def align_on_key(df, ref_df, key):
+    """
+    Match the rows of two data frames on the values of key columns,
+    with a hash join. Rows with the same key in a data frame are
+    matched in order of occurrence (so the first with the first, the
+    second with the second, and so on).
+
+    Args:
+        df       "left" data frame
+        ref_df   "right" data frame
+        key      list of key column names
+
+    Returns:
+        (lpos, rpos, extra, missing), NumPy arrays of row positions:
+            lpos, rpos  the positions of matching rows in df and ref_df
+            extra       positions of rows in df with no match in ref_df
+            missing     positions of rows in ref_df with no match in df
+        lpos and extra are in the order of the rows in df, and missing
+        in the order of those in ref_df.
+    """
+    nL = len(df)
+    codes = key_codes(pd.concat([df[key], ref_df[key]], ignore_index=True))
+    lcodes, rcodes = codes[:nL], codes[nL:]
+    if is_repeated(lcodes) or is_repeated(rcodes):
+        # Some keys are repeated: match on (key, occurrence) instead
+        locc, rocc = occurrences(lcodes), occurrences(rcodes)
+        n_occ = max(locc.max(initial=0), rocc.max(initial=0)) + 1
+        codes = pd.factorize(np.concatenate([lcodes * n_occ + locc,
+                                             rcodes * n_occ + rocc]))[0]
+        lcodes, rcodes = codes[:nL], codes[nL:]
+
+    right_pos = np.full(codes.max(initial=-1) + 1, -1, dtype=np.int64)
+    right_pos[rcodes] = np.arange(len(rcodes))
+    matches = right_pos[lcodes]
+    matched = matches >= 0
+    lpos = np.flatnonzero(matched)
+    rpos = matches[matched]
+    extra = np.flatnonzero(~matched)
+    unmatched = np.ones(len(ref_df), dtype=bool)
+    unmatched[rpos] = False
+    missing = np.flatnonzero(unmatched)
+    return lpos, rpos, extra, missing
+
+
+def key_codes(keys):
+    """
+    Integer codes for the rows of a data frame of key values,
+    the same for rows with the same values (including nulls).
+    """
+    codes = None
+    for c in keys:
+        col_codes, uniques = pd.factorize(keys[c], use_na_sentinel=False)
+        if codes is None:
+            codes = col_codes
+        else:
+            codes = pd.factorize(codes * len(uniques) + col_codes)[0]
+    return codes.astype(np.int64)
+
+
+def multiset_row_diffs(df, ref_df, precision=None):
+    """
+    Compare two data frames with the same columns as multisets of rows,
+    using hashes of the rows (after rounding float columns to precision
+    decimal places, if given).
+
+    Args:
+        df         "left" data frame
+        ref_df     "right" data frame
+        precision  number of decimal places to round floats to, or None
+
+    Returns:
+        (extra, missing), NumPy arrays of the positions of rows in df
+        that occur more often than in ref_df (the later occurrences),
+        and of the rows in ref_df that occur more often than in df.
+    """
+    nL = len(df)
+    hashes = np.concatenate([row_hashes(df, precision),
+                             row_hashes(ref_df, precision)])
+    codes = pd.factorize(hashes)[0]
+    lcodes, rcodes = codes[:nL], codes[nL:]
+    n_codes = codes.max(initial=-1) + 1
+    lcounts = np.bincount(lcodes, minlength=n_codes)
+    rcounts = np.bincount(rcodes, minlength=n_codes)
+    return (surplus_rows(lcodes, rcounts), surplus_rows(rcodes, lcounts))
+
+
+def row_hashes(df, precision=None):
+    """
+    Array of hashes of the values (and, for object columns, their types)
+    in each row of a data frame, after rounding any float columns to
+    precision decimal places.
+    """
+    if precision is not None:
+        floats = [c for c in df if pd.api.types.is_float_dtype(df[c])]
+        if floats:
+            df = df.copy()
+            for c in floats:
+                df[c] = df[c].round(precision) + 0.0  # + 0.0 for -0.0
+    if df.shape[1] == 0:
+        return np.zeros(len(df), dtype=np.uint64)
+    return typed_row_hashes(df)
+
+
+def surplus_rows(codes, other_counts):
+    """
+    Positions of the rows in an array of codes whose code occurs more
+    often than in another array, given the counts of the codes in that
+    array. For each code, the occurrences beyond the other count are
+    the ones returned.
+    """
+    candidates = np.flatnonzero(np.bincount(codes, minlength=len(other_counts))
+                                [codes] > other_counts[codes])
+    if len(candidates) == 0:
+        return candidates
+    occ = occurrences(codes[candidates])
+    return candidates[occ >= other_counts[codes[candidates]]]
+
+
+def is_repeated(codes):
+    """
+    Does any code occur more than once in an array of integer codes?
+    """
+    return len(codes) > 0 and np.bincount(codes).max() > 1
+
+
+def occurrences(codes):
+    """
+    For each element of an array of (non-negative) integer codes,
+    the number of times its code has already occurred in the array.
+    """
+    occ = pd.Series(codes).groupby(codes, sort=False).cumcount()
+    return occ.to_numpy(dtype=np.asarray(codes).dtype)
+
+
+def block_hashes(df, block_rows=HASH_BLOCK_ROWS):
+    """
+    Hash a data frame in blocks of rows.
+
+    Args:
+        df          data frame
+        block_rows  number of rows in each block (the last may be shorter)
+
+    Returns:
+        list of hex digests, one for each block, combining the
+        (pandas) hashes of the values in each of the block's rows.
+        The index and column names are not included.
+    """
+    hashes = []
+    for start in range(0, len(df) if df.shape[1] else 0, block_rows):
+        rows = typed_row_hashes(df.iloc[start:start + block_rows])
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=16)
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def typed_row_hashes(df):
+    """
+    Array of (pandas) hashes of the values in each row of a data frame,
+    also including, for object columns, the type of each value.
+
+    pandas hashes the values in object columns through their string
+    forms, so that, for example, 1 and '1' (or True and 'True') have the
+    same hash, even though they are different values; including their
+    types means that rows whose hashes match have equal values.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    for col in range(df.shape[1]):
+        values = df.iloc[:, col]
+        if values.dtype == object:
+            codes, types = pd.factorize(values.map(type))
+            names = np.array(['%s.%s' % (t.__module__, t.__qualname__)
+                              for t in types], dtype=object)
+            hashes = (hashes * np.uint64(0x100000001b3)
+                      + pd.util.hash_array(names)[codes])
+    return hashes
+
+
+def block_hash_metadata(df, block_rows=HASH_BLOCK_ROWS):
+    """
+    Block hashes for a data frame, together with the information needed
+    to tell whether they are still valid for a data frame they are
+    used with (the pandas version, columns, types and number of rows).
+
+    The block hashes are for the data frame as compared by
+    :py:meth:`PandasComparison.check_dataframe`, i.e. with categorical
+    columns converted to strings.
+    """
+    df = replace_cats(df)
+    return {
+        'version': BLOCK_HASH_VERSION,
+        'pandas': pd.__version__,
+        'block_rows': block_rows,
+        'columns': [str(c) for c in df],
+        'dtypes': [str(t) for t in df.dtypes],
+        'nrows': len(df),
+        'hashes': block_hashes(df, block_rows),
+    }
+
+
+def usable_block_hashes(metadata, df):
+    """
+    Returns the block hash metadata given if it is valid for df,
+    otherwise None.
+    """
+    if not metadata:
+        return None
+    block_rows = metadata.get('block_rows')
+    if not (type(block_rows) is int and block_rows > 0):
+        return None
+    n_blocks = (len(df) + block_rows - 1) // block_rows if df.shape[1] else 0
+    if (
+        metadata.get('version') == BLOCK_HASH_VERSION
+        and metadata.get('pandas') == pd.__version__
+        and metadata.get('columns') == [str(c) for c in df]
+        and metadata.get('dtypes') == [str(t) for t in df.dtypes]
+        and metadata.get('nrows') == len(df)
+        and len(metadata.get('hashes', ())) == n_blocks
+    ):
+        return metadata
+    return None
+
+
+def write_parquet_with_hashes(df, path):
+    """
+    Write a data frame to a parquet file, (as df.to_parquet would),
+    including block hashes (see :py:func:`block_hash_metadata`) in its
+    metadata, for the data frame as it will be read back.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pandas(df)
+    hashes = block_hash_metadata(table.to_pandas())
+    metadata = dict(table.schema.metadata or {})
+    metadata[BLOCK_HASHES_KEY] = json.dumps(hashes).encode('UTF-8')
+    pq.write_table(table.replace_schema_metadata(metadata), path)
+
+
 def single_col_diffs(L, R):
     """
     Compares two columns and returns col indicating where they are different
@@ -986,14 +1657,8 @@ def create_row_diff_counts(masks):
     Return:
         row_difference_col
     """
-    counts = [m.astype(int) for m in masks]
-    while len(counts) > 1:
-        last = [counts[-1].astype(int)] if len(counts) % 2 == 1 else []
-        counts = [
-            (counts[2 * i] + counts[2 * i + 1])
-            for i in range(len(counts) // 2)
-        ] + last
-    return counts[0]
+    D = np.column_stack([np.asarray(m, dtype=bool) for m in masks])
+    return pd.Series(D.sum(axis=1), index=masks[0].index)
 
 
 def replace_cats(df):
@@ -1,34 +1,411 @@
+import argparse
+import itertools
+import os
 import sys
 
-from tdda.referencetest.checkpandas import PandasComparison, same_structure_dataframe_diffs
+import numpy as np
+import pandas as pd
+
+from tdda.referencetest.basecomparison import (
+    Diffs,
+    DiffCounts,
+    FailureDiffs,
+    SameStructureDDiff
+)
+from tdda.referencetest.checkpandas import (
+    PandasComparison,
+    default_csv_options,
+    replace_cats,
+    same_structure_dataframe_diffs
+)
 
 from rich import print as rprint
 
 
-def ddiff(leftpath, rightpath):
-    c = PandasComparison()
-    dfL = c.load_serialized_dataframe(leftpath)
-    dfR = c.load_serialized_dataframe(rightpath)
-    result = c.check_dataframe(dfL, dfR, create_temporaries=False, type_matching='medium')
+DEFAULT_BATCH_ROWS = 100000   # rows compared at a time when streaming
+DEFAULT_DETAIL_ROWS = 10      # differing rows kept for the details table
+
+
+def ddiff(leftpath, rightpath, stream=False, batch_rows=DEFAULT_BATCH_ROWS,
+          detail_rows=DEFAULT_DETAIL_ROWS, key=None):
+    if stream and key:
+        print('tdda diff: --key cannot be used with --stream', file=sys.stderr)
+        sys.exit(1)
+    elif stream:
+        comparison = StreamingComparison(batch_rows=batch_rows,
+                                         detail_rows=detail_rows)
+        result = comparison.compare(leftpath, rightpath)
+        dfL, dfR = comparison.left_details, comparison.right_details
+    else:
+        c = PandasComparison()
+        dfL = c.load_serialized_dataframe(leftpath)
+        dfR = c.load_serialized_dataframe(rightpath)
+        result = c.check_dataframe(dfL, dfR, create_temporaries=False,
+                                   type_matching='medium', key=key)
+        if result.diffs.df.aligned:
+            dfL, dfR = result.diffs.df.aligned
 
     if result.failures > 0:
         print(result.diffs)
         diff = result.diffs.df.diff  # there if same structure
         if diff:
-            table = diff.details_table(dfL, dfR)
+            table = diff.details_table(dfL, dfR, target_rows=detail_rows)
             print()
             rprint(table)
 
 
-def ddiff_helper(args):
-    if len(args) != 2:
-        print('USAGE: tdda diff LEFT.parquet RIGHT.parquet', file=sys.stderr)
-        print('   or: tdda diff LEFT.csv RIGHT.csv', file=sys.stderr)
-        sys.exit(1)
+class StreamingComparison:
+    """
+    Compares two serialized data frames (parquet or CSV files) a batch
+    of rows at a time, so that memory use is bounded by the batch size,
+    rather than the size of the files.
+
+    Parquet files are read in record batches, and CSV files in chunks,
+    (with the default CSV loader's options, but without its date
+    inference), and both are re-batched so that the same rows are
+    compared. The types of the columns in a CSV file are inferred from
+    its first batch, and used for the rest of the file; if a later batch
+    has values that cannot be read as those types, the types of those
+    columns are widened (to float or object, as when the file is read
+    in one go), and the comparison starts again.
+
+    The column names and order are checked first, and, for parquet files,
+    the numbers of rows (from their metadata); if these differ, the
+    comparison stops there. Otherwise, counts of the differences in each
+    column are accumulated across batches, and the first *detail_rows*
+    rows with differences are kept (as *left_details* and *right_details*),
+    for use with the resulting diff's ``details_table``. If the numbers
+    of rows in CSV files differ, the comparison stops at the end of the
+    shorter file. The column types are checked last, once those of any
+    CSV files have been widened to hold all of their values.
+    """
+    def __init__(self, batch_rows=DEFAULT_BATCH_ROWS,
+                 detail_rows=DEFAULT_DETAIL_ROWS, precision=6,
+                 type_matching='medium'):
+        self.batch_rows = batch_rows
+        self.detail_rows = detail_rows
+        self.precision = precision
+        self.type_matching = type_matching
+        self.left_details = None
+        self.right_details = None
+
+    def compare(self, leftpath, rightpath):
+        """
+        Compare the two files.
+
+        Returns:
+
+            A FailureDiffs named tuple, as returned by
+            :py:meth:`PandasComparison.check_dataframe`.
+        """
+        c = PandasComparison(verbose=False)
+        widened = ({}, {})
+        while True:
+            try:
+                return self.compare_files(c, leftpath, rightpath, *widened)
+            except ColumnTypesChanged:
+                pass  # the types have been widened; start again
+
+    def compare_files(self, c, leftpath, rightpath, left_widened,
+                      right_widened):
+        """
+        Compare the two files, using the PandasComparison c, reading
+        columns of CSV files with the types in left_widened and
+        right_widened, where these have been widened from the types
+        inferred from their first batches.
+
+        Raises ColumnTypesChanged if any further widening is needed.
+
+        Returns a FailureDiffs named tuple.
+        """
+        diffs = Diffs()
+        left = rebatch(iter_batches(leftpath, self.batch_rows, left_widened),
+                       self.batch_rows)
+        right = rebatch(iter_batches(rightpath, self.batch_rows,
+                                     right_widened),
+                        self.batch_rows)
+        L0, left = peek(left)
+        R0, right = peek(right)
+
+        # Column names and order, from (empty versions of) the first batches
+        r = c.check_dataframe(L0.head(0), R0.head(0), msgs=diffs,
+                              check_types=False, create_temporaries=False)
+        if r.failures:
+            return r
+
+        na, nr = parquet_nrows(leftpath), parquet_nrows(rightpath)
+        if na is not None and nr is not None and na != nr:
+            c.different_numbers_of_rows(diffs, na, nr)
+            return FailureDiffs(failures=1, diffs=diffs)
+
+        r = self.compare_batches(c, diffs, list(L0), left, right)
+
+        # Column types, now that all the batches have been read
+        types = c.check_dataframe(L0.head(0), R0.head(0), msgs=Diffs(),
+                                  type_matching=self.type_matching,
+                                  create_temporaries=False)
+        return types if types.failures else r
+
+    def compare_batches(self, c, diffs, cols, left, right):
+        """
+        Compare the data in two sequences of batches, with the same
+        columns, cols, using the PandasComparison c, and recording
+        differences in diffs.
+
+        Returns a FailureDiffs named tuple.
+        """
+        col_counts = dict.fromkeys(cols, 0)
+        n_vals = n_rows = 0
+        masks, counts, lefts, rights = [], [], [], []
+        n_kept = 0
+        offset = 0
+        for (L, R) in itertools.zip_longest(left, right):
+            if L is None or R is None or len(L) != len(R):
+                c.failure(diffs, 'Data frames have different numbers of rows.')
+                c.info(diffs, 'Actual records: %s; Expected records: %s'
+                              % (rows_read(offset, L, self.batch_rows),
+                                 rows_read(offset, R, self.batch_rows)))
+                return FailureDiffs(failures=1, diffs=diffs)
+            index = pd.RangeIndex(offset, offset + len(L))
+            L = replace_cats(L).set_axis(index)
+            R = replace_cats(R).set_axis(index)
+            offset += len(L)
+            d = same_structure_dataframe_diffs(L, R, self.precision)
+            if d.n_diff_values == 0:
+                continue
+            n_vals += d.n_diff_values
+            n_rows += d.n_diff_rows
+            for col in d.diff_df:
+                col_counts[col] += d.diff_df[col].sum().item()
+            if n_kept < self.detail_rows:
+                rowdiffs = d.row_diff_counts.rowdiffs
+                rows = rowdiffs.index[rowdiffs > 0][:self.detail_rows
+                                                    - n_kept]
+                masks.append(d.diff_df.loc[rows])
+                counts.append(rowdiffs.loc[rows])
+                lefts.append(L.loc[rows])
+                rights.append(R.loc[rows])
+                n_kept += len(rows)
+
+        if n_vals == 0:
+            return FailureDiffs(failures=0, diffs=diffs)
+
+        diff_cols = [col for col in cols if col_counts[col] > 0]
+        diff_df = pd.concat(masks).reindex(columns=diff_cols,
+                                           fill_value=False)
+        diff = SameStructureDDiff((offset, len(cols)), diff_df,
+                                  DiffCounts(pd.concat(counts), n_rows),
+                                  n_vals, len(diff_cols), n_rows,
+                                  col_counts={col: col_counts[col]
+                                              for col in diff_cols})
+        self.left_details = pd.concat(lefts)
+        self.right_details = pd.concat(rights)
+        diffs.df.diff = diff
+        diffs.append(str(diff))
+        return FailureDiffs(failures=1, diffs=diffs)
+
+
+def iter_batches(path, batch_rows, widened=None):
+    """
+    Generator for the data in a parquet or CSV file, as a sequence of
+    data frames of (up to) batch_rows rows.
+
+    The columns of a CSV file are read with the types inferred from
+    its first batch, except for those in the dictionary widened. If a
+    later batch has values that cannot be read as these types, the types
+    of those columns are widened, in widened, and ColumnTypesChanged is
+    raised, so that the file can be read again.
+    """
+    if os.path.splitext(path)[1].lower() == '.parquet':
+        import pyarrow.parquet as pq
+        f = pq.ParquetFile(path)
+        n = 0
+        for batch in f.iter_batches(batch_size=batch_rows):
+            n += 1
+            yield batch.to_pandas()
+        if n == 0:  # no rows, but we still need the columns
+            yield f.schema_arrow.empty_table().to_pandas()
     else:
-        ddiff(*args)
+        widened = {} if widened is None else widened
+        first = pd.read_csv(path, **default_csv_options(nrows=batch_rows))
+        natural = dict(first.dtypes)
+        natural.update(widened)
+        dtypes = csv_dtypes(natural)
+        options = default_csv_options(chunksize=batch_rows, dtype=dtypes)
+        offset = 0
+        with pd.read_csv(path, **options) as reader:
+            while True:
+                try:
+                    batch = next(reader)
+                except StopIteration:
+                    break
+                except (ValueError, TypeError):
+                    changed = changed_dtypes(path, offset, batch_rows,
+                                             dtypes)
+                    if not changed:
+                        raise
+                    for (col, dtype) in changed.items():
+                        widened[col] = widen_dtype(natural[col], dtype)
+                    raise ColumnTypesChanged(path, offset, changed)
+                offset += len(batch)
+                yield restore_dtypes(batch, natural)
 
-if __name__ == '__main__':
-    if len(sys.argv) == 3:
-        ddiff(sys.argv[1], sys.argv[2])
 
+class ColumnTypesChanged(Exception):
+    """
+    Raised when a batch of a CSV file has values that cannot be read
+    as the types used for the batches before it (after widening those
+    types, so that the file can be read again).
+
+    dtypes is a dictionary of the types inferred for those columns,
+    for the batch starting at row offset.
+    """
+    def __init__(self, path, offset, dtypes):
+        Exception.__init__(self, 'Column types in %s change at row %d: %s'
+                                 % (path, offset, ', '.join(dtypes)))
+        self.path = path
+        self.offset = offset
+        self.dtypes = dtypes
+
+
+def csv_dtypes(dtypes):
+    """
+    Dictionary of the types to use for the columns of a CSV file,
+    given a dictionary of their (inferred or widened) types. Nullable
+    types are used for integer and boolean columns, so that later
+    missing values can be read.
+    """
+    nullable = {'i': 'Int64', 'u': 'UInt64', 'b': 'boolean'}
+    return {col: nullable.get(dtype.kind, dtype)
+            for (col, dtype) in dtypes.items()}
+
+
+def widen_dtype(dtype, other):
+    """
+    Type for a column of a CSV file read as dtype, some of whose values
+    are read as other: integer or float if both types are numeric,
+    as when the file is read in one go, and object otherwise (or if
+    that would not change the type).
+    """
+    kinds = {dtype.kind, other.kind}
+    if kinds <= set('iu'):
+        widened = np.dtype('int64')
+    elif kinds <= set('iuf'):
+        widened = np.dtype('float64')
+    else:
+        widened = np.dtype(object)
+    return np.dtype(object) if widened == dtype else widened
+
+
+def restore_dtypes(batch, dtypes):
+    """
+    Convert columns of a batch read with nullable types (from csv_dtypes)
+    back to their types in dtypes, where they have no missing values,
+    so that the types are the same as when the file is read in one go.
+    """
+    for col in batch:
+        if (batch[col].dtype != dtypes[col]
+                and dtypes[col].kind in 'iub' and not batch[col].hasnans):
+            batch[col] = batch[col].astype(dtypes[col])
+    return batch
+
+
+def changed_dtypes(path, offset, batch_rows, dtypes):
+    """
+    Dictionary of the types (as inferred) of the columns in the batch of
+    a CSV file starting at row offset whose values cannot be read as
+    the types in dtypes.
+    """
+    options = default_csv_options(skiprows=range(1, offset + 1),
+                                  nrows=batch_rows)
+    batch = pd.read_csv(path, **options)
+    changed = {}
+    for col in batch:
+        try:
+            batch[col].astype(dtypes[col])
+        except (ValueError, TypeError):
+            changed[col] = batch[col].dtype
+    return changed
+
+
+def rebatch(batches, batch_rows):
+    """
+    Generator for the data in a sequence of data frames, as data frames
+    of exactly batch_rows rows (apart from the last).
+    An empty data frame is passed through if there are no rows.
+    """
+    pending = []
+    size = 0
+    n_yielded = 0
+    for batch in batches:
+        pending.append(batch)
+        size += len(batch)
+        while size >= batch_rows:
+            df = pd.concat(pending, ignore_index=True)
+            yield df.iloc[:batch_rows]
+            n_yielded += 1
+            pending = [df.iloc[batch_rows:]]
+            size -= batch_rows
+    if pending and (size > 0 or n_yielded == 0):
+        yield pd.concat(pending, ignore_index=True)
+
+
+def peek(batches):
+    """
+    Returns the first of a sequence of data frames (or an empty data
+    frame, if there are none), and an iterator for the whole sequence.
+    """
+    batches = iter(batches)
+    first = next(batches, pd.DataFrame())
+    return first, itertools.chain([first], batches)
+
+
+def parquet_nrows(path):
+    """
+    Number of rows in a parquet file, from its metadata, or None
+    if it isn't a parquet file.
+    """
+    if os.path.splitext(path)[1].lower() != '.parquet':
+        return None
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def rows_read(offset, batch, batch_rows):
+    """
+    Number of rows in a file, as text, given the batch (possibly None)
+    read after offset rows; if that is a full batch, there may be more,
+    so the number is only a lower bound.
+    """
+    n = offset + (0 if batch is None else len(batch))
+    if batch is not None and len(batch) == batch_rows:
+        return f'at least {n:,}'
+    return f'{n:,}'
+
+
+def ddiff_helper(args):
+    parser = argparse.ArgumentParser(
+        prog='tdda diff',
+        description='Compare two parquet or CSV files as data frames.'
+    )
+    parser.add_argument('left', metavar='LEFT', help='parquet or CSV file')
+    parser.add_argument('right', metavar='RIGHT', help='parquet or CSV file')
+    parser.add_argument('--stream', action='store_true',
+                        help='compare the files a batch of rows at a time, '
+                             'rather than loading them fully')
+    parser.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_ROWS,
+                        help='rows per batch, with --stream (default: %d)'
+                             % DEFAULT_BATCH_ROWS)
+    parser.add_argument('--rows', type=int, default=DEFAULT_DETAIL_ROWS,
+                        help='maximum number of differing rows to show '
+                             '(default: %d)' % DEFAULT_DETAIL_ROWS)
+    parser.add_argument('--key', metavar='COLS',
+                        help='comma-separated key column(s) to match rows on, '
+                             'instead of comparing them in order')
+    params = parser.parse_args(args)
+    key = params.key.split(',') if params.key else None
+    ddiff(params.left, params.right, stream=params.stream,
+          batch_rows=params.batch_rows, detail_rows=params.rows, key=key)
+
+if __name__ == '__main__':
+    ddiff_helper(sys.argv[1:])
@@ -195,6 +195,11 @@ def ref(request):
     """
     if request.config.getoption('--wquiet'):
         ReferenceTest.set_defaults(verbose=False)
+    cache_mb = request.config.getoption('--dataframe-cache-mb', None)
+    if cache_mb is not None:
+        ReferenceTest.set_defaults(
+            dataframe_cache_bytes=int(cache_mb * 1024 * 1024)
+        )
     if request.config.getoption('--write-all'):
         ReferenceTest.set_regeneration()
     else:
@@ -249,7 +254,9 @@ def addoption(parser):
     defining a ``pytest_addoption`` function which should just call this.
 
     It extends pytest to include ``--write`` and ``--write-all`` option
-    flags which can be used to control regeneration of reference results.
+    flags which can be used to control regeneration of reference results,
+    and ``--dataframe-cache-mb``, to set the memory budget for the cache of
+    loaded reference DataFrames.
     """
     try:
         parser.addoption('--write', action='store', nargs='+', default=None,
@@ -264,6 +271,11 @@ def addoption(parser):
         parser.addoption('--istagged', action='store_true',
                          help='--istagged: report tagged tests, '
                               'without running')
+        parser.addoption('--dataframe-cache-mb', action='store', type=float,
+                         default=None,
+                         help='--dataframe-cache-mb: memory budget, in MB, '
+                              'for cached reference DataFrames '
+                              '(0 to disable)')
     except ValueError:
         # ignore attempts to add parser options multiple times
         pass
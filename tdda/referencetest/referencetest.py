@@ -7,7 +7,7 @@ import os
 import sys
 import tempfile
 
-from tdda.referencetest.checkpandas import PandasComparison
+from tdda.referencetest.checkpandas import PandasComparison, dataframe_cache
 from tdda.referencetest.checkfiles import FilesComparison
 
 
@@ -107,6 +107,14 @@ class ReferenceTest(object):
                 it defaults to */tmp*, *c:\\temp* or whatever
                 :py:func:`tempfile.gettempdir()` returns, as
                 appropriate.
+
+            *dataframe_cache_bytes*:
+                Sets the memory budget (in bytes) for the in-memory cache
+                of reference DataFrames loaded from files (parquet or CSV),
+                which is shared across the process, so that tests comparing
+                against the same reference file don't each have to re-read
+                it. It is 512MB by default. Setting it to ``0`` disables
+                the cache.
         """
         for k in kwargs:
             if k == 'verbose':
@@ -115,6 +123,8 @@ class ReferenceTest(object):
                 cls.print_fn = kwargs[k]
             elif k == 'tmp_dir':
                 cls.tmp_dir = kwargs[k]
+            elif k == 'dataframe_cache_bytes':
+                dataframe_cache.set_max_bytes(kwargs[k])
             else:
                 raise Exception('set_defaults: Unrecogized option %s' % k)
 
@@ -253,6 +263,8 @@ class ReferenceTest(object):
         sortby=None,
         precision=None,
         type_matching=None,
+        key=None,
+        row_order=None,
     ):
         """Check that an in-memory Pandas `DataFrame` matches an in-memory
         reference one.
@@ -326,6 +338,24 @@ class ReferenceTest(object):
 
             *type_matching*  'strict', 'medium', 'permissive'
 
+            *key*:
+                (Optional) name of a column, or list of names of columns,
+                to match rows on, instead of comparing them in order.
+                Rows are matched with a hash join (rather than by sorting,
+                so the dataframes are not modified), with repeated keys
+                matched in order of occurrence. Keys present in only one
+                of the dataframes are reported, as are differences in
+                values for matching keys. Cannot be combined with *sortby*.
+
+            *row_order*:
+                (Optional) ``'ignore'`` to compare the dataframes as
+                multisets of rows, so that they match if they have the
+                same rows, the same number of times, in any order.
+                Only the rows that occur more often in one dataframe than
+                the other are reported. Floating-point values are rounded
+                to *precision* decimal places before rows are compared.
+                Cannot be combined with *key* or *sortby*.
+
         Raises :py:class:`NotImplementedError` if Pandas is not available.
 
         """
@@ -341,6 +371,8 @@ class ReferenceTest(object):
             sortby=sortby,
             precision=precision,
             type_matching=type_matching,
+            key=key,
+            row_order=row_order,
         )
         (failures, msgs) = r
         self._check_failures(failures, msgs)
@@ -359,6 +391,7 @@ class ReferenceTest(object):
         sortby=None,
         precision=None,
         type_matching=None,
+        key=None,
         **kwargs,
     ):
         """
@@ -403,8 +436,9 @@ class ReferenceTest(object):
                     - ``keep_default_na`` is ``False``
 
         It also accepts the ``check_data``, ``check_types``, ``check_order``,
-        ``check_extra_cols``, ``sortby``, ``condition`` and ``precision``
-        optional parameters described in :py:meth:`assertDataFramesEqual()`.
+        ``check_extra_cols``, ``sortby``, ``condition``, ``precision``
+        and ``key`` optional parameters described in
+        :py:meth:`assertDataFramesEqual()`.
 
         Raises :py:class:`NotImplementedError` if Pandas is not available.
 
@@ -414,9 +448,9 @@ class ReferenceTest(object):
             self.pandas._write_reference_dataframe(df, expected_path)
         else:
             ref_df = self.pandas.load_serialized_dataframe(
-                expected_path, actual_df=df, loader=csv_read_fn
+                expected_path, actual_df=df, loader=csv_read_fn, cached=True
             )
-            self.assertDataFramesEqual(
+            r = self.pandas.check_dataframe(
                 df,
                 ref_df,
                 actual_path=actual_path,
@@ -428,7 +462,11 @@ class ReferenceTest(object):
                 sortby=sortby,
                 precision=precision,
                 type_matching=type_matching,
+                ref_hashes=self.pandas.load_block_hashes(expected_path),
+                key=key,
             )
+            (failures, msgs) = r
+            self._check_failures(failures, msgs)
 
     def assertOnDiskDataFrameCorrect(
         self,
@@ -442,6 +480,7 @@ class ReferenceTest(object):
         condition=None,
         sortby=None,
         precision=None,
+        key=None,
         **kwargs,
     ):
         r"""Check that a DataFrame on disk (as a parquet file,
@@ -485,8 +524,9 @@ class ReferenceTest(object):
                 straight through to the *csv_read_fn* function.
 
         It also accepts the ``check_data``, ``check_types``, ``check_order``,
-        ``check_extra_cols``, ``sortby``, ``condition`` and ``precision``
-        optional parameters described in :py:meth:`assertDataFramesEqual()`.
+        ``check_extra_cols``, ``sortby``, ``condition``, ``precision``
+        and ``key`` optional parameters described in
+        :py:meth:`assertDataFramesEqual()`.
 
         Raises :py:class:`NotImplementedError` if Pandas is not available.
         """
@@ -507,6 +547,7 @@ class ReferenceTest(object):
                 sortby=sortby,
                 precision=precision,
                 loader=csv_read_fn,
+                key=key,
                 **kwargs,
             )
             (failures, msgs) = r
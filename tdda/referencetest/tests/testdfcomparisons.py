@@ -1,5 +1,6 @@
 import os
 
+import numpy as np
 import pandas as pd
 from rich import print as rprint
 from rich.console import Console
@@ -16,6 +17,7 @@ from tdda.referencetest.checkpandas import (
     same_structure_dataframe_diffs
 )
 from tdda.referencetest.basecomparison import DataFrameDiffs
+from tdda.referencetest.ddiff import StreamingComparison
 
 
 
@@ -355,6 +357,194 @@ class TestOne(ReferenceTestCase):
         })
         self.assertTrue(ddiff.diff_df.equals(expected))
 
+    def testSameStructureDataFrameDiffsPrecision(self):
+        ref_df = pd.DataFrame({
+            'f': [1.0, 2.0, np.nan, 4.0],
+            'i': [1, 2, 3, 4],
+            'I': pd.Series([1, None, 3, 4], dtype=pd.Int64Dtype()),
+            'm': [1.0, 2.0, 3.0, 4.0],
+            's': ['a', None, 'c', 'd'],
+        })
+        df = pd.DataFrame({
+            'f': [1.0001, 2.01, np.nan, np.nan],   # close, far, NaN, NaN
+            'i': [1, 2, 3, 5],
+            'I': pd.Series([1, None, 3, None], dtype=pd.Int64Dtype()),
+            'm': [1, 2, 3, 4],                     # int vs float: same
+            's': ['a', None, 'C', 'd'],
+        })
+
+        ddiff = same_structure_dataframe_diffs(df, ref_df, precision=3)
+        self.assertEqual(ddiff.n_diff_values, 5)
+        self.assertEqual(ddiff.n_diff_cols, 4)
+        self.assertEqual(ddiff.n_diff_rows, 3)
+        self.assertEqual(list(ddiff.diff_df), ['f', 'i', 'I', 's'])
+        self.assertEqual(list(ddiff.diff_df.f), [False, True, False, True])
+        self.assertEqual(list(ddiff.row_diff_counts.rowdiffs), [0, 1, 1, 3])
+
+        ddiff = same_structure_dataframe_diffs(df, ref_df)
+        self.assertEqual(list(ddiff.diff_df.f), [True, True, False, True])
+        self.assertEqual(ddiff.n_diff_values, 6)
+
+        ddiff = same_structure_dataframe_diffs(ref_df, ref_df, precision=3)
+        self.assertEqual(ddiff.n_diff_values, 0)
+        self.assertIsNone(ddiff.row_diff_counts)
+
+    def test_streaming_ddiff(self):
+        df = pd.DataFrame({
+            'a': range(100),
+            'b': [i / 7 for i in range(100)],
+            's': pd.Series(['xyz'[i % 3] for i in range(100)],
+                           dtype='category'),
+        })
+        ref_df = df.copy()
+        ref_df.loc[[3, 40, 41, 99], 'b'] += 1
+        ref_df.loc[41, 'a'] = -1
+        paths = {}
+        for (name, frame, row_group_size) in (('L', df, 13),
+                                              ('R', ref_df, 30),
+                                              ('S', df.head(90), 30)):
+            paths[name] = os.path.join(self.tmp_dir, f'stream-{name}.parquet')
+            frame.to_parquet(paths[name], row_group_size=row_group_size)
+            paths[name + 'csv'] = os.path.join(self.tmp_dir,
+                                               f'stream-{name}.csv')
+            frame.to_csv(paths[name + 'csv'], index=False)
+
+        expected = same_structure_dataframe_diffs(df, ref_df)
+        for (left, right) in (('L', 'R'), ('Lcsv', 'Rcsv')):
+            comparison = StreamingComparison(batch_rows=16, detail_rows=3)
+            r = comparison.compare(paths[left], paths[right])
+            self.assertEqual(r.failures, 1)
+            diff = r.diffs.df.diff
+            self.assertEqual(diff.n_diff_values, 5)
+            self.assertEqual(diff.n_diff_rows, 4)
+            self.assertEqual(diff.col_counts, {'a': 1, 'b': 4})
+            self.assertEqual(str(diff), str(expected))
+            self.assertEqual(list(comparison.left_details.index), [3, 40, 41])
+            self.assertEqual(list(diff.row_diff_counts.rowdiffs), [1, 1, 2])
+
+        comparison = StreamingComparison(batch_rows=16)
+        self.assertEqual(comparison.compare(paths['L'], paths['Lcsv']),
+                         (0, []))
+        for (left, right, actual) in (('L', 'S', '100'),
+                                      ('Lcsv', 'Scsv', 'at least 96')):
+            r = comparison.compare(paths[left], paths[right])
+            self.assertEqual(r.failures, 1)
+            self.assertEqual(r.diffs.lines[-2:], [
+                'Data frames have different numbers of rows.',
+                f'Actual records: {actual}; Expected records: 90',
+            ])
+
+        # a later non-numeric value widens the column's type, so on
+        # only one side, it is a type difference, not differing values
+        bad_df = df.astype({'a': object})
+        bad_df.loc[50, 'a'] = 'q'
+        paths['B'] = os.path.join(self.tmp_dir, 'stream-B.csv')
+        bad_df.to_csv(paths['B'], index=False)
+        r = comparison.compare(paths['Lcsv'], paths['B'])
+        self.assertEqual(r.failures, 1)
+        self.assertIsNone(r.diffs.df.diff)
+        self.assertEqual(list(r.diffs.df.field_types), ['a'])
+        self.assertIn('Data frames have different column structure.',
+                      r.diffs.lines)
+
+        # but the same widening on both sides is not a difference
+        widened_df = pd.DataFrame({
+            'n': [i if i < 25 else i + 0.5 for i in range(30)],
+            's': [None] * 15 + ['x'] * 15,
+        })
+        paths['W'] = os.path.join(self.tmp_dir, 'stream-W.csv')
+        paths['V'] = os.path.join(self.tmp_dir, 'stream-V.csv')
+        widened_df.to_csv(paths['W'], index=False)
+        widened_df.to_csv(paths['V'], index=False)
+        comparison = StreamingComparison(batch_rows=10)
+        self.assertEqual(comparison.compare(paths['W'], paths['V']),
+                         (0, []))
+        widened_df.loc[29, 's'] = 'y'
+        widened_df.to_csv(paths['V'], index=False)
+        r = comparison.compare(paths['W'], paths['V'])
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(r.diffs.df.diff.col_counts, {'s': 1})
+
+    def test_keyed_comparison(self):
+        ref_df = pd.DataFrame({
+            'k': ['a', 'b', 'c', 'd', 'b'],
+            'n': [1, 2, 3, 4, 5],
+            'x': [0.5, 1.5, 2.5, 3.5, 4.5],
+        })
+        df = ref_df.iloc[[1, 3, 4, 0, 2]].reset_index(drop=True)
+        original = df.copy()
+        self.assertDataFramesEqual(df, ref_df, key='k')
+        self.assertTrue(df.equals(original))  # not sorted in place
+
+        c = PandasComparison(verbose=False)
+        df = pd.DataFrame({
+            'k': ['e', 'b', 'a', 'c', 'b'],
+            'n': [9, 2, 1, 3, 5],
+            'x': [0.5, 1.5, 0.5, 2.0, 4.5],
+        })
+        r = c.check_dataframe(df, ref_df, key=['k'],
+                              create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(list(r.diffs.df.missing_keys.k), ['d'])
+        self.assertEqual(list(r.diffs.df.extra_keys.k), ['e'])
+        diff = r.diffs.df.diff
+        self.assertEqual(diff.n_diff_values, 1)
+        self.assertEqual(list(diff.diff_df), ['x'])
+        self.assertEqual(list(diff.diff_df.index), ['b', 'a', 'c', 'b'])
+        self.assertEqual(list(diff.diff_df.x), [False, False, True, False])
+        self.assertIn('Missing keys (1):\nk\nd', r.diffs.lines)
+
+        with self.assertRaises(ValueError):
+            c.check_dataframe(df, ref_df, key='k', sortby=['k'])
+
+    def test_unordered_comparison(self):
+        ref_df = pd.DataFrame({
+            'k': ['a', 'b', 'c', 'b'],
+            'x': [0.5, 1.5, 2.5, 1.5],
+        })
+        df = ref_df.iloc[[3, 2, 0, 1]].reset_index(drop=True)
+        df.loc[1, 'x'] += 1e-9
+        self.assertDataFramesEqual(df, ref_df, row_order='ignore',
+                                   precision=6)
+
+        c = PandasComparison(verbose=False)
+        df = pd.DataFrame({
+            'k': ['b', 'c', 'a', 'b', 'b', 'd'],
+            'x': [1.5, 2.5, 0.5, 1.5, 1.5, 3.5],
+        })
+        r = c.check_dataframe(df, ref_df, row_order='ignore',
+                              create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(r.diffs.df.missing_rows.shape, (0, 2))
+        self.assertEqual(list(r.diffs.df.extra_rows.k), ['b', 'd'])
+        self.assertEqual(list(r.diffs.df.extra_rows.index), [4, 5])
+        self.assertIn('Extra rows (2):', r.diffs.lines[-1])
+
+        r = c.check_dataframe(ref_df, df, row_order='ignore',
+                              create_temporaries=False)
+        self.assertEqual(list(r.diffs.df.missing_rows.k), ['b', 'd'])
+
+        r = c.check_dataframe(df, ref_df, row_order='ignore',
+                              check_data=False, create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(r.diffs.lines[-2:], [
+            'Data frames have different numbers of rows.',
+            'Actual records: 6; Expected records: 4',
+        ])
+
+        # values that only differ in type are different rows
+        r = c.check_dataframe(pd.DataFrame({'o': [1, 2]}, dtype=object),
+                              pd.DataFrame({'o': ['1', '2']}),
+                              row_order='ignore', check_types=False,
+                              create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(len(r.diffs.df.extra_rows), 2)
+
+        with self.assertRaises(ValueError):
+            c.check_dataframe(df, ref_df, row_order='ignore', key='k')
+        with self.assertRaises(ValueError):
+            c.check_dataframe(df, ref_df, row_order='sorted')
+
     def test_ddiff_values_output(self):
         df = four_squares()
         rdf = four_squares_and_ten()
@@ -14,9 +14,13 @@ from tdda.referencetest.checkpandas import (
     PandasComparison,
     types_match,
     loosen_type,
+    block_hash_metadata,
+    dataframe_cache,
+    DEFAULT_DATAFRAME_CACHE_BYTES,
 )
 from tdda.referencetest.basecomparison import diffcmd
 from tdda.referencetest import tag, ReferenceTestCase
+from tdda.referencetest.referencetest import ReferenceTest
 
 
 def refloc(filename):
@@ -117,6 +121,94 @@ class TestPandasDataFrames(ReferenceTestCase):
             ],
         )
 
+    def test_block_hashes(self):
+        compare = PandasComparison(verbose=False)
+        ref_df = pd.DataFrame({
+            'a': range(10),
+            'b': [i / 3 for i in range(10)],
+            'c': pd.Series(list('abcdeabcde'), dtype='category'),
+        })
+        hashes = block_hash_metadata(ref_df, block_rows=4)
+        self.assertEqual(len(hashes['hashes']), 3)
+        self.assertEqual(hashes['dtypes'], ['int64', 'float64', 'string'])
+
+        df = ref_df.copy()
+        self.assertEqual(compare.check_dataframe(df, ref_df,
+                                                 ref_hashes=hashes),
+                         (0, []))
+
+        df.loc[5, 'b'] += 1e-9  # different hash, but within precision
+        self.assertEqual(compare.check_dataframe(df, ref_df,
+                                                 ref_hashes=hashes),
+                         (0, []))
+
+        df.loc[9, 'a'] = 99
+        r = compare.check_dataframe(df, ref_df, ref_hashes=hashes,
+                                    create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(r.diffs.df.diff.n_diff_values, 1)
+        self.assertEqual(list(r.diffs.df.diff.row_diff_counts.rowdiffs),
+                         [0] * 9 + [1])
+
+        # Hashes for another data frame aren't used
+        other = block_hash_metadata(df[['a', 'b']], block_rows=4)
+        r = compare.check_dataframe(df, ref_df, ref_hashes=other,
+                                    create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+
+        # Object values that differ only in type don't have the same hash
+        ref_df = pd.DataFrame({'o': ['1', '2', 'True']})
+        df = pd.DataFrame({'o': [1, 2, 'True']})
+        hashes = block_hash_metadata(ref_df, block_rows=4)
+        r = compare.check_dataframe(df, ref_df, ref_hashes=hashes,
+                                    create_temporaries=False)
+        self.assertEqual(r.failures, 1)
+        self.assertEqual(r.diffs.df.diff.n_diff_values, 2)
+
+    def test_parquet_block_hashes(self):
+        compare = PandasComparison(verbose=False)
+        df = pd.DataFrame({'a': [1, 2, 3], 's': ['x', None, 'z']})
+        path = os.path.join(self.tmp_dir, 'block-hashes.parquet')
+        compare._write_reference_dataframe(df, path)
+        hashes = compare.load_block_hashes(path)
+        self.assertEqual(hashes['nrows'], 3)
+        self.assertEqual(hashes['columns'], ['a', 's'])
+        self.assertTrue(pd.read_parquet(path).equals(df))
+        self.assertEqual(compare.check_serialized_dataframe(path, path),
+                         (0, []))
+        self.assertIsNone(compare.load_block_hashes(refloc('colours.txt')))
+
+    def test_dataframe_cache(self):
+        compare = PandasComparison(verbose=False)
+        path = os.path.join(self.tmp_dir, 'cached.csv')
+        pd.DataFrame({'a': [3, 1, 2]}).to_csv(path, index=False)
+        dataframe_cache.clear()
+        try:
+            df1 = compare.load_serialized_dataframe(path, cached=True)
+            df1.sort_values('a', inplace=True)  # mustn't affect the cache
+            df2 = compare.load_serialized_dataframe(path, cached=True)
+            self.assertEqual(list(df2.a), [3, 1, 2])
+            self.assertEqual((dataframe_cache.hits, dataframe_cache.misses),
+                             (1, 1))
+            compare.load_serialized_dataframe(path)  # not cached
+            self.assertEqual(dataframe_cache.stats()['size'], 1)
+
+            with open(path, 'w') as f:  # different size, so different key
+                f.write('a\n4\n5\n')
+            df3 = compare.load_serialized_dataframe(path, cached=True)
+            self.assertEqual(list(df3.a), [4, 5])
+            self.assertEqual(dataframe_cache.stats()['size'], 1)
+
+            ReferenceTest.set_defaults(dataframe_cache_bytes=0)
+            self.assertEqual(dataframe_cache.stats()['size'], 0)
+            compare.load_serialized_dataframe(path, cached=True)
+            self.assertEqual(dataframe_cache.stats()['size'], 0)
+        finally:
+            ReferenceTest.set_defaults(
+                dataframe_cache_bytes=DEFAULT_DATAFRAME_CACHE_BYTES
+            )
+            dataframe_cache.clear()
+
     def test_types_match(self):
         b = np.dtype('bool')
         B = pd.core.arrays.boolean.BooleanDtype
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for rexpy.
+
+Generates corpora of various kinds of strings (email addresses, UUIDs,
+ISO dates, postcodes, telephone numbers, free text and mixed-format IDs)
+of different sizes, with controlled numbers of distinct values,
+and times regular expression extraction and coverage calculation
+on them.
+
+Run with::
+
+    python -m tdda.rexpy.benchmark [FLAGS]
+
+Results are written as JSON lines (one per corpus, size and task),
+to standard output or to the file specified with ``--output``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from tdda import __version__
+from tdda.rexpy.rexpy import (extract, pdextract, rex_incremental_coverage,
+                              rexpy_streams, Size)
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_DISTINCT_FRACTION = 0.1
+
+TASKS = ['extract', 'pdextract', 'coverage', 'cli']
+
+FIRST_NAMES = ['alice', 'bob', 'carol', 'dave', 'eve', 'frank', 'grace',
+               'heidi', 'ivan', 'judy', 'mallory', 'oscar', 'peggy',
+               'rupert', 'sybil', 'trent', 'victor', 'walter']
+DOMAINS = ['example.com', 'example.org', 'example.co.uk', 'mail.example.net',
+           'stochasticsolutions.com', 'tdda.info']
+WORDS = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog',
+         'data', 'test', 'driven', 'analysis', 'regular', 'expression',
+         'constraint', 'reference', 'pattern', 'value', 'column', 'table']
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def gen_email(rng):
+    name = rng.choice(FIRST_NAMES)
+    sep = rng.choice(['.', '_', ''])
+    return '%s%s%s%s@%s' % (name, sep, rng.choice(FIRST_NAMES),
+                            rng.randint(0, 999) if rng.random() < 0.5 else '',
+                            rng.choice(DOMAINS))
+
+
+def gen_uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def gen_iso_date(rng):
+    date = '%04d-%02d-%02d' % (rng.randint(1900, 2030), rng.randint(1, 12),
+                               rng.randint(1, 28))
+    if rng.random() < 0.5:
+        return date
+    return '%sT%02d:%02d:%02d' % (date, rng.randint(0, 23),
+                                  rng.randint(0, 59), rng.randint(0, 59))
+
+
+def gen_postcode(rng):
+    outward = ''.join(rng.choice(LETTERS) for i in range(rng.randint(1, 2)))
+    outward += str(rng.randint(1, 99))
+    inward = '%d%s%s' % (rng.randint(0, 9), rng.choice(LETTERS),
+                         rng.choice(LETTERS))
+    return '%s %s' % (outward, inward)
+
+
+def gen_phone(rng):
+    fmt = rng.randint(0, 3)
+    if fmt == 0:
+        return '+44 %d %03d %04d' % (rng.randint(20, 199), rng.randint(0, 999),
+                                     rng.randint(0, 9999))
+    elif fmt == 1:
+        return '(0%d) %03d %04d' % (rng.randint(20, 199), rng.randint(0, 999),
+                                    rng.randint(0, 9999))
+    elif fmt == 2:
+        return '0%d-%03d-%04d' % (rng.randint(20, 199), rng.randint(0, 999),
+                                  rng.randint(0, 9999))
+    else:
+        return '+1 %03d %03d %04d' % (rng.randint(200, 999),
+                                      rng.randint(0, 999),
+                                      rng.randint(0, 9999))
+
+
+def gen_free_text(rng):
+    words = [rng.choice(WORDS) for i in range(rng.randint(1, 12))]
+    text = ' '.join(words).capitalize()
+    return text + rng.choice(['', '.', '!', '?'])
+
+
+def gen_mixed_id(rng):
+    fmt = rng.randint(0, 3)
+    if fmt == 0:
+        return '%s-%04d' % (''.join(rng.choice(LETTERS) for i in range(2)),
+                            rng.randint(0, 9999))
+    elif fmt == 1:
+        return 'id_%d' % rng.randint(0, 10 ** 6)
+    elif fmt == 2:
+        return '%d-%s-%03d' % (rng.randint(1, 999),
+                               ''.join(rng.choice(LETTERS) for i in range(2)),
+                               rng.randint(0, 999))
+    else:
+        return 'ID%06d' % rng.randint(0, 999999)
+
+
+GENERATORS = {
+    'emails': gen_email,
+    'uuids': gen_uuid,
+    'iso_dates': gen_iso_date,
+    'postcodes': gen_postcode,
+    'phones': gen_phone,
+    'free_text': gen_free_text,
+    'mixed_ids': gen_mixed_id,
+}
+
+
+def generate_corpus(kind, n, n_distinct, seed=None):
+    """
+    Generate a list of n strings of the kind given (a key of GENERATORS),
+    drawn from (up to) n_distinct distinct values.
+
+    If the generator cannot produce enough distinct values
+    (after trying 20 times as many as requested), fewer are used.
+    """
+    rng = random.Random(seed)
+    generator = GENERATORS[kind]
+    n_distinct = min(n, n_distinct)
+    distinct = set()
+    n_tries = 0
+    while len(distinct) < n_distinct and n_tries < 20 * n_distinct:
+        distinct.add(generator(rng))
+        n_tries += 1
+    distinct = sorted(distinct)
+    corpus = distinct + [rng.choice(distinct)
+                         for i in range(n - len(distinct))]
+    rng.shuffle(corpus)
+    return corpus
+
+
+def measure(f, memory=True):
+    """
+    Call f, returning its result, the time it took (in seconds),
+    and, if memory is set, the peak memory allocated (in bytes)
+    during a second call, with tracemalloc running.
+    (Separate calls are used, since tracing slows down the call.)
+    """
+    start = time.perf_counter()
+    result = f()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            f()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_task(task, corpus, sampling, seed=None, memory=True):
+    """
+    Run a single benchmark task on corpus, returning a dictionary
+    of results.
+
+    The tasks are:
+
+        extract:    rexpy.extract
+        pdextract:  rexpy.pdextract on the corpus as a pandas Series
+                    (which always uses rexpy's default sampling)
+        coverage:   rex_incremental_coverage for the patterns
+                    extracted from the corpus (not included in the time)
+        cli:        extraction as by the rexpy command, from a file
+    """
+    size = Size(use_sampling=True) if sampling else Size(use_sampling=False)
+    passes = None
+    n_patterns = None
+    if task == 'extract':
+        f = lambda: extract(corpus, size=size, seed=seed, as_object=True)
+        x, elapsed, peak = measure(f, memory)
+        passes = x.n_passes
+        n_patterns = len(x.results.rex) if x.results else 0
+    elif task == 'pdextract':
+        import pandas as pd
+        series = pd.Series(corpus)
+        f = lambda: pdextract(series, seed=seed)
+        patterns, elapsed, peak = measure(f, memory)
+        n_patterns = len(patterns)
+    elif task == 'coverage':
+        x = extract(corpus, size=size, seed=seed, as_object=True)
+        patterns = x.results.rex if x.results else []
+        f = lambda: rex_incremental_coverage(patterns, x.examples)
+        _, elapsed, peak = measure(f, memory)
+        n_patterns = len(patterns)
+    elif task == 'cli':
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(fd, 'w', encoding='UTF-8') as f:
+                for s in corpus:
+                    f.write(s + '\n')
+            f = lambda: rexpy_streams(path, out_path=False, size=size,
+                                      seed=seed)
+            patterns, elapsed, peak = measure(f, memory)
+            n_patterns = len(patterns)
+        finally:
+            os.remove(path)
+    else:
+        raise ValueError('Unknown benchmark task: %s' % task)
+    return {
+        'task': task,
+        'sampling': sampling,
+        'seconds': elapsed,
+        'peak_memory': peak,
+        'passes': passes,
+        'n_patterns': n_patterns,
+    }
+
+
+def run_benchmarks(corpora=None, sizes=None,
+                   distinct=DEFAULT_DISTINCT_FRACTION, tasks=None,
+                   sampling=(False, True), seed=0, memory=True, out=None):
+    """
+    Run the benchmarks, yielding a dictionary of results for each
+    corpus, size, task and sampling setting, and writing each
+    as a line of JSON to out, if provided.
+
+    distinct is the number of distinct values in each corpus,
+    either as a count (if at least 1) or as a fraction of its size.
+    """
+    corpora = corpora or sorted(GENERATORS)
+    sizes = sizes or DEFAULT_SIZES
+    tasks = tasks or TASKS
+    environment = {
+        'python': platform.python_version(),
+        'tdda': __version__,
+        'platform': platform.platform(),
+    }
+    for kind in corpora:
+        for n in sizes:
+            n_distinct = int(distinct if distinct >= 1 else n * distinct)
+            corpus = generate_corpus(kind, n, max(n_distinct, 1), seed=seed)
+            for task in tasks:
+                for use_sampling in sampling:
+                    if task == 'pdextract' and use_sampling != sampling[0]:
+                        continue  # pdextract doesn't take a size
+                    result = {
+                        'corpus': kind,
+                        'n': n,
+                        'n_distinct': len(set(corpus)),
+                    }
+                    result.update(run_task(task, corpus, use_sampling,
+                                           seed=seed, memory=memory))
+                    result.update(environment)
+                    if out:
+                        out.write(json.dumps(result) + '\n')
+                        out.flush()
+                    yield result
+
+
+def benchmark_parser():
+    parser = argparse.ArgumentParser(prog='python -m tdda.rexpy.benchmark',
+                                     description='Benchmark rexpy.')
+    parser.add_argument('-c', '--corpus', action='append',
+                        choices=sorted(GENERATORS),
+                        help='corpus to use (default: all); can be repeated')
+    parser.add_argument('-n', '--sizes', default=None,
+                        help='comma-separated corpus sizes, e.g. 1e3,1e4 '
+                             '(default: %s)'
+                             % ','.join(str(n) for n in DEFAULT_SIZES))
+    parser.add_argument('-d', '--distinct', type=float,
+                        default=DEFAULT_DISTINCT_FRACTION,
+                        help='number of distinct values in each corpus, '
+                             'as a count or a fraction of its size '
+                             '(default: %s)' % DEFAULT_DISTINCT_FRACTION)
+    parser.add_argument('-t', '--task', action='append', choices=TASKS,
+                        help='task to time (default: all); can be repeated')
+    parser.add_argument('--sampling', choices=['on', 'off', 'both'],
+                        default='both',
+                        help='whether to use Size(use_sampling=True) '
+                             '(default: both)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for corpus generation and extraction')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not measure peak memory')
+    parser.add_argument('-o', '--output',
+                        help='file to write JSON lines results to '
+                             '(default: standard output)')
+    return parser
+
+
+def main(args=None):
+    params = benchmark_parser().parse_args(args)
+    sizes = ([int(float(n)) for n in params.sizes.split(',')]
+             if params.sizes else None)
+    sampling = {'on': (True,), 'off': (False,),
+                'both': (False, True)}[params.sampling]
+    out = open(params.output, 'w') if params.output else sys.stdout
+    try:
+        for result in run_benchmarks(corpora=params.corpus, sizes=sizes,
+                                     distinct=params.distinct,
+                                     tasks=params.task, sampling=sampling,
+                                     seed=params.seed,
+                                     memory=not params.no_memory, out=out):
+            pass
+    finally:
+        if params.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
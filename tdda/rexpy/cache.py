@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent cache for the results of rexpy extraction.
+
+Results are keyed on a hash of the distinct values extracted from, with
+their frequencies, together with the parameters used for extraction,
+so that extraction for the same data with the same parameters
+(e.g. when discovering constraints for a stable reference dataset)
+can be skipped.
+
+The cache is a directory containing one small JSON file per result.
+When its total size exceeds a limit, the least recently used results
+are removed.
+
+The cache is only used if requested, either by passing ``cache`` to
+:py:func:`tdda.rexpy.extract` or :py:func:`tdda.rexpy.pdextract`,
+or by setting the ``TDDA_REXPY_CACHE`` environment variable to the
+path of the directory to use.
+
+Note that, when sampling, extraction results can depend on the order
+of the examples, which is not part of the key; a cached result will
+always be one that was found for the same distinct values and
+frequencies, however.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from tdda import __version__
+
+
+REXPY_CACHE_ENV = 'TDDA_REXPY_CACHE'
+DEFAULT_REXPY_CACHE_DIR = '~/.tdda_rexpy_cache'
+DEFAULT_MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class RexpyCache(object):
+    """
+    A persistent, size-limited cache of rexpy extraction results.
+
+    Inputs:
+
+        *path*:
+                    Directory in which to keep the results.
+                    (Created if necessary.) If not provided, the path
+                    from the ``TDDA_REXPY_CACHE`` environment variable
+                    is used, or ``~/.tdda_rexpy_cache``.
+        *max_bytes*:
+                    Maximum total size of the results kept.
+
+    The numbers of hits, misses and evictions (since the object was
+    created) are available as attributes, and through :py:meth:`stats`.
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        path = (path or os.environ.get(REXPY_CACHE_ENV)
+                or DEFAULT_REXPY_CACHE_DIR)
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, items, params):
+        """
+        Returns the cache key for the (value, frequency) items and the
+        dictionary of extraction parameters given, or None if the values
+        are not all strings (or None).
+        """
+        def sort_key(item):
+            return (item[0] is not None, item[0] or '')
+
+        h = hashlib.sha256()
+        h.update(json.dumps([__version__, params], sort_keys=True,
+                            default=repr).encode('UTF-8'))
+        try:
+            items = sorted(items, key=sort_key)
+        except TypeError:
+            return None
+        for (value, freq) in items:
+            if value is not None and type(value) is not str:
+                return None
+            h.update(b'\n')
+            h.update(json.dumps([value, int(freq)],
+                                ensure_ascii=False).encode('UTF-8'))
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        """
+        Returns the cached patterns for the key given, or None if there
+        are none.
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, encoding='UTF-8') as f:
+                patterns = json.loads(f.read())['patterns']
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return patterns
+
+    def put(self, key, patterns):
+        """
+        Save the patterns for the key given, evicting the least recently
+        used results if the cache is then too large.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='UTF-8') as f:
+            f.write(json.dumps({'patterns': patterns}))
+        os.replace(tmp_path, self.entry_path(key))
+        self.evict()
+
+    def entries(self):
+        """
+        Returns a list of (last-used time, size, path) for the results
+        in the cache.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                path = os.path.join(self.path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # removed by another process
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used results until the total size
+        of the cache is within max_bytes.
+        """
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for (mtime, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Remove all results from the cache.
+        """
+        for (mtime, size, path) in self.entries():
+            os.remove(path)
+
+    def hit_rate(self):
+        """
+        Proportion of lookups for which a result was found in the cache
+        (or None, if there have been none).
+        """
+        n = self.hits + self.misses
+        return self.hits / n if n else None
+
+    def stats(self):
+        """
+        Returns a dictionary of statistics about the cache's use.
+        """
+        entries = self.entries()
+        return {
+            'path': self.path,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(e[1] for e in entries),
+        }
+
+
+CACHES = {}
+
+
+def get_rexpy_cache(cache=None):
+    """
+    Returns the RexpyCache to use, given the cache parameter to
+    extract or pdextract, which can be:
+
+        None:            to use the cache in the directory specified
+                         by the TDDA_REXPY_CACHE environment variable,
+                         if set (otherwise no cache)
+        False:           for no cache
+        True:            for the default cache
+        a path:          for the cache in that directory
+        a RexpyCache:    to use that cache
+
+    Caches are shared (for each directory), so that their statistics
+    accumulate.
+    """
+    if isinstance(cache, RexpyCache):
+        return cache
+    if cache is None:
+        cache = os.environ.get(REXPY_CACHE_ENV) or False
+    if cache is False:
+        return None
+    path = cache if cache is not True else None
+    rex_cache = RexpyCache(path)
+    return CACHES.setdefault(rex_cache.path, rex_cache)
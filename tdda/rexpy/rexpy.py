@@ -9,17 +9,27 @@ programs.
 
 """
 
+import copy
+import fnmatch
+import json
+import os
 import random
 import re
 import string
 import sys
+import tempfile
+import time
 
 from array import array
 from collections import Counter, defaultdict, namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pprint
 
+import numpy as np
+
 from tdda import __version__
-from tdda.utils import nvl
+from tdda.rexpy.cache import get_rexpy_cache
+from tdda.utils import compiled_regex, nvl
 
 isPython2 = sys.version_info[0] < 3
 str_type = unicode if isPython2 else str
@@ -37,6 +47,8 @@ UNESCAPES = '''!"%',/:;<=>@_` '''
 USAGE = r'''Usage:
 
     rexpy [FLAGS] [INPUTFILE [OUTPUTFILE]]
+    rexpy [FLAGS] --files INPUTFILE...
+    rexpy [FLAGS] --columns SELECTORS TABLEFILE [OUTPUTFILE]
 
 If INPUTFILE is provided, it should contain one string per line;
 otherwise lines will be read from standard input.
@@ -44,6 +56,15 @@ otherwise lines will be read from standard input.
 If OUTPUTFILE is provided, regular expressions found will be written
 to that (one per line); otherwise they will be printed.
 
+With --files, regular expressions are found separately for each
+INPUTFILE. With --columns, TABLEFILE should be a CSV or parquet file,
+and regular expressions are found separately for each column selected.
+In both cases, the results are written as JSON lines (to OUTPUTFILE,
+if provided, or printed), one per file or column, with the patterns,
+the number of strings each matches (counting each string only for
+the first pattern that matches it), the number matched by none,
+and the time taken (in seconds).
+
 Optional FLAGS may be used to modify Rexpy's behaviour:
 
   -h, --header      Discard first line, as a header.
@@ -96,6 +117,26 @@ Optional FLAGS may be used to modify Rexpy's behaviour:
   -vlf, --variable  Use variable length fragments
 
   -flf, --fixed     Use fixed length fragments
+
+  --max-distinct N  Keep at most N distinct input strings in memory.
+                    Beyond that, a sample of the strings of each length
+                    is used for extraction and the rest are kept in
+                    a temporary (spill) file, which is used for checking
+                    the regular expressions against all the strings.
+
+  --files           Treat each argument as an input file, and find
+                    regular expressions for each separately.
+
+  --columns SELECTORS
+                    Find regular expressions for each column of TABLEFILE
+                    whose name matches any of the comma-separated
+                    SELECTORS, which may include shell-style wildcards
+                    (e.g. 'id,*_code'). Values in CSV files are read
+                    as strings; other values in parquet files are
+                    converted to strings. Can be repeated.
+
+  --jobs N          Use a pool of N worker processes, to process
+                    several files or columns at once.
 '''
 ########################################
 #
@@ -130,8 +171,19 @@ RE_FLAGS = re.UNICODE | re.DOTALL
 
 DIALECTS = ['perl']
 
+PRIOR_DIALECTS = (None, 'perl', 'portable', 'grep')  # Usable for prior
+                                                     # patterns, since Python
+                                                     # understands them
+
 DO_ALL_SIZE = 100000000
 
+N_CHUNKS_PER_WORKER = 4          # When using worker processes, split the
+                                 # work into this many chunks per worker
+
+MAX_DISTINCT_IN_MEMORY = 1000000  # Streamed inputs with more distinct
+                                  # strings than this are sampled
+                                  # and spilled to disk
+
 class Size(object):
     def __init__(self, **kwargs):
         self.use_sampling = nvl(kwargs.get('use_sampling', USE_SAMPLING),
@@ -163,21 +215,33 @@ class Size(object):
 
 
 
-nCalls = 0
-memo = {}
 def cre(rex):
     """
     Compiled regular expression
-    Memoized implementation.
+    (from tdda's shared, bounded cache of compiled regular expressions).
     """
-    global nCalls, memo
-    nCalls += 1
-    c = memo.get(rex)
-    if c:
-        return c
-    else:
-        memo[rex] = c = re.compile(rex, RE_FLAGS)
-        return c
+    return compiled_regex(rex, RE_FLAGS)
+
+
+def combined_cre(rexes):
+    """
+    Compiled regular expression matching any of the regular expressions
+    given, with each wrapped in a named group (r0, r1, ...), so that the
+    index of the (first) one that matched is available from the name
+    of the match's last group (m.lastgroup).
+
+    Since alternatives are tried in order, a string matches the combined
+    expression through the first of the regular expressions that it matches.
+
+    Returns None if the regular expressions cannot be combined
+    (e.g. because one has global inline flags, which are only allowed
+    at the start of a regular expression).
+    """
+    rex = '|'.join('(?P<r%d>%s)' % (i, r) for (i, r) in enumerate(rexes))
+    try:
+        return cre(rex)
+    except (re.error, AssertionError, OverflowError, RecursionError):
+        return None
 
 
 def terminated_cre(expr):
@@ -188,6 +252,16 @@ def terminated_re(expr):
     return '^%s$' % expr
 
 
+def unterminated_re(expr):
+    """
+    Inverse of terminated_re (for expressions that are terminated).
+    """
+    if (expr.startswith('^') and expr.endswith('$')
+            and not expr.endswith('\\$')):
+        return expr[1:-1]
+    return expr
+
+
 if TERMINATE:
     poss_term_cre = terminated_cre
     poss_term_re = terminated_re
@@ -390,6 +464,41 @@ class Categories(object):
 
 
 
+def coarse_class_code(Cats, c):
+    """
+    Classify character into one of the coarse categories in Cats
+    """
+    for cat in Cats.SpecificCoarseCats:
+        if re.match(cat.re_single, c):
+            return cat.code
+    assert re.match(Cats.Other.re_single, c)
+    return Cats.Other.code
+
+
+class CoarseClassTable(dict):
+    """
+    Translation table (for str.translate) mapping the code point of
+    each character to the code for its coarse category in Cats.
+
+    Entries are added as characters are first seen.
+    """
+    def __init__(self, Cats):
+        dict.__init__(self)
+        self.Cats = Cats
+
+    def __missing__(self, o):
+        self[o] = code = coarse_class_code(self.Cats, chr(o))
+        return code
+
+
+def is_too_many_groups_rle(rle):
+    """
+    True if rle is the single run of CODE.ANY used for strings
+    whose coarse classification needs too many groups.
+    """
+    return len(rle) == 1 and rle[0][0] == CODE.ANY
+
+
 class Fragment(namedtuple('Fragment', 're group')):
     """
     Container for a fragment.
@@ -460,6 +569,35 @@ class Extractor(object):
     Verbose is usually 0 or ``False``. It can be to ``True`` or 1 for various
     extra output, and to higher numbers for even more verbose output.
     The highest level currently used is 2.
+
+    If workers is more than 1, the run-length encoding of the examples
+    and the refinement of the fragments for each VRLE are carried out
+    in a pool of that many worker processes. The results are the same
+    as without workers.
+
+    prior can be a list of regular expressions (in the perl, portable
+    or grep dialect) previously found for similar data (e.g. an earlier
+    version of the same data). The examples are first checked against
+    these, and extraction is only performed on those examples that
+    match none of them. The results are the prior regular expressions
+    that match at least one example, followed by any new ones.
+    In this case, self.examples only contains the examples that did not
+    match any prior regular expression, and self.prior_freqs records
+    the number of examples matched by each prior regular expression.
+
+    time_budget can be a number of seconds, in which case extraction
+    stops (between passes, or between alignment steps) once that much
+    time has been taken, and the results are the patterns found so far,
+    with a .{m,n} pattern (based only on their lengths) for any examples
+    that none of them match. The first pass is always completed,
+    so the budget can be exceeded. If extraction is stopped early,
+    self.timed_out is set and a warning is added to self.warnings
+    (and written to stderr).
+
+    shared can be a dictionary in which the coarse classifications
+    and run-length encodings of strings are kept, so that they can be
+    reused by other extractors given the same dictionary (as by
+    extract_columns). This does not affect the results.
     """
     def __init__(self, examples, extract=True, tag=False, extra_letters=None,
                  full_escape=False,
@@ -470,12 +608,21 @@ class Extractor(object):
                  min_diff_strings_per_pattern=MIN_DIFF_STRINGS_PER_PATTERN,
                  min_strings_per_pattern=MIN_STRINGS_PER_PATTERN,
                  size=None, seed=None, dialect=DEFAULT_DIALECT,
+                 workers=None, prior=None, time_budget=None, shared=None,
                  verbose=VERBOSITY):
         """
         Set class attributes and clean input strings.
         Also performs exraction unless extract=False.
         """
+        if prior and dialect not in PRIOR_DIALECTS:
+            raise ValueError('Prior regular expressions cannot be used with '
+                             'the %s dialect.' % dialect)
         self.verbose = verbose
+        self.workers = workers
+        self.pool = None                    # worker processes, if any
+        self.time_budget = time_budget
+        self.deadline = None
+        self.timed_out = False
         self.size = size or Size(use_sampling=False if size == 0 else None)
         if self.size.use_sampling:
             self.by_length = Tree()         # Also store examples by length
@@ -493,7 +640,15 @@ class Extractor(object):
         else:
             self.check_fn = self.check_for_failures
             self.all_examples = self.clean(examples)
-        strings, _ = self.check_fn([], self.size.do_all)
+        self.prior = list(prior or [])
+        self.prior_freqs = [0] * len(self.prior)
+        if self.prior:
+            self.check_prior()
+        prng_state = PRNGState(seed)  # so that the first sample is seeded
+        try:
+            strings, _ = self.check_fn([], self.size.do_all)
+        finally:
+            prng_state.restore()
         self.examples = self.clean(strings)
 
         self.results = None
@@ -501,6 +656,16 @@ class Extractor(object):
         self.n_too_many_groups = 0
         self.Cats = Categories(self.thin_extras(extra_letters),
                                full_escape=full_escape)  # no dialect
+        # Coarse classification table and RLEs of examples, by string,
+        # possibly shared with other extractors (with the same letters)
+        key = (self.Cats.extra_letters, full_escape)
+        if shared is None or key not in shared:
+            self.coarse_table = CoarseClassTable(self.Cats)
+            self.rle_cache = {}
+            if shared is not None:
+                shared[key] = (self.coarse_table, self.rle_cache)
+        else:
+            self.coarse_table, self.rle_cache = shared[key]
         if dialect == 'perl':
             dialect = None
         self.dialect = dialect
@@ -523,10 +688,22 @@ class Extractor(object):
         Actually perform the regular expression 'extraction'.
         """
         self.prng_state = PRNGState(self.seed)
+        self.pool = (ProcessPoolExecutor(self.workers)
+                     if self.workers and self.workers > 1 else None)
+        self.n_passes = 0
+        self.timed_out = False
+        self.deadline = (time.monotonic() + self.time_budget
+                         if self.time_budget is not None else None)
         try:
             size = self.size
             if self.examples.n_uniqs == 0:
                 self.results = None
+                if self.prior:
+                    self.results = ResultsSummary([], IDCounter(), [],
+                                                  IDCounter(), [], [], [],
+                                                  extractor=self)
+                    re_freqs = self.merge_prior([])
+                    self.results.remove(self.find_bad_patterns(re_freqs))
                 return
 
             attempt = 1
@@ -542,6 +719,7 @@ class Extractor(object):
                         print('Examples: %s ... %s' % (strings[:5],
                                                        strings[-5:]))
                 self.results = self.batch_extract()
+                self.n_passes = attempt
                 maxN = (None if attempt > size.max_sampled_attempts
                              else size.do_all_exceptions)
                 failex, re_freqs = self.check_fn(self.results.rex, maxN)
@@ -554,6 +732,10 @@ class Extractor(object):
                                                    failex.strings[:5]))
                 if len(failex.strings) == 0:
                     break
+                elif self.out_of_time():
+                    re_freqs = self.add_length_pattern(failex, re_freqs,
+                                                       maxN)
+                    break
                 elif (len(failex.strings) <= size.do_all_exceptions
                       or attempt > size.max_sampled_attempts):
                     if self.verbose:
@@ -576,10 +758,87 @@ class Extractor(object):
                 attempt += 1
 
             self.add_warnings()
+            if self.prior:
+                re_freqs = self.merge_prior(re_freqs)
             self.results.remove(self.find_bad_patterns(re_freqs))
             self.convert_rex_to_dialect()
         finally:
             self.prng_state.restore()
+            if self.pool:
+                self.pool.shutdown()
+            self.pool = None
+
+    def out_of_time(self):
+        """
+        Returns True (and records the fact) if the time budget
+        for extraction has been used up.
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def add_length_pattern(self, failex, re_freqs, maxN):
+        """
+        When extraction has run out of time, add a .{m,n} pattern
+        (or .{m}, if all the lengths are the same), covering the failures
+        (failex) for the results so far, given their frequencies (re_freqs)
+        and maxN, the maximum number of failures that were requested.
+
+        Returns the frequencies for all the patterns, including the new one.
+
+        If failures might have been omitted, all of them are found first.
+        """
+        if maxN is not None and len(failex.strings) >= maxN:
+            failex, re_freqs = self.check_fn(self.results.rex, None)
+            failex = self.clean(failex)
+        lengths = [len(s) for s in failex.strings]
+        vrle = ((self.Cats.Any.code, min(lengths), max(lengths)),)
+        results = self.results
+        results.refined_vrles.append(vrle)
+        results.rex.append(self.vrle2re(vrle, tagged=self.tag))
+        results.refrags.append(self.vrle2refrags(vrle))
+        return list(re_freqs) + [sum(failex.freqs)]
+
+    def check_prior(self):
+        """
+        Check the examples against the prior regular expressions,
+        recording how many match each in self.prior_freqs,
+        so that only those that match none of them are used for extraction.
+
+        With the default check function, the examples are checked
+        (once) here; otherwise, the check function is wrapped so that the
+        prior regular expressions are included (first) in every check.
+        """
+        if self.check_fn == self.check_for_failures:
+            failures, freqs, self.prior_freqs = self.find_non_matches(
+                self.prior)
+            self.all_examples = Examples(failures, freqs)
+        else:
+            check_fn = self.check_fn
+            n = len(self.prior)
+
+            def check_with_prior(rexes, maxN=None):
+                failex, re_freqs = check_fn(self.prior + list(rexes), maxN)
+                self.prior_freqs = re_freqs[:n]
+                return failex, re_freqs[n:]
+
+            self.check_fn = check_with_prior
+
+    def merge_prior(self, re_freqs):
+        """
+        Add the prior regular expressions that matched any examples to
+        the start of the results, and return the frequencies for
+        all the regular expressions in the results, given re_freqs,
+        those for the (new) ones already in the results.
+        """
+        kept = [i for (i, n) in enumerate(self.prior_freqs) if n > 0]
+        results = self.results
+        results.rex = [self.prior[i] for i in kept] + results.rex
+        results.refrags = ([[Fragment(unterminated_re(self.prior[i]), False)]
+                            for i in kept]
+                           + results.refrags)
+        results.refined_vrles = [None] * len(kept) + results.refined_vrles
+        return [self.prior_freqs[i] for i in kept] + list(re_freqs)
 
     def check_for_failures(self, rexes, maxExamples):
         """
@@ -615,6 +874,13 @@ class Extractor(object):
 
 
     def add_warnings(self):
+        if self.timed_out:
+            msg = ('Time budget of %s seconds used up after %d pass%s; '
+                   'results may be incomplete.'
+                   % (self.time_budget, self.n_passes,
+                      'es' if self.n_passes > 1 else ''))
+            self.warnings.append(msg)
+            print('** WARNING: rexpy: %s' % msg, file=sys.stderr)
         if self.n_too_many_groups:
             self.warnings.append('%d string%s assigned to .{m,n} for needing '
                                  '"too many" groups.'
@@ -666,12 +932,20 @@ class Extractor(object):
 
     def batch_extract(self):
         """
-        Find regular expressions for a batch of examples (as given).
+        Find regular expressions for a batch of examples (as given),
+        using the extraction's pool of worker processes, if any.
         """
         examples = self.examples.strings
         freqs = self.examples.freqs
+        return self.batch_extract_inner(examples, freqs, self.pool)
+
+    def batch_extract_inner(self, examples, freqs, pool=None):
+        """
+        Body of batch_extract, using the pool of worker processes
+        provided, if any.
+        """
         # First, run-length encode each (distinct) example
-        rles = [self.run_length_encode_coarse_classes(s) for s in examples]
+        rles = self.run_length_encode_examples(examples, pool)
         rle_freqs = IDCounter()
         example2r_id = ilist([1]) * len(examples)  # same length as rles
         r_id2v_id = {}
@@ -700,13 +974,29 @@ class Extractor(object):
         # and stash that away inside the Examples object.
         for i, r_id in enumerate(example2r_id):
             example2v_id[i] = r_id2v_id[r_id]
+        # Also group the examples by VRLE id, so that each VRLE's
+        # examples can be found without scanning them all.
         self.examples.example2v_id = example2v_id
+        v_id2indexes = defaultdict(list)
+        for i, v_id in enumerate(example2v_id):
+            v_id2indexes[v_id].append(i)
+        self.examples.v_id2indexes = v_id2indexes
 #        self.examples.example2r_id = example2r_id  # probably don't need
 
         # Refine the fragments in the VRLEs
-        for vrle in vrles:
-            grouped = self.refine_fragments(vrle, vrle_freqs.ids[vrle])
-            refined.append(grouped)
+        if pool:
+            items = []
+            for vrle in vrles:
+                v_id = vrle_freqs.ids[vrle]
+                indexes = v_id2indexes[v_id]
+                items.append((vrle, v_id, [examples[i] for i in indexes],
+                              [freqs[i] for i in indexes]))
+            for chunk_refined in self.map_chunks(pool, refine_chunk, items):
+                refined.extend(chunk_refined)
+        else:
+            for vrle in vrles:
+                grouped = self.refine_fragments(vrle, vrle_freqs.ids[vrle])
+                refined.append(grouped)
 
 #        self.examples.rle_freqs = rle_freqs  # probably don't need
         self.examples.vrle_freqs = vrle_freqs
@@ -720,6 +1010,35 @@ class Extractor(object):
                               merged, mergedrex, mergedfrags,
                               extractor=self)
 
+    def map_chunks(self, pool, f, items):
+        """
+        Split items into (contiguous) chunks and call f(worker, chunk)
+        for each in the pool of worker processes, where worker is
+        a copy of this extractor suitable for passing to them.
+
+        Returns a list of the results for the chunks, in order.
+        """
+        n_chunks = self.workers * N_CHUNKS_PER_WORKER
+        chunk_size = max(1, -(-len(items) // n_chunks))  # rounded up
+        chunks = [items[i:i + chunk_size]
+                  for i in range(0, len(items), chunk_size)]
+        worker = self.worker_copy()
+        return list(pool.map(f, [worker] * len(chunks), chunks))
+
+    def worker_copy(self):
+        """
+        Shallow copy of the extractor without the examples, results
+        and check function, which worker processes do not need
+        (and which might not be picklable).
+        """
+        worker = copy.copy(self)
+        for k in ('check_fn', 'all_examples', 'examples', 'results',
+                  'prng_state', 'by_length', 'rle_cache', 'pool'):
+            worker.__dict__.pop(k, None)
+        worker.workers = None
+        worker.n_too_many_groups = 0
+        return worker
+
     def convert_rex_to_dialect(self):
         self.results.convert_to_dialect(self)
 
@@ -734,30 +1053,59 @@ class Extractor(object):
         """
         Classify each character in a string into one of the coarse categories
         """
-        return ''.join(self.coarse_classify_char(c) for c in s)
+        return s.translate(self.coarse_table)
 
     def coarse_classify_char(self, c):
         """
         Classify character into one of the coarse categories
         """
-        Cats = self.Cats
-        for cat in Cats.SpecificCoarseCats:
-            if re.match(cat.re_single, c):
-                return cat.code
-        assert re.match(Cats.Other.re_single, c)
-        return Cats.Other.code
+        return coarse_class_code(self.Cats, c)
 
     def run_length_encode_coarse_classes(self, s):
         """
         Returns run-length encoded coarse classification
         """
+        rle = self.coarse_rle(s)
+        if is_too_many_groups_rle(rle):
+            self.n_too_many_groups += 1
+        return rle
+
+    def coarse_rle(self, s):
+        """
+        Run-length encoded coarse classification, falling back to
+        a single run of CODE.ANY if that would need too many groups.
+        (Unlike run_length_encode_coarse_classes, this does not count
+        the strings that need too many groups.)
+        """
         rle = run_length_encode(self.coarse_classify(s))
         if len(rle) <= MAX_GROUPS:
             return rle
         else:
-            self.n_too_many_groups += 1
             return run_length_encode(CODE.ANY * len(s))
 
+    def run_length_encode_examples(self, strings, pool=None):
+        """
+        Returns the run-length encoded coarse classifications of a batch
+        of strings, in the pool of worker processes provided, if any.
+
+        Encodings are cached, so strings seen in earlier passes
+        are not re-encoded.
+        """
+        cache = self.rle_cache
+        new = [s for s in strings if s not in cache]
+        if new:
+            if pool:
+                encoded = []
+                for chunk_rles in self.map_chunks(pool, rle_chunk, new):
+                    encoded.extend(chunk_rles)
+            else:
+                encoded = [self.coarse_rle(s) for s in new]
+            cache.update(zip(new, encoded))
+        rles = [cache[s] for s in strings]
+        self.n_too_many_groups += sum(1 for rle in rles
+                                      if is_too_many_groups_rle(rle))
+        return rles
+
     def merge_patterns(self, patterns):
         if len(patterns) == 1:
             return patterns
@@ -767,7 +1115,8 @@ class Extractor(object):
                             # as a single part
         n_parts = len(parts)
         DO_ALIGNMENT = True
-        while level < N_ALIGNMENT_LEVELS and DO_ALIGNMENT:
+        while (level < N_ALIGNMENT_LEVELS and DO_ALIGNMENT
+               and not self.out_of_time()):
             parts = self.alignment_step(parts, level)
             if len(parts) == n_parts:  # no change this time; next level
                 level += 1
@@ -959,23 +1308,50 @@ class Extractor(object):
         if not rexes:
             return examples.strings, examples.freqs, []
 
+        strings = examples.strings
+        freqs = examples.freqs
+        N = len(strings)
+        re_freqs = [0] * len(rexes)
+        combined = combined_cre(rexes)
+        if combined is None:
+            return self.find_non_matches_sequentially(rexes)
+        failures = []
+        out_freqs = []
+        match = combined.match
+        for i in range(N):
+            m = match(strings[i])
+            if m:
+                re_freqs[int(m.lastgroup[1:])] += freqs[i]
+            else:
+                failures.append(strings[i])
+                out_freqs.append(freqs[i])
+        return failures, out_freqs, re_freqs
+
+    def find_non_matches_sequentially(self, rexes):
+        """
+        As find_non_matches, but trying each regular expression in turn
+        against all the (still unmatched) examples.
+
+        Used when the regular expressions cannot be combined into
+        a single one.
+        """
+        examples = self.all_examples
         strings = examples.strings
         freqs = examples.freqs
         N = len(strings)
         matched = [False] * N
         nRemaining = N
         re_freqs = [0] * len(rexes)
-        if self.results:
-            for j, r in enumerate(rexes):
-                cr = cre(r)
-                for i in range(N):
-                    if not matched[i]:
-                        if re.match(cr, strings[i]):
-                            matched[i] = True
-                            nRemaining -= 1
-                            re_freqs[j] += freqs[i]
-                            if nRemaining == 0:
-                                return [], [], re_freqs
+        for j, r in enumerate(rexes):
+            cr = cre(r)
+            for i in range(N):
+                if not matched[i]:
+                    if re.match(cr, strings[i]):
+                        matched[i] = True
+                        nRemaining -= 1
+                        re_freqs[j] += freqs[i]
+                        if nRemaining == 0:
+                            return [], [], re_freqs
         indices = [i for i in range(N) if not matched[i]]
         failures = [strings[i] for i in indices]
         out_freqs = [freqs[i] for i in indices]
@@ -1024,29 +1400,28 @@ class Extractor(object):
 
         n_strings = [0] * n_frags
         strings = examples.strings
-        v_ids = examples.example2v_id
         size = self.size
-        for i, example in enumerate(strings):
-            if v_ids[i] == v_id:  # Only need to use examples for this VRLE
-                m = re.match(regex, example)
-                assert m is not None
-                f = group_map_function(m, n_frags)
-                for i, frag in enumerate(vrle):
-                    try:
-                        g = m.group(f(i + 1))
-                    except:
-                        print('>>>', regex.pattern)
-                        print(n_frags, i)
-                        raise
-
-                    if n_strings[i] <= size.max_strings_in_group:
-                        frag_strings[i].add(g)
-                        n_strings[i] = len(frag_strings[i])
-                    frag_chars[i] = frag_chars[i].union(set(list(g)))
-                    (frag_rlefcs[i],
-                     frag_rlecs[i]) = self.rle_fc_c(g, frag,
-                                                     frag_rlefcs[i],
-                                                     frag_rlecs[i])
+        # Only need to use the examples for this VRLE
+        for j in examples.v_id2indexes.get(v_id, ()):
+            m = regex.match(strings[j])
+            assert m is not None
+            f = group_map_function(m, n_frags)
+            for i, frag in enumerate(vrle):
+                try:
+                    g = m.group(f(i + 1))
+                except:
+                    print('>>>', regex.pattern)
+                    print(n_frags, i)
+                    raise
+
+                if n_strings[i] <= size.max_strings_in_group:
+                    frag_strings[i].add(g)
+                    n_strings[i] = len(frag_strings[i])
+                frag_chars[i] = frag_chars[i].union(set(list(g)))
+                (frag_rlefcs[i],
+                 frag_rlecs[i]) = self.rle_fc_c(g, frag,
+                                                 frag_rlefcs[i],
+                                                 frag_rlecs[i])
         if self.verbose >= 2:
             print('Fine Class VRLE:', frag_rlefcs)
             print('      Char VRLE:', frag_rlecs)
@@ -1474,6 +1849,33 @@ class Extractor(object):
         return results, tree
 
 
+def rle_chunk(extractor, strings):
+    """
+    Run-length encode the coarse classifications of strings
+    in a worker process.
+    """
+    return [extractor.coarse_rle(s) for s in strings]
+
+
+def refine_chunk(extractor, items):
+    """
+    Refine the fragments of VRLEs in a worker process.
+
+    items is a list of (vrle, v_id, strings, freqs) tuples, where strings
+    and freqs are the examples (and their frequencies) for that VRLE.
+
+    Returns the list of refined VRLEs.
+    """
+    refined = []
+    for (vrle, v_id, strings, freqs) in items:
+        examples = Examples(strings, freqs)
+        examples.example2v_id = [v_id] * len(strings)
+        examples.v_id2indexes = {v_id: range(len(strings))}
+        extractor.examples = examples
+        refined.append(extractor.refine_fragments(vrle, v_id))
+    return refined
+
+
 def example_check_function(rexes, maxN=None):
     """
     **CHECK FUNCTIONS**
@@ -1550,7 +1952,7 @@ def rex_coverage(patterns, examples, dedup=False):
         p = '%s%s%s' % ('' if p.startswith('^') else '^',
                         p,
                         '' if p.endswith('$') else '$')
-        r = re.compile(p, RE_FLAGS)
+        r = cre(p)
         if dedup:
             strings = examples.strings
             results.append(sum(1 if re.match(r, k) else 0
@@ -1692,19 +2094,20 @@ def rex_incremental_coverage(patterns, examples, sort_on_deduped=False,
 
 
 def coverage_matrices(patterns, examples):
-    # Compute the 2 coverage matrices:
-    #   matrix:  1 row per example, with a count of number of matches
-    #   deduped: 1 row per example, with a boolean where it matches
+    """
+    Compute the 2 coverage matrices, as NumPy arrays:
 
-    matrix = []
-    deduped = []  # deduped version of same
-    rexes = [re.compile(p, RE_FLAGS) for p in patterns]
+      - matrix:  1 row per example, with a count of number of matches
+                 (i.e. the example's frequency, where it matches)
+      - deduped: 1 row per example, with a boolean where it matches
+    """
+    rexes = [cre(p) for p in patterns]
     strings = examples.strings
-    freqs = examples.freqs
-    for (x, n) in zip(strings, freqs):
-        row = [n if re.match(r, x) else 0 for r in rexes]
-        matrix.append(row)
-        deduped.append([1 if r else 0 for r in row])
+    freqs = np.array(examples.freqs, dtype=np.int64)
+    matches = [bool(re.match(r, x)) for x in strings for r in rexes]
+    deduped = np.array(matches, dtype=bool).reshape(len(strings), len(rexes))
+    deduped &= (freqs != 0)[:, np.newaxis]
+    matrix = deduped * freqs[:, np.newaxis]
     return matrix, deduped
 
 
@@ -1717,21 +2120,24 @@ def matrices2incremental_coverage(patterns, matrix, deduped, indexes,
 
     Returns ordered dict, sorted by incremental match rate,
     with number of (previously unaccounted for) strings matched.
+
+    The matrices are normally as returned by coverage_matrices,
+    but may also be lists of lists.
     """
     results = OrderedDict()
-    sort_matrix = deduped if sort_on_deduped else matrix
-    np = len(patterns)
-    zeros = [0] * np
-    strings = examples.strings
-    pattern_freqs = [sum(matrix[i][r] for i, x in enumerate(strings))
-                     for r in range(np)]
-    pattern_uniqs = [sum(deduped[i][r] for i, x in enumerate(strings))
-                     for r in range(np)]
+    n_patterns = len(patterns)
+    n_uniqs = examples.n_uniqs
+    matrix = np.asarray(matrix, dtype=np.int64).reshape(n_uniqs, n_patterns)
+    deduped = np.asarray(deduped, dtype=bool).reshape(n_uniqs, n_patterns)
+    freqs = matrix.max(axis=1) if n_patterns else np.zeros(n_uniqs, np.int64)
+    unmatched = np.ones(n_uniqs, dtype=np.int64)  # 0 once example is matched
+    pattern_freqs = [int(f) for f in freqs.dot(deduped)]
+    pattern_uniqs = [int(f) for f in unmatched.dot(deduped)]
     some_left = True
-    while some_left and len(results) < np:
-        totals = [sum(row[i] for row in matrix) for i in range(np)]
-        uniq_totals = [sum(row[i] for row in deduped) for i in range(np)]
-        M, uM = max(totals), max(uniq_totals)
+    while some_left and len(results) < n_patterns:
+        totals = (unmatched * freqs).dot(deduped)
+        uniq_totals = unmatched.dot(deduped)
+        M, uM = totals.max(), uniq_totals.max()
         if sort_on_deduped:
             sort_totals = uniq_totals
             target = uM
@@ -1740,29 +2146,23 @@ def matrices2incremental_coverage(patterns, matrix, deduped, indexes,
             target = M
 
         if target > 0:
-            # find pattern with frequency of target
-            p = 0  # index of pattern
-            while sort_totals[p] < target:
-                p += 1
+            # find pattern with frequency of target (first, if tied)
+            p = int(np.argmax(sort_totals))
             rex = patterns[p]
 
             in_results = rex in results
             if not in_results:
-                for i in range(examples.n_uniqs):
-                    if matrix[i][p]:
-                        matrix[i] = zeros
-                        deduped[i] = zeros
-                        zeroed = True
+                unmatched[deduped[:, p]] = 0
                 results[rex] = Coverage(n=pattern_freqs[p],
                                         n_uniq=pattern_uniqs[p],
-                                        incr=totals[p],
-                                        incr_uniq=uniq_totals[p],
+                                        incr=int(totals[p]),
+                                        incr_uniq=int(uniq_totals[p]),
                                         index=indexes[p])
         else:
             some_left = False
 
-    if some_left and len(results) < np:
-        for p in range(np):
+    if some_left and len(results) < n_patterns:
+        for p in range(n_patterns):
             rex = patterns[p]
             if rex not in results:
                 results[rex] = Coverage(n=pattern_freqs[p],
@@ -1933,6 +2333,7 @@ class ResultsSummary(object):
         self.rex = rex
         self.refrags = refrags
         self.extractor = extractor
+        self.python_rex = None  # rex before conversion to a dialect
 
     def to_string(self, rles=False, rle_freqs=False, vrles=False,
                   vrle_freqs=False, refined_vrles=False, rex=False,
@@ -2023,13 +2424,18 @@ class ResultsSummary(object):
             self.rex.append(x.vrle2re(dot_star, tagged=x.tag))
 
     def convert_to_dialect(self, x):
+        self.python_rex = self.rex
         if not x.dialect:
             return          # No dialect set, so nothing to do
+        # Prior regular expressions have no refined_vrle (None), and are
+        # left as they are.
         self.rex = [x.vrle2re(m, tagged=x.tag, output=True)
-                        for m in self.refined_vrles]
+                        if m is not None else r
+                    for (m, r) in zip(self.refined_vrles, self.rex)]
 
         self.refrags = [x.vrle2refrags(m, output=True)
-                        for m in self.refined_vrles]
+                            if m is not None else f
+                        for (m, f) in zip(self.refined_vrles, self.refrags)]
 
     def __str__(self):
         return self.to_string()
@@ -2059,7 +2465,8 @@ def extract(examples, tag=False, encoding=None, as_object=False,
             max_patterns=MAX_PATTERNS,
             min_diff_strings_per_pattern=MIN_DIFF_STRINGS_PER_PATTERN,
             min_strings_per_pattern=MIN_STRINGS_PER_PATTERN, size=None,
-            seed=None, dialect=DEFAULT_DIALECT, verbose=VERBOSITY):
+            seed=None, dialect=DEFAULT_DIALECT, workers=None, prior=None,
+            cache=None, time_budget=None, shared=None, verbose=VERBOSITY):
     """
     Extract regular expression(s) from examples and return them.
 
@@ -2072,23 +2479,101 @@ def extract(examples, tag=False, encoding=None, as_object=False,
     If as_object is set, the extractor object is returned,
     with results in .results.rex; otherwise, a list of regular
     expressions, as unicode strings is returned.
+
+    If workers is more than 1, a pool of that many processes is used
+    for parts of the extraction (see Extractor).
+
+    If prior is a list of regular expressions (e.g. previously extracted
+    from an earlier version of the data), only the examples that don't
+    match any of them are used for extraction, and the results start
+    with the prior regular expressions that match any examples
+    (see Extractor).
+
+    If cache is set, the results are saved in (and, for the same distinct
+    examples, frequencies and parameters, reused from) a persistent
+    cache. It can be True (for the default cache), the path of the
+    directory to use, or a RexpyCache object. If it is None, the cache
+    specified by the TDDA_REXPY_CACHE environment variable, if any,
+    is used. (See tdda.rexpy.cache.) The cache is not used if as_object
+    is set or examples is a function.
+
+    If time_budget is a number of seconds, extraction stops once it
+    has taken that long, returning the patterns found so far (see
+    Extractor). Such results are not saved in the cache.
+
+    shared is a dictionary for reusing work between extractions
+    (see Extractor).
     """
     if encoding and not callable(examples):
         if isinstance(examples, dict):
             examples ={x.decode(encoding): n for (x, n) in examples.items()}
         else:
             examples = [x.decode(encoding) for x in examples]
+    rex_cache = None if as_object else get_rexpy_cache(cache)
+    key = None
+    if rex_cache and not callable(examples):
+        counts = (examples if isinstance(examples, dict)
+                  else Counter(examples))
+        params = cache_params(
+            tag=tag, extra_letters=extra_letters, full_escape=full_escape,
+            remove_empties=remove_empties, strip=strip,
+            variableLengthFrags=variableLengthFrags,
+            max_patterns=max_patterns,
+            min_diff_strings_per_pattern=min_diff_strings_per_pattern,
+            min_strings_per_pattern=min_strings_per_pattern,
+            size=size, seed=seed, dialect=dialect, prior=prior)
+        key = rex_cache.key(counts.items(), params)
+        patterns = rex_cache.get(key) if key else None
+        if patterns is not None:
+            return patterns
     r = Extractor(examples, tag=tag, extra_letters=extra_letters,
                   full_escape=full_escape, remove_empties=remove_empties,
                   strip=strip, variableLengthFrags=variableLengthFrags,
                   max_patterns = max_patterns,
                   min_diff_strings_per_pattern = min_diff_strings_per_pattern,
                   min_strings_per_pattern = min_strings_per_pattern,
-                  size=size, seed=seed, dialect=dialect, verbose=verbose)
-    return r if as_object else r.results.rex if r.results else []
+                  size=size, seed=seed, dialect=dialect, workers=workers,
+                  prior=prior, time_budget=time_budget, shared=shared,
+                  verbose=verbose)
+    if as_object:
+        return r
+    patterns = r.results.rex if r.results else []
+    if key and not r.timed_out:
+        rex_cache.put(key, patterns)
+    return patterns
+
+
+def cache_params(size=None, entry_point='extract', **kwargs):
+    """
+    Returns the dictionary of extraction parameters used (with the distinct
+    examples and their frequencies) as the key for a persistent cache
+    of results, given the (relevant) keyword arguments to extract.
+
+    entry_point is the name of the function doing the extraction
+    (extract or pdextract), since they extract in different ways.
+    """
+    params = {
+        'entry_point': entry_point,
+        'tag': False,
+        'extra_letters': None,
+        'full_escape': False,
+        'remove_empties': False,
+        'strip': False,
+        'variableLengthFrags': VARIABLE_LENGTH_FRAGS,
+        'max_patterns': MAX_PATTERNS,
+        'min_diff_strings_per_pattern': MIN_DIFF_STRINGS_PER_PATTERN,
+        'min_strings_per_pattern': MIN_STRINGS_PER_PATTERN,
+        'seed': None,
+        'dialect': DEFAULT_DIALECT,
+        'prior': None,
+    }
+    params.update(kwargs)
+    params['size'] = vars(size or Size())
+    return params
 
 
-def pdextract(cols, seed=None):
+def pdextract(cols, seed=None, workers=None, prior=None, cache=None,
+              time_budget=None):
     """
     Extract regular expression(s) from the Pandas column (``Series``) object
     or list of Pandas columns given.
@@ -2115,19 +2600,209 @@ def pdextract(cols, seed=None):
         re5   = '^[a-z]{3}$'
         re345 = '^[a-z]{3}$'
 
+    If workers is more than 1, a pool of that many processes is used
+    for parts of the extraction (see Extractor).
+
+    If prior is a list of regular expressions, extraction starts
+    from those (see extract).
+
+    If cache is set, a persistent cache of results is used (see extract).
+
+    If time_budget is a number of seconds, extraction stops once it
+    has taken that long (see extract).
     """
     if type(cols) not in (list, tuple):
         cols = [cols]
-    strings = []
+    counts = series_value_counts(cols)
+    if not all(type(s) == str_type for s in counts.index):
+        raise ValueError('Non-null, non-string values found in input.')
+    rex_cache = get_rexpy_cache(cache)
+    key = None
+    if rex_cache:
+        key = rex_cache.key(counts.items(),
+                            cache_params(entry_point='pdextract', seed=seed,
+                                         prior=prior))
+        patterns = rex_cache.get(key) if key else None
+        if patterns is not None:
+            return patterns
+    check_fn = SeriesCheckFunction(counts)
+    r = extract(check_fn, seed=seed, workers=workers, prior=prior,
+                time_budget=time_budget, as_object=True)
+    patterns = r.results.rex if r.results else []
+    if key and not r.timed_out:
+        rex_cache.put(key, patterns)
+    return patterns
+
+
+def extract_columns(columns, workers=None, **kwargs):
+    """
+    Extract regular expressions for each of several columns,
+    returning a dictionary of lists of regular expressions, keyed on
+    column name, identical to those from separate extractions.
+
+    columns can be a dictionary, keyed on column name, or a list of
+    (name, values) pairs, or a Pandas DataFrame (in which case all of its
+    columns are used). Each column's values can be a list of strings
+    (as for extract), or a Pandas Series (as for pdextract).
+
+    Work is shared between the columns: columns with the same values
+    (and frequencies) are only extracted once, and strings are only
+    classified and run-length encoded once, however many columns they
+    are in.
+
+    If workers is more than 1, the columns are divided between a pool
+    of that many worker processes. (Work is then only shared between
+    the columns handled by the same process.)
+
+    Other keyword arguments are passed to extract; as_object and
+    encoding are not supported.
+    """
+    if hasattr(columns, 'items'):
+        columns = list(columns.items())
+    groups = OrderedDict()      # column names, by (kind, counts)
+    data = {}
+    for name, values in columns:
+        if hasattr(values, 'value_counts'):
+            counts = series_value_counts([values])
+            if not all(type(s) == str_type for s in counts.index):
+                raise ValueError('Non-null, non-string values found in '
+                                 'column %s.' % name)
+            key = ('series', tuple(counts.items()))
+            values = counts
+        else:
+            key = ('list', tuple(Counter(values).items()))
+        if key not in groups:
+            groups[key] = []
+            data[key] = (key[0], values)
+        groups[key].append(name)
+
+    items = [data[key] for key in groups]
+    if workers and workers > 1 and len(items) > 1:
+        n_chunks = workers * N_CHUNKS_PER_WORKER
+        chunk_size = max(1, -(-len(items) // n_chunks))  # rounded up
+        chunks = [items[i:i + chunk_size]
+                  for i in range(0, len(items), chunk_size)]
+        with ProcessPoolExecutor(workers) as pool:
+            results = []
+            for chunk_results in pool.map(extract_columns_chunk, chunks,
+                                          [kwargs] * len(chunks)):
+                results.extend(chunk_results)
+    else:
+        results = extract_columns_chunk(items, kwargs)
+    return {name: list(patterns)
+            for (names, patterns) in zip(groups.values(), results)
+            for name in names}
+
+
+def extract_columns_chunk(items, kwargs):
+    """
+    Extract regular expressions for each of a list of columns,
+    given as (kind, values) pairs, where kind is 'series'
+    (for value counts from series_value_counts) or 'list'
+    (for a list of strings), sharing the classifications and
+    run-length encodings of strings between them.
+
+    Returns a list of the lists of regular expressions for the columns.
+    """
+    shared = {}
+    results = []
+    for (kind, values) in items:
+        if kind == 'series':
+            values = SeriesCheckFunction(values)
+        results.append(extract(values, shared=shared, **kwargs))
+    return results
+
+
+def series_value_counts(cols):
+    """
+    Returns a Series of the frequencies of the distinct non-null values
+    in the (Pandas) columns given, indexed on the values, in the order in
+    which they first occur.
+
+    Categorical columns are counted using their categories and codes.
+    """
+    import pandas as pd
+    counts = []
     for c in cols:
-        strings.extend(list(c.dropna().unique()))
-    try:
-        return extract(strings, seed=seed)
-    except:
-        if not all(type(s) == str_type for s in strings):
-            raise ValueError('Non-null, non-string values found in input.')
+        if isinstance(c.dtype, pd.CategoricalDtype):
+            codes = c.cat.codes.to_numpy()
+            order = pd.unique(codes[codes >= 0])
+            vc = c.value_counts(sort=False)
+            vc = vc.reindex(c.cat.categories[order])
         else:
-            raise
+            vc = c.value_counts(sort=False)
+        vc.index = vc.index.astype(object)
+        counts.append(vc)
+    if len(counts) == 1:
+        return counts[0]
+    elif not counts:
+        return pd.Series([], dtype=np.int64)
+    return pd.concat(counts).groupby(level=0, sort=False).sum()
+
+
+class SeriesCheckFunction(object):
+    """
+    Check function (see example_check_function) for distinct strings
+    and their frequencies held in a Pandas Series of counts indexed on the
+    strings (as from value_counts()).
+
+    Each distinct string is matched once against the regular expressions
+    combined into one (see combined_cre), which gives the index of the
+    first that it matches; the frequencies matched by each are then
+    totalled with NumPy. If they can't be combined, Series.str.match is
+    used with each in turn, over the strings not matched by earlier ones.
+
+    When more than maxN strings fail to match, a random sample
+    of them is returned, as for Extractor.sample_non_matches.
+    """
+    def __init__(self, counts, size=None):
+        self.strings = counts.index.to_series().reset_index(drop=True)
+        self.counts = counts.to_numpy()
+        self.size = size or Size()
+
+    def __call__(self, rexes, maxN=None):
+        if rexes:
+            matches = self.first_matches(rexes)
+            unmatched = matches < 0
+            re_freqs = np.bincount(matches[~unmatched],
+                                   weights=self.counts[~unmatched],
+                                   minlength=len(rexes))
+            re_freqs = [int(n) for n in re_freqs]
+        else:
+            unmatched = np.ones(len(self.strings), dtype=bool)
+            re_freqs = []
+        failures = self.strings[unmatched].tolist()
+        freqs = self.counts[unmatched].tolist()
+        if maxN is not None and len(failures) > maxN:
+            n = len(failures)
+            if n > self.size.do_all_exceptions:
+                z = list(zip(failures, freqs))
+                sampled = random.sample(z, self.size.do_all_exceptions)
+                failures = [s[0] for s in sampled]
+                freqs = [s[1] for s in sampled]
+        return Examples(failures, freqs), re_freqs
+
+    def first_matches(self, rexes):
+        """
+        Returns an array of the index of the first regular expression
+        that each string matches, or -1 if it matches none of them.
+        """
+        n = len(self.strings)
+        combined = combined_cre(rexes)
+        if combined is not None:
+            def first(m):
+                return int(m.lastgroup[1:]) if m else -1
+            return np.fromiter(map(first, map(combined.match, self.strings)),
+                               dtype=np.int64, count=n)
+        matches = np.full(n, -1, dtype=np.int64)
+        for j, r in enumerate(rexes):
+            indexes = np.flatnonzero(matches < 0)
+            if len(indexes) == 0:
+                break
+            remaining = self.strings.iloc[indexes]
+            matched = remaining.str.match(r, flags=RE_FLAGS).to_numpy(bool)
+            matches[indexes[matched]] = j
+        return matches
 
 
 def get_omnipresent_at_pos(fragFreqCounters, n, **kwargs):
@@ -2278,13 +2953,191 @@ def length_stats(patterns):
     return LS(all(L == L0 for L in lengths), max(lengths) if lengths else 0)
 
 
-def get_nCalls():
-    global nCalls
-    return nCalls
+class StreamedExamples(object):
+    """
+    Examples read, line by line, from a file or other iterable of lines,
+    without holding them all in memory.
+
+    The lines are counted as they are read, so that only distinct strings
+    (and their frequencies) are kept. If the number of distinct strings
+    exceeds max_distinct, the strings read so far, and all subsequent
+    lines, are instead written to a temporary spill file, and only a
+    reservoir sample of (up to) size.n_per_length strings of each length
+    is kept in memory.
+
+    Once spilled, the object is a check function (as defined by
+    example_check_function), so can be passed to Extractor in place
+    of the examples. The initial examples are the sampled strings,
+    and the checks for non-matches in later passes are made against
+    all the strings in the spill file. In this case, failures are also
+    only counted exactly up to max_distinct distinct strings, beyond
+    which they too are sampled, so not all failures are necessarily
+    returned, even if maxN is None.
+
+    If the strings have not been spilled, self.counter contains them,
+    with their frequencies, and should be used directly as the examples.
+    """
+    def __init__(self, lines, max_distinct=MAX_DISTINCT_IN_MEMORY,
+                 size=None, seed=None, spill_dir=None):
+        self.max_distinct = max_distinct
+        self.size = size or Size()
+        self.random = random.Random(seed)
+        self.spill_dir = spill_dir
+        self.counter = Counter()
+        self.spill_path = None
+        self.n_lines = 0
+        self.read(lines)
+
+    @property
+    def spilled(self):
+        return self.spill_path is not None
+
+    def read(self, lines):
+        counter = self.counter
+        spill = None
+        try:
+            for s in lines:
+                self.n_lines += 1
+                if spill:
+                    spill.write('1\t%s\n' % s)
+                    self.add_to_sample(self.samples, self.seen, s)
+                else:
+                    counter[s] += 1
+                    if len(counter) > self.max_distinct:
+                        spill = self.start_spilling()
+        finally:
+            if spill:
+                spill.close()
+
+    def start_spilling(self):
+        """
+        Write out the strings counted so far to a new spill file
+        (returned, still open, for writing), sample them, and
+        stop counting.
+        """
+        fd, self.spill_path = tempfile.mkstemp(prefix='rexpy-',
+                                               suffix='.spill',
+                                               dir=self.spill_dir)
+        spill = os.fdopen(fd, 'w', encoding='UTF-8', newline='\n')
+        self.samples = defaultdict(list)
+        self.seen = Counter()
+        for s, n in self.counter.items():
+            spill.write('%d\t%s\n' % (n, s))
+            self.add_to_sample(self.samples, self.seen, s)
+        self.counter = Counter()
+        return spill
+
+    def add_to_sample(self, samples, seen, s):
+        """
+        Reservoir sampling of the strings of each length.
+        """
+        L = len(s)
+        seen[L] += 1
+        sample = samples[L]
+        if len(sample) < self.size.n_per_length:
+            sample.append(s)
+        else:
+            j = self.random.randrange(seen[L])
+            if j < len(sample):
+                sample[j] = s
+
+    def items(self):
+        """
+        Generates all (distinct) strings with their frequencies, except
+        that, once spilled, strings can be repeated (with their
+        frequencies split between the repeats).
+        """
+        if not self.spilled:
+            for item in self.counter.items():
+                yield item
+        else:
+            with open(self.spill_path, encoding='UTF-8', newline='\n') as f:
+                for line in f:
+                    n, s = line[:-1].split('\t', 1)
+                    yield s, int(n)
+
+    def __call__(self, rexes, maxN=None):
+        if not rexes:
+            failex = (sampled_examples(self.samples) if self.spilled
+                      else Examples(list(self.counter.keys()),
+                                    ilist(self.counter.values())))
+            return self.limit(failex, maxN), []
+
+        combined = combined_cre(rexes)
+        if combined is None:
+            compiled = [cre(r) for r in rexes]
+        re_freqs = [0] * len(rexes)
+        failures = Counter()
+        samples = defaultdict(list)
+        seen = Counter()
+        for s, n in self.items():
+            if combined is not None:
+                m = combined.match(s)
+                j = int(m.lastgroup[1:]) if m else None
+            else:
+                j = next((j for j, cr in enumerate(compiled) if cr.match(s)),
+                         None)
+            if j is not None:
+                re_freqs[j] += n
+            elif s in failures or len(failures) < self.max_distinct:
+                failures[s] += n
+            else:
+                self.add_to_sample(samples, seen, s)
+        failex = Examples(list(failures.keys()), ilist(failures.values()))
+        if samples:
+            extra = sampled_examples(samples)
+            failex.strings.extend(extra.strings)
+            failex.freqs.extend(extra.freqs)
+            failex.update()
+        return self.limit(failex, maxN), re_freqs
+
+    def limit(self, examples, maxN):
+        """
+        Sample examples down to size.do_all_exceptions if there are more
+        than maxN of them (and more than that), as
+        Extractor.sample_non_matches does.
+        """
+        n = examples.n_uniqs
+        if maxN is None or n <= maxN or n <= self.size.do_all_exceptions:
+            return examples
+        indices = self.random.sample(range(n), self.size.do_all_exceptions)
+        return Examples([examples.strings[i] for i in indices],
+                        [examples.freqs[i] for i in indices])
+
+    def close(self):
+        """
+        Remove the spill file, if there is one.
+        """
+        if self.spill_path:
+            os.remove(self.spill_path)
+            self.spill_path = None
+
+
+def sampled_examples(samples):
+    """
+    Examples from reservoir samples of strings, keyed on length.
+    Strings sampled more than once are given the number of times
+    they were sampled as their frequencies.
+    """
+    counter = Counter()
+    for L in sorted(samples):
+        counter.update(samples[L])
+    return Examples(list(counter.keys()), ilist(counter.values()))
+
+
+def read_lines(f, strip=False):
+    """
+    Generate the lines of (text or binary) file f, decoding bytes as UTF-8
+    and removing line endings (or all surrounding whitespace, if strip is set).
+    """
+    for line in f:
+        if type(line) == bytes_type:
+            line = line.decode('UTF-8')
+        yield line.strip() if strip else line.rstrip('\r\n')
 
 
 def rexpy_streams(in_path=None, out_path=None, skip_header=False,
-                  quote=False, **kwargs):
+                  quote=False, max_distinct=MAX_DISTINCT_IN_MEMORY, **kwargs):
     """
     in_path is
         None:             to read inputs from stdin
@@ -2295,30 +3148,39 @@ def rexpy_streams(in_path=None, out_path=None, skip_header=False,
         None:             to write outputs to stdout
         path to file:     to write outputs from file at out_path
         False:            to return the strings as a list
+
+    Inputs read from stdin or a file are streamed (see StreamedExamples),
+    keeping at most max_distinct distinct strings in memory.
     """
     verbose = kwargs.get('verbose', 0)
     if type(in_path) in (list, tuple):
-        strings = in_path
-    elif in_path:
-        if verbose:
-            print('Reading file %s.' % in_path)
-        with open(in_path) as f:
-            strings = f.read().splitlines()
-        if verbose:
-            print('Read file %s' % in_path)
+        strings = in_path[1:] if skip_header else in_path
     else:
+        f = open(in_path) if in_path else sys.stdin
         if verbose:
-            print('Ingesting strings')
-        strings = [s.strip() for s in sys.stdin.readlines()]
-        if strings and type(strings[0]) == bytes_type:
-            strings = [s.decode('UTF-8') for s in strings]
+            print('Reading %s.' % (('file %s' % in_path) if in_path
+                                   else 'standard input'))
+        lines = read_lines(f, strip=not in_path)
+        if skip_header:
+            next(lines, None)
+        streamed = StreamedExamples(lines, max_distinct=max_distinct,
+                                    size=kwargs.get('size'),
+                                    seed=kwargs.get('seed'))
+        if in_path:
+            f.close()
         if verbose:
-            print('Ingested strings.')
-    if skip_header:
-        strings = strings[1:]
+            print('Read %d lines%s.'
+                  % (streamed.n_lines,
+                     ' (spilled to %s)' % streamed.spill_path
+                     if streamed.spilled else ''))
+        strings = streamed if streamed.spilled else streamed.counter
     if verbose:
         print('Extracting strings')
-    patterns = extract(strings, **kwargs)
+    try:
+        patterns = extract(strings, **kwargs)
+    finally:
+        if isinstance(strings, StreamedExamples):
+            strings.close()
     if verbose:
          print('Extracted strings')
     if quote:
@@ -2338,6 +3200,164 @@ def rexpy_streams(in_path=None, out_path=None, skip_header=False,
             print(p)
 
 
+def rexpy_summary(examples, **kwargs):
+    """
+    Extract regular expressions from examples (as for extract), returning
+    a dictionary with the regular expressions (patterns), the number of
+    strings each matches (coverage, counting each string only for the
+    first pattern that matches it), the number of strings matched by
+    none of them (n_unmatched), and the time taken to extract them,
+    in seconds.
+
+    Coverage is calculated with the (Python) regular expressions from
+    before their conversion to any other dialect requested.
+    """
+    start = time.perf_counter()
+    x = extract(examples, as_object=True, **kwargs)
+    elapsed = time.perf_counter() - start
+    rexes = x.results.rex if x.results else []
+    python_rexes = (x.results.python_rex if x.results
+                    and x.results.python_rex is not None else rexes)
+    failures, freqs = x.check_fn(python_rexes, None)
+    return {
+        'patterns': rexes,
+        'coverage': [int(n) for n in freqs],
+        'n_unmatched': int(sum(failures.freqs)),
+        'seconds': elapsed,
+    }
+
+
+def rexpy_file_summary(path, skip_header=False,
+                       max_distinct=MAX_DISTINCT_IN_MEMORY, **kwargs):
+    """
+    Summary (see rexpy_summary) of the regular expressions for the
+    strings in the file given, one per line, also including the file's
+    path (input) and the numbers of strings and distinct strings.
+    """
+    with open(path) as f:
+        lines = read_lines(f)
+        if skip_header:
+            next(lines, None)
+        streamed = StreamedExamples(lines, max_distinct=max_distinct,
+                                    size=kwargs.get('size'),
+                                    seed=kwargs.get('seed'))
+    try:
+        summary = {
+            'input': path,
+            'n_strings': streamed.n_lines,
+            'n_distinct': (None if streamed.spilled
+                           else len(streamed.counter)),
+        }
+        summary.update(rexpy_summary(streamed if streamed.spilled
+                                     else streamed.counter, **kwargs))
+    finally:
+        streamed.close()
+    return summary
+
+
+def rexpy_column_summary(path, column, counts, **kwargs):
+    """
+    Summary (see rexpy_summary) of the regular expressions for a column,
+    given the counts of its distinct values (from series_value_counts),
+    also including the path of the table (input), the column name,
+    and the numbers of strings and distinct strings.
+    """
+    summary = {
+        'input': path,
+        'column': column,
+        'n_strings': int(counts.sum()),
+        'n_distinct': len(counts),
+    }
+    summary.update(rexpy_summary(SeriesCheckFunction(counts), **kwargs))
+    return summary
+
+
+def select_columns(names, selectors):
+    """
+    Returns the names matching any of the selectors (shell-style
+    wildcard patterns), in their original order.
+
+    Raises ValueError if any selector matches no names.
+    """
+    for selector in selectors:
+        if not fnmatch.filter(names, selector):
+            raise ValueError('No column matches %s.' % selector)
+    return [name for name in names
+            if any(fnmatch.fnmatchcase(name, sel) for sel in selectors)]
+
+
+def read_table_columns(path, selectors):
+    """
+    Generate (name, counts) for the columns selected from the CSV or
+    parquet file at path, where counts are the counts of the distinct
+    (non-null) values in the column, as strings.
+    """
+    import pandas as pd
+    if path.lower().endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, dtype=str)
+    for name in select_columns([str(c) for c in df.columns], selectors):
+        col = df[name]
+        if not all(type(v) == str_type for v in col.dropna()):
+            col = col.dropna().astype(str)
+        yield name, series_value_counts([col])
+
+
+def rexpy_many(in_paths, out_path=None, columns=None, jobs=None,
+               skip_header=False, quote=False,
+               max_distinct=MAX_DISTINCT_IN_MEMORY, **kwargs):
+    """
+    Find regular expressions separately for each of several files
+    (in_paths), or, if columns (a list of column selectors) is provided,
+    for each of the selected columns of a single CSV or parquet file.
+
+    If jobs is more than 1, a pool of that many processes is used.
+
+    Each result is a dictionary (see rexpy_file_summary and
+    rexpy_column_summary), written as a line of JSON to out_path,
+    or to stdout, if out_path is None. The list of results is returned.
+
+    (Regular expressions are never quoted, so quote is ignored.)
+    """
+    if columns:
+        if len(in_paths) != 1:
+            raise ValueError('A single table file is needed with columns.')
+        path = in_paths[0]
+        tasks = [(rexpy_column_summary, (path, name, counts),
+                  kwargs)
+                 for (name, counts) in read_table_columns(path, columns)]
+    else:
+        file_kwargs = dict(kwargs, skip_header=skip_header,
+                           max_distinct=max_distinct)
+        tasks = [(rexpy_file_summary, (path,), file_kwargs)
+                 for path in in_paths]
+    out = open(out_path, 'w') if out_path else sys.stdout
+    pool = ProcessPoolExecutor(jobs) if jobs and jobs > 1 else None
+    try:
+        results = (pool.map(run_task, tasks) if pool
+                   else (run_task(task) for task in tasks))
+        summaries = []
+        for summary in results:
+            out.write(json.dumps(summary) + '\n')
+            out.flush()
+            summaries.append(summary)
+    finally:
+        if pool:
+            pool.shutdown()
+        if out_path:
+            out.close()
+    return summaries
+
+
+def run_task(task):
+    """
+    Call f(*args, **kwargs), given task as (f, args, kwargs).
+    """
+    f, args, kwargs = task
+    return f(*args, **kwargs)
+
+
 def get_params(args):
     params = {
         'in_path': '',
@@ -2348,7 +3368,10 @@ def get_params(args):
         'quote': False,
         'verbose': 0,
         'variableLengthFrags': False,
+        'max_distinct': MAX_DISTINCT_IN_MEMORY,
     }
+    paths = []
+    args = iter(args)
     for a in args:
         if a.startswith('-'):
             if a == '-':
@@ -2376,6 +3399,24 @@ def get_params(args):
                 params['variableLengthFrags'] = True
             elif a in ('-flf', '--fixed'):
                 params['variableLengthFrags'] = False
+            elif a == '--max-distinct':
+                try:
+                    params['max_distinct'] = int(next(args))
+                except (StopIteration, ValueError):
+                    raise Exception(USAGE)
+            elif a == '--files':
+                params['files'] = True
+            elif a == '--columns':
+                try:
+                    selectors = next(args).split(',')
+                except StopIteration:
+                    raise Exception(USAGE)
+                params['columns'] = params.get('columns', []) + selectors
+            elif a == '--jobs':
+                try:
+                    params['jobs'] = int(next(args))
+                except (StopIteration, ValueError):
+                    raise Exception(USAGE)
             elif a.startswith('--') and a[2:] in DIALECTS:
                 params['dialect'] = a[2:]
             elif a in ('-?', '--help'):
@@ -2383,13 +3424,27 @@ def get_params(args):
                 sys.exit(0)
             else:
                 raise Exception(USAGE)
-        elif params['in_path'] == '':  # not previously set and not '-'
-            params['in_path'] = a
-        elif params['out_path'] is None:
-            params['out_path'] = a
         else:
+            paths.append(a)
+    if params.pop('files', False):
+        if not paths or 'columns' in params:
+            raise Exception(USAGE)
+        del params['in_path']
+        params['in_paths'] = paths
+    else:
+        if paths and params['in_path'] == '':  # not set and not '-'
+            params['in_path'] = paths.pop(0)
+        if paths:
+            params['out_path'] = paths.pop(0)
+        if paths:
+            raise Exception(USAGE)
+        params['in_path'] = params['in_path']  or None  # replace '' with None
+        if 'columns' in params:
+            if params['in_path'] is None:
+                raise Exception(USAGE)
+            params['in_paths'] = [params.pop('in_path')]
+        elif 'jobs' in params:
             raise Exception(USAGE)
-    params['in_path'] = params['in_path']  or None  # replace '' with None
     extras = params['extra_letters']
     if extras:
         params['extra_letters'] =  ''.join(sorted([c for c in extras]))
@@ -2564,7 +3619,10 @@ def usage_error():
 
 def main():
     params = get_params(sys.argv[1:])
-    rexpy_streams(**params)
+    if 'in_paths' in params:
+        rexpy_many(**params)
+    else:
+        rexpy_streams(**params)
 
 if __name__ == '__main__':
     main()
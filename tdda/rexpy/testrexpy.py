@@ -208,7 +208,7 @@ import random
 import sys
 import unittest
 
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 
 try:
     import pandas
@@ -226,7 +226,7 @@ except ImportError:
     regex = None
 
 from tdda.rexpy import *
-from tdda.rexpy.rexpy import Coverage, Examples
+from tdda.rexpy.rexpy import Coverage, Examples, Fragment
 
 # does re escape all punctuation, or only special ones?
 re_escape_more = re.escape('%') != '%'
@@ -236,6 +236,24 @@ UNDERSCORE = re.escape('_')
 
 
 class TestUtilityFunctions(ReferenceTestCase):
+    def test_regex_cache(self):
+        from tdda.utils import RegexCache, regex_cache
+        cache = RegexCache(maxsize=2)
+        a = cache.compile('a+')
+        self.assertIs(cache.compile('a+'), a)
+        self.assertIsNot(cache.compile('a+', RE_FLAGS), a)  # flags in key
+        cache.compile('b+')  # evicts 'a+' (least recently used)
+        cache.compile('a+')  # recompiled
+        self.assertEqual((cache.hits, cache.misses, cache.evictions),
+                         (1, 4, 2))
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertGreaterEqual(cache.compile_time, 0.0)
+        self.assertRaises(Exception, cache.compile, '(')
+
+        hits = regex_cache.hits
+        self.assertIs(cre('^[0-9]+$'), cre('^[0-9]+$'))
+        self.assertGreater(regex_cache.hits, hits)
+
     def test_signature(self):
         self.assertEqual(signature([]), '')
 
@@ -540,6 +558,19 @@ class TestHelperMethods(ReferenceTestCase):
                           ('C', 2), ('*', 1), ('.', 1),
                           ('C', 5)))
 
+    def test_run_length_encode_examples(self):
+        x = Extractor([])
+        strings = ['255-SI-32', '(0131) 123 4567', 'é\a-', '', 'a-' * 60]
+        expected = [x.coarse_rle(s) for s in strings]
+        self.assertEqual(x.run_length_encode_examples(strings), expected)
+        self.assertEqual(x.n_too_many_groups, 1)
+        self.assertEqual(expected[-1], (('?', 120),))
+        self.assertEqual(set(x.rle_cache), set(strings))
+
+        x.rle_cache['255-SI-32'] = 'cached'
+        self.assertEqual(x.run_length_encode_examples(['255-SI-32']),
+                         ['cached'])
+
     def test_cleaning(self):
         examples = ['123-AB-321', ' 123-AB-321', '', None, '321-BA-123 ']
         keys = ['123-AB-321', '321-BA-123']
@@ -1570,8 +1601,8 @@ class TestExtraction(ReferenceTestCase):
              [0, 1],   # a 1 is instance of H only
              [0, 1],   # 2-B is instance of H only
         ]
-        self.assertEqual(matrix, EXPECTED_MATRIX)
-        self.assertEqual(deduped, EXPECTED_DEDUPED)
+        self.assertEqual(matrix.tolist(), EXPECTED_MATRIX)
+        self.assertEqual(deduped.astype(int).tolist(), EXPECTED_DEDUPED)
 
         # Second component of rex_full-incremental_coverage:
         cov = matrices2incremental_coverage(patterns, matrix, deduped, indexes,
@@ -1582,6 +1613,12 @@ class TestExtraction(ReferenceTestCase):
         ])
         self.assertEqual(cov, EXPECTED_COVERAGE)
 
+        # Lists of lists are also accepted
+        cov = matrices2incremental_coverage(patterns, EXPECTED_MATRIX,
+                                            EXPECTED_DEDUPED, indexes,
+                                            x.examples, sort_on_deduped=False)
+        self.assertEqual(cov, EXPECTED_COVERAGE)
+
     def test_urls2_grouped(self):
 
 #        print()
@@ -1821,6 +1858,28 @@ class TestExtraction(ReferenceTestCase):
         self.assertRaisesRegex(ValueError, 'Non-null, non-string',
                                pdextract, df['ab'])
 
+    @unittest.skipIf(pandas is None, 'No pandas here')
+    def testpdextract_frequencies(self):
+        df = pd.DataFrame({'a': ['one', 'two', np.nan, 'one', 'one'],
+                           'b': ['one', 'three', 'three', 'four', None]})
+        df['c'] = df['a'].astype('category')
+        counts = series_value_counts([df['a'], df['b']])
+        self.assertEqual(list(counts.index), ['one', 'two', 'three', 'four'])
+        self.assertEqual(list(counts), [4, 1, 2, 1])
+        counts = series_value_counts([df['c']])
+        self.assertEqual(list(counts.index), ['one', 'two'])
+        self.assertEqual(list(counts), [3, 1])
+
+        check = SeriesCheckFunction(series_value_counts([df['a'], df['b']]))
+        failures, re_freqs = check(['^t.*$', '^[a-z]{3}$'])
+        self.assertEqual(failures.strings, ['four'])
+        self.assertEqual(re_freqs, [3, 4])
+        failures, re_freqs = check(['(?i)^T.*$', '^[a-z]{3}$'])
+        self.assertEqual(re_freqs, [3, 4])
+
+        self.assertEqual(pdextract(df['c']), ['^[a-z]{3}$'])
+        self.assertEqual(pdextract([df['a'], df['b']]), ['^[a-z]{3,5}$'])
+
     def testRexpyCommandLineAPIQuoting(self):
         inputs = ['EH12 3LH', 'AL64 1BB']
         self.assertEqual(rexpy_streams(inputs, out_path=False, dialect='perl'),
@@ -1856,6 +1915,282 @@ class TestExtraction(ReferenceTestCase):
         r = extract(inputs, min_strings_per_pattern=2, max_patterns=3)
         self.assertEqual(r, [r'^\.123$', r'^b\.$', aa_bb])
 
+    def test_find_non_matches(self):
+        examples = self.tels2 + self.tels2[:3] + ['0131 222 9876', 'x']
+        x = Extractor(examples, extract=False)
+        x.results = True
+        rexes = [r'^\+[0-9]{1,2} [0-9]{2,3} [0-9]{3,4} [0-9]{4}$',
+                 r'^(\(([0-9]{3,4})\)) [0-9]{3,4} [0-9]{4}$',
+                 r'^.*$']
+        for rs in (rexes[:2], rexes, rexes[::-1]):
+            self.assertEqual(x.find_non_matches(rs),
+                             x.find_non_matches_sequentially(rs))
+        failures, freqs, re_freqs = x.find_non_matches(rexes[:2])
+        self.assertEqual(set(failures), {'0131 222 9876', 'x'})
+        self.assertEqual(re_freqs, [7, 5])
+        self.assertEqual(x.find_non_matches(rexes)[2], [7, 5, 2])
+        failures, freqs, re_freqs = x.find_non_matches(['(?i)^X$', '^x$'])
+        self.assertEqual(len(failures), 10)
+        self.assertEqual(re_freqs, [1, 0])
+
+    def test_streamed_examples_in_memory(self):
+        lines = self.tels2 + self.tels2[:3]
+        streamed = StreamedExamples(iter(lines))
+        self.assertFalse(streamed.spilled)
+        self.assertEqual(streamed.n_lines, 12)
+        self.assertEqual(extract(streamed.counter), extract(lines))
+
+    def test_streamed_examples_spilled(self):
+        lines = self.tels2 * 2 + ['0131 222 9876']
+        streamed = StreamedExamples(iter(lines), max_distinct=4, seed=1)
+        try:
+            self.assertTrue(streamed.spilled)
+            self.assertTrue(os.path.exists(streamed.spill_path))
+            examples, _ = streamed([])
+            self.assertLessEqual(set(examples.strings), set(lines))
+            self.assertEqual(sum(n for (s, n) in streamed.items()), 19)
+
+            rexes = [r'^\+[0-9]{1,2} [0-9]{2,3} [0-9]{3,4} [0-9]{4}$',
+                     r'^\([0-9]{3,4}\) [0-9]{3,4} [0-9]{4}$']
+            failures, re_freqs = streamed(rexes)
+            self.assertEqual(failures.strings, ['0131 222 9876'])
+            self.assertEqual(re_freqs, [10, 8])
+
+            self.assertEqual(extract(streamed),
+                             extract(lines))
+        finally:
+            path = streamed.spill_path
+            streamed.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_rexpy_cli_max_distinct(self):
+        params = get_params(['--max-distinct', '10', 'in.txt'])
+        self.assertEqual(params['max_distinct'], 10)
+        self.assertEqual(params['in_path'], 'in.txt')
+        self.assertRaises(Exception, get_params, ['--max-distinct'])
+
+    def test_rexpy_cli_many(self):
+        import json
+        import shutil
+        import tempfile
+        params = get_params(['--files', 'a.txt', 'b.txt', '--jobs', '2'])
+        self.assertEqual(params['in_paths'], ['a.txt', 'b.txt'])
+        self.assertEqual(params['jobs'], 2)
+        params = get_params(['--columns', 'a,b*', '--columns', 'c',
+                             't.csv', 'out.jsonl'])
+        self.assertEqual(params['columns'], ['a', 'b*', 'c'])
+        self.assertEqual(params['in_paths'], ['t.csv'])
+        self.assertEqual(params['out_path'], 'out.jsonl')
+        self.assertRaises(Exception, get_params, ['--files'])
+        self.assertRaises(Exception, get_params, ['--jobs', '2', 'a.txt'])
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            tels_path = os.path.join(tmpdir, 'tels.txt')
+            with open(tels_path, 'w') as f:
+                f.write('\n'.join(self.tels2) + '\n')
+            table_path = os.path.join(tmpdir, 'table.csv')
+            pd.DataFrame({'tel': self.tels2 + [None],
+                          'n': list(range(len(self.tels2) + 1)),
+                          'url': self.urls2[:len(self.tels2) + 1]}
+                         ).to_csv(table_path, index=False)
+            out_path = os.path.join(tmpdir, 'out.jsonl')
+            results = rexpy_many([tels_path], out_path=out_path, jobs=2)
+            with open(out_path) as f:
+                self.assertEqual([json.loads(line) for line in f], results)
+            self.assertEqual(results[0]['patterns'], extract(self.tels2))
+            self.assertEqual(sum(results[0]['coverage']), len(self.tels2))
+            self.assertEqual(results[0]['n_unmatched'], 0)
+
+            results = rexpy_many([table_path], out_path=out_path,
+                                 columns=['tel', 'n'])
+            self.assertEqual([r['column'] for r in results], ['tel', 'n'])
+            self.assertEqual(results[0]['patterns'], extract(self.tels2))
+            self.assertEqual(results[0]['n_strings'], len(self.tels2))
+            self.assertEqual(results[1]['patterns'], ['^[0-9]$'])
+            self.assertRaises(ValueError, rexpy_many, [table_path],
+                              out_path=out_path, columns=['nosuch'])
+
+            # coverage uses the Python patterns, whatever the dialect
+            for dialect in ('java', 'posix'):
+                results = rexpy_many([tels_path], out_path=out_path,
+                                     dialect=dialect)
+                self.assertEqual(results[0]['patterns'],
+                                 extract(self.tels2, dialect=dialect))
+                self.assertEqual(sum(results[0]['coverage']),
+                                 len(self.tels2))
+                self.assertEqual(results[0]['n_unmatched'], 0)
+                results = rexpy_many([table_path], out_path=out_path,
+                                     columns=['tel'], dialect=dialect)
+                self.assertEqual(results[0]['n_unmatched'], 0)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_extract_columns(self):
+        ids = ['%d-%s' % (i, 'ABC'[i % 3]) for i in range(200)]
+        columns = OrderedDict([
+            ('tels', self.tels2),
+            ('urls', self.urls2),
+            ('ids', ids),
+            ('ids_again', list(ids)),
+            ('mixed', self.tels2 + ids),
+            ('series', pd.Series(ids[:20] + [None] * 3)),
+        ])
+        expected = {
+            name: (pdextract(values, seed=1)
+                   if isinstance(values, pd.Series)
+                   else extract(values, seed=1))
+            for (name, values) in columns.items()
+        }
+        self.assertEqual(extract_columns(columns, seed=1), expected)
+        self.assertEqual(extract_columns(list(columns.items()), seed=1,
+                                         workers=2),
+                         expected)
+        df = pd.DataFrame({'a': ids[:10], 'b': ids[10:20]})
+        self.assertEqual(extract_columns(df),
+                         {'a': pdextract(df['a']), 'b': pdextract(df['b'])})
+        self.assertRaises(ValueError, extract_columns,
+                          {'n': pd.Series([1, 2])})
+
+    def test_examples_grouped_by_vrle(self):
+        x = extract(self.tels2 + self.urls2, as_object=True)
+        examples = x.examples
+        groups = examples.v_id2indexes
+        self.assertEqual(sorted(i for g in groups.values() for i in g),
+                         list(range(examples.n_uniqs)))
+        for v_id, indexes in groups.items():
+            self.assertEqual({examples.example2v_id[i] for i in indexes},
+                             {v_id})
+
+    def test_workers(self):
+        examples = (self.tels2 * 3 + self.urls2
+                    + ['%d-%s' % (i, 'ABC'[i % 3]) for i in range(200)])
+        serial = extract(examples, seed=1, as_object=True)
+        parallel = extract(examples, seed=1, workers=2, as_object=True)
+        self.assertEqual(parallel.results.rex, serial.results.rex)
+        self.assertEqual(parallel.coverage(), serial.coverage())
+        self.assertEqual(parallel.warnings, serial.warnings)
+
+    def test_prior(self):
+        tels = [r'^\+[0-9]{1,2} [0-9]{2,3} [0-9]{3,4} [0-9]{4}$',
+                r'^\([0-9]{3,4}\) [0-9]{3,4} [0-9]{4}$']
+        self.assertEqual(extract(self.tels2, prior=tels), tels)
+        self.assertEqual(extract(self.tels2, prior=tels + ['^nomatch$']),
+                         tels)
+        x = extract(self.tels2 + ['0131 222 9876', '0141 222 9876'],
+                    prior=tels[:1], as_object=True)
+        self.assertEqual(x.results.rex,
+                         tels[:1] + [r'^[0-9]{4} 222 9876$', tels[1]])
+        self.assertEqual(x.prior_freqs, [5])
+        self.assertEqual(x.results.refrags[0],
+                         [Fragment(tels[0][1:-1], False)])
+        self.assertEqual(x.examples.n_uniqs, 6)
+
+    def test_prior_with_check_function(self):
+        strings = ['a1', 'b2', 'c']
+        def check(rexes, maxN=None):
+            failures = [s for s in strings
+                        if not any(re.match(r, s) for r in rexes)]
+            freqs = [sum(1 for s in strings
+                         if re.match(r, s)
+                         and not any(re.match(q, s) for q in rexes[:i]))
+                     for (i, r) in enumerate(rexes)]
+            return Examples(failures), freqs
+        self.assertEqual(extract(check, prior=['^c$']),
+                         ['^c$', '^[a-z][0-9]$'])
+
+    def test_prior_bad_dialect(self):
+        self.assertRaises(ValueError, extract, self.tels2,
+                          prior=['^[0-9]+$'], dialect='posix')
+
+    def test_benchmark(self):
+        from tdda.rexpy import benchmark
+        corpus = benchmark.generate_corpus('postcodes', 300, 50, seed=1)
+        self.assertEqual(len(corpus), 300)
+        self.assertEqual(len(set(corpus)), 50)
+        self.assertEqual(corpus,
+                         benchmark.generate_corpus('postcodes', 300, 50,
+                                                   seed=1))
+        results = list(benchmark.run_benchmarks(corpora=['phones'],
+                                                sizes=[200], distinct=20,
+                                                tasks=['extract', 'cli'],
+                                                memory=False))
+        self.assertEqual([(r['task'], r['sampling']) for r in results],
+                         [('extract', False), ('extract', True),
+                          ('cli', False), ('cli', True)])
+        self.assertTrue(all(r['n_distinct'] == 20 for r in results))
+        self.assertTrue(all(r['n_patterns'] > 0 for r in results))
+        self.assertEqual(results[0]['passes'], 1)
+
+    def test_time_budget(self):
+        strings = (['%05d' % i for i in range(200)]
+                   + ['ab-%d' % i for i in range(3)] + ['x y z zz'])
+        size = Size(use_sampling=True, do_all=5, n_per_length=1,
+                    do_all_exceptions=2)
+        x = extract(strings, size=size, seed=1, as_object=True)
+        self.assertFalse(x.timed_out)
+        self.assertEqual(x.results.rex, [r'^[0-9]{5}$', r'^ab\-[0-9]$',
+                                         r'^x y z zz$'])
+        with open(os.devnull, 'w') as devnull:
+            stderr = sys.stderr
+            sys.stderr = devnull  # discard warning
+            try:
+                x = extract(strings, size=size, seed=1, as_object=True,
+                            time_budget=0)
+                pd_rexes = pdextract(pd.Series(strings), time_budget=0)
+            finally:
+                sys.stderr = stderr
+        self.assertTrue(x.timed_out)
+        self.assertEqual(x.n_passes, 1)
+        self.assertEqual(x.results.rex, [r'^[0-9]{5}$', r'^.{4,8}$'])
+        self.assertEqual(x.warnings, ['Time budget of 0 seconds used up '
+                                      'after 1 pass; results may be '
+                                      'incomplete.'])
+        rexes = [re.compile(r) for r in pd_rexes]
+        self.assertTrue(all(any(r.match(s) for r in rexes)
+                            for s in strings))
+
+    def test_cache(self):
+        import shutil
+        import tempfile
+        import pandas as pd
+        from tdda.rexpy.cache import RexpyCache
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = RexpyCache(tmpdir)
+            expected = extract(self.tels2)
+            self.assertEqual(extract(self.tels2, cache=cache), expected)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            self.assertEqual(extract(list(reversed(self.tels2)),
+                                     cache=cache),
+                             expected)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            # pdextract extracts differently, so has its own entries
+            self.assertEqual(pdextract(pd.Series(self.tels2), cache=cache),
+                             expected)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+            pdextract(pd.Series(self.tels2), cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
+            extract(self.tels2, dialect='grep', cache=cache)
+            extract(self.tels2 + self.tels2[:1], cache=cache)
+            stats = cache.stats()
+            self.assertEqual((stats['hits'], stats['misses']), (2, 4))
+            self.assertEqual(stats['entries'], 4)
+            self.assertEqual(stats['hit_rate'], 2 / 6)
+
+            cache.max_bytes = stats['bytes'] - 1
+            key = cache.key(Counter(self.tels2).items(),
+                            cache_params())
+            os.utime(cache.entry_path(key), (0, 0))  # least recently used
+            cache.evict()
+            self.assertEqual(cache.evictions, 1)
+            self.assertEqual(cache.stats()['entries'], 3)
+            self.assertIsNone(cache.get(key))
+            cache.clear()
+            self.assertEqual(cache.stats()['entries'], 0)
+        finally:
+            shutil.rmtree(tmpdir)
+
     def test_save_seed(self):
         state = random.getstate()
         s_seed = PRNGState(12345678)
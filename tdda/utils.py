@@ -1,4 +1,13 @@
 import os
+import re
+import threading
+import time
+
+from collections import OrderedDict
+
+
+REGEX_CACHE_SIZE = 4096  # Number of compiled regular expressions kept
+
 
 def nvl(v, w):
     """
@@ -37,3 +46,84 @@ class Dummy(object):
 
     def to_dict(self):
         return self.__dict__
+
+
+class RegexCache(object):
+    """
+    A bounded cache of compiled regular expressions, keyed on the
+    pattern and the flags.
+
+    Once *maxsize* patterns are in the cache, the least recently used
+    is removed when a new one is added.
+
+    Counts of hits, misses and evictions, and the total time spent
+    compiling (in seconds), are kept as attributes.
+    """
+    def __init__(self, maxsize=REGEX_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.patterns = OrderedDict()
+        self.lock = threading.Lock()
+        self.clear()
+
+    def compile(self, pattern, flags=0):
+        """
+        Returns the compiled form of the pattern (with the flags given),
+        compiling it if it is not already in the cache.
+        """
+        key = (pattern, flags)
+        with self.lock:
+            compiled = self.patterns.get(key)
+            if compiled is not None:
+                self.hits += 1
+                self.patterns.move_to_end(key)
+                return compiled
+        start = time.perf_counter()
+        compiled = re.compile(pattern, flags)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.misses += 1
+            self.compile_time += elapsed
+            self.patterns[key] = compiled
+            while len(self.patterns) > self.maxsize:
+                self.patterns.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def hit_rate(self):
+        """
+        Proportion of lookups for which the compiled pattern was
+        found in the cache (or None, if there have been none).
+        """
+        n = self.hits + self.misses
+        return self.hits / n if n else None
+
+    def stats(self):
+        return {
+            'size': len(self.patterns),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'evictions': self.evictions,
+            'compile_time': self.compile_time,
+        }
+
+    def clear(self):
+        """
+        Remove all the patterns from the cache and reset its counters.
+        """
+        with self.lock:
+            self.patterns.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.compile_time = 0.0
+
+
+regex_cache = RegexCache()
+
+
+def compiled_regex(pattern, flags=0):
+    """
+    Compiled form of the regular expression given, from the cache
+    of compiled regular expressions shared across tdda.
+    """
+    return regex_cache.compile(pattern, flags)